@@ -0,0 +1,64 @@
+import logging
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Số bin của các histogram ở trang chủ: (cột, số bin)
+HISTOGRAM_BINS = {'minutes': 30, 'rating': 10}
+
+# Số điểm tối đa mỗi cụm trong biểu đồ phân cụm
+SCATTER_SAMPLE_PER_CLUSTER = 500
+
+SCATTER_COLUMNS = ['name', 'minutes', 'ingredient_count', 'cluster']
+
+
+def histogram_bins(values: pd.Series, nbins: int) -> pd.DataFrame:
+    """Đếm sẵn theo bin đều (bỏ giá trị thiếu): một dòng mỗi bin với bin_start, bin_end, count"""
+    finite = pd.to_numeric(values, errors='coerce').to_numpy(dtype=np.float64)
+    finite = finite[np.isfinite(finite)]
+    if len(finite) == 0:
+        return pd.DataFrame({'bin_start': [], 'bin_end': [], 'count': []})
+    counts, edges = np.histogram(finite, bins=nbins)
+    return pd.DataFrame({'bin_start': edges[:-1], 'bin_end': edges[1:], 'count': counts})
+
+
+def stratified_sample(df: pd.DataFrame, by: str, per_group: int, random_state: int = 42) -> pd.DataFrame:
+    """Lấy tối đa per_group dòng ngẫu nhiên cho mỗi nhóm để nhóm nhỏ vẫn hiện trên biểu đồ"""
+    if len(df) == 0:
+        return df
+    return (df.groupby(by, group_keys=False, observed=True)
+              .apply(lambda group: group.sample(min(len(group), per_group), random_state=random_state)))
+
+
+def build_analytics(cleaned_data: Optional[pd.DataFrame] = None,
+                    clustered_data: Optional[pd.DataFrame] = None) -> Dict:
+    """Tính một lần mọi số liệu nhỏ mà các tab thống kê cần, để biểu đồ không phải đọc dữ liệu gốc"""
+    analytics: Dict = {}
+    if cleaned_data is not None:
+        analytics['metrics'] = {
+            'n_recipes': int(cleaned_data['recipe_id'].nunique()),
+            'avg_rating': float(cleaned_data['rating'].mean()) if 'rating' in cleaned_data.columns else 0.0,
+            'avg_minutes': float(cleaned_data['minutes'].mean()) if 'minutes' in cleaned_data.columns else 0.0
+        }
+        analytics['user_ids'] = np.sort(cleaned_data['user_id'].unique()).tolist()
+        analytics['seasons'] = cleaned_data['season'].dropna().unique().tolist() if 'season' in cleaned_data.columns else []
+        analytics['histograms'] = {
+            col: histogram_bins(cleaned_data[col], nbins)
+            for col, nbins in HISTOGRAM_BINS.items() if col in cleaned_data.columns
+        }
+        numeric_cols = cleaned_data.select_dtypes(include=[np.number]).columns
+        analytics['correlation'] = cleaned_data[numeric_cols].corr() if len(numeric_cols) > 1 else None
+        analytics['top_recipes'] = (cleaned_data['name'].value_counts().head(10)
+                                    if 'name' in cleaned_data.columns else None)
+    if clustered_data is not None and 'cluster' in clustered_data.columns:
+        columns: List[str] = [col for col in SCATTER_COLUMNS if col in clustered_data.columns]
+        analytics['cluster_sample'] = stratified_sample(clustered_data[columns], 'cluster', SCATTER_SAMPLE_PER_CLUSTER)
+        analytics['cluster_stats'] = clustered_data.groupby('cluster').agg(
+            {'minutes': 'mean', 'ingredient_count': 'mean'}
+        ).round(2)
+        analytics['n_clustered'] = len(clustered_data)
+    logger.info(f"Đã tính sẵn số liệu thống kê: {sorted(analytics)}")
+    return analytics
@@ -1,12 +1,13 @@
 import streamlit as st
-import pandas as pd
 import numpy as np
 import plotly.express as px
 import plotly.graph_objects as go
-from recommender import RestaurantRecommender
+from recommender import MODEL_BUNDLE_DIR, RestaurantRecommender
+from artifact_io import artifact_exists, artifact_mtime, artifact_stamp, read_artifact, resolve_artifact
+from menu_index import MenuIndex
+from analytics import build_analytics
 from nlp_processor import NLPProcessor
-from chatbot import FoodChatbot
-import os
+from chatbot import FoodChatbot, load_recipe_table
 import html
 from datetime import datetime
 import logging
@@ -72,24 +73,35 @@ st.markdown("""
 </style>
 """, unsafe_allow_html=True)
 
-@st.cache_data
-def load_data():
-    """Tải dữ liệu (cached)"""
-    data_files = {
-        'cleaned_data': '../data/cleaned_data.csv',
-        'menu': '../data/menu.csv',
-        'clustered_data': '../data/clustered_data.csv',
-        'association_rules': '../data/association_rules.csv',
-        'seasonal_trends': '../data/seasonal_trends.csv'
-    }
-    
+# Dữ liệu tương tác đã làm sạch: chỉ đọc để huấn luyện, tính sẵn thống kê và dựng bảng món, không giữ trong UI
+CLEANED_DATA_PATH = '../data/cleaned_data.csv'
+
+# Các artifact nhỏ app giữ trong bộ nhớ để hiển thị
+DATA_FILES = {
+    'menu': '../data/menu.csv',
+    'clustered_data': '../data/clustered_data.csv',
+    'association_rules': '../data/association_rules.csv',
+    'seasonal_trends': '../data/seasonal_trends.csv'
+}
+
+@st.cache_resource(max_entries=1)
+def load_data(version):
+    """Tải các artifact hiển thị (cached theo phiên bản dữ liệu, chỉ giữ bản mới nhất)
+
+    Dùng cache_resource nên mọi phiên và mọi lần rerun dùng chung một bản, không sao chép lại;
+    các bảng trả về không được sửa tại chỗ.
+    """
     loaded_data = {}
     missing_files = []
     
-    for key, filepath in data_files.items():
+    for key, filepath in DATA_FILES.items():
         try:
-            if os.path.exists(filepath):
-                loaded_data[key] = pd.read_csv(filepath)
+            if artifact_exists(filepath):
+                loaded_data[key] = read_artifact(filepath)
+                if key == 'menu':
+                    # Đánh index theo id (giữ cột id) để lấy món gợi ý bằng tra cứu thay vì lọc toàn bảng
+                    menu = loaded_data[key]
+                    loaded_data[key] = menu[~menu['id'].duplicated()].set_index('id', drop=False).rename_axis(None)
             else:
                 missing_files.append(filepath)
         except Exception as e:
@@ -101,17 +113,30 @@ def load_data():
     
     return loaded_data
 
-@st.cache_resource
-def initialize_recommender():
-    """Khởi tạo recommender system (cached)"""
+@st.cache_resource(max_entries=1)
+def initialize_recommender(version):
+    """Khởi tạo recommender system (cached theo phiên bản dữ liệu như load_data, chỉ giữ bản mới nhất)"""
     try:
+        # Ưu tiên bundle đã huấn luyện sẵn (memory-map); chỉ huấn luyện khi chưa có bundle
+        recommender = RestaurantRecommender.load_model(MODEL_BUNDLE_DIR)
+        if recommender is not None:
+            # Bundle phải được huấn luyện từ đúng bản cleaned_data hiện tại (so kích thước và mtime,
+            # không đọc lại nội dung), nếu không thì huấn luyện lại
+            stamp = artifact_stamp(CLEANED_DATA_PATH)
+            if stamp is None or recommender.data_stamp == stamp:
+                return recommender
+            logger.warning("Bundle model được huấn luyện từ cleaned_data khác bản hiện tại, huấn luyện lại")
+        else:
+            logger.warning("Chưa có bundle model, huấn luyện recommender từ dữ liệu")
         recommender = RestaurantRecommender(max_users=10000, max_recipes=50000)
-        if os.path.exists('../data/cleaned_data.csv'):
-            if recommender.load_data('../data/cleaned_data.csv'):
+        if artifact_exists(CLEANED_DATA_PATH):
+            if recommender.load_data(CLEANED_DATA_PATH):
                 recommender.build_user_profiles()
+                recommender.load_cluster_model()
                 recommender.perform_clustering()
                 recommender.find_association_rules()
                 recommender.analyze_seasonal_trends()
+                recommender.save_model(MODEL_BUNDLE_DIR)
                 return recommender
         logger.error("Không tìm thấy file cleaned_data.csv")
         st.error("Không tìm thấy file cleaned_data.csv")
@@ -121,15 +146,80 @@ def initialize_recommender():
         st.error(f"Lỗi khởi tạo recommender: {e}")
         return None
 
-@st.cache_resource
-def load_chatbot():
-    """Load chatbot với cache để tối ưu performance"""
+@st.cache_resource(max_entries=1)
+def load_menu_index(_menu, version):
+    """Index truy vấn menu (cached theo phiên bản dữ liệu như load_data), dùng chung cho mọi phiên"""
+    return MenuIndex(_menu)
+
+
+@st.cache_resource(max_entries=1)
+def load_analytics(_data, version):
+    """Số liệu thống kê tính sẵn (histogram, mẫu phân cụm, ma trận tương quan), cached theo phiên bản dữ liệu như load_data
+
+    cleaned_data chỉ được đọc trong lúc tính rồi bỏ đi, UI chỉ giữ các số liệu nhỏ.
+    """
+    cleaned_data = read_artifact(CLEANED_DATA_PATH) if artifact_exists(CLEANED_DATA_PATH) else None
+    return build_analytics(cleaned_data, _data.get('clustered_data'))
+
+
+def histogram_figure(bins, column, title):
+    """Biểu đồ cột từ histogram đã đếm sẵn (một cột mỗi bin)"""
+    fig = px.bar(x=(bins['bin_start'] + bins['bin_end']) / 2, y=bins['count'], title=title,
+                 labels={'x': column, 'y': 'count'})
+    fig.update_traces(width=(bins['bin_end'] - bins['bin_start']).tolist())
+    fig.update_layout(showlegend=False, bargap=0)
+    return fig
+
+
+def data_version(paths):
+    """Phiên bản của các file dữ liệu (đường dẫn và thời điểm sửa, tính cả các phần ghi nối)"""
+    return tuple((resolve_artifact(path), artifact_mtime(path)) for path in paths if artifact_exists(path))
+
+
+# Số món gợi ý tối đa trong tab cá nhân (giới hạn của slider)
+MAX_PERSONAL_RECOMMENDATIONS = 10
+
+# Số kết quả tối đa giữ trong cache gợi ý của mỗi phiên
+RECOMMENDATION_CACHE_SIZE = 256
+
+
+def cached_recommendations(recommender, user_id, season, n_recommendations=MAX_PERSONAL_RECOMMENDATIONS):
+    """Gợi ý cho user, cache trong phiên theo (user, mùa, phiên bản model, số món) để các lần rerun không tính lại
+
+    Số món là một phần của khóa vì tỉ lệ món theo cụm/luật/mùa phụ thuộc vào n, danh sách ngắn không phải
+    là phần đầu của danh sách dài.
+    """
+    cache = st.session_state.setdefault('recommendation_cache', {})
+    key = (user_id, season, recommender.model_version, n_recommendations)
+    if key not in cache:
+        if len(cache) >= RECOMMENDATION_CACHE_SIZE:
+            cache.clear()
+        cache[key] = recommender.recommend_for_user(user_id=user_id, season=season,
+                                                    n_recommendations=n_recommendations)
+    return cache[key]
+
+
+def menu_rows(menu, recipe_ids):
+    """Các dòng menu của recipe_ids theo đúng thứ tự gợi ý, tra qua index id của menu"""
+    return menu.loc[[recipe_id for recipe_id in recipe_ids if recipe_id in menu.index]]
+
+
+@st.cache_resource(max_entries=1)
+def load_recipes(version):
+    """Bảng một dòng mỗi món (từ cleaned_data) cho chatbot, đọc một lần và dùng chung cho mọi phiên"""
+    return load_recipe_table(CLEANED_DATA_PATH)
+
+
+@st.cache_resource(max_entries=1)
+def load_chatbot(version):
+    """Load chatbot (cached theo phiên bản dữ liệu, dựng lại cùng recommender và bảng món khi dữ liệu đổi)"""
     try:
-        nlp_processor = NLPProcessor()
-        recommender = initialize_recommender()
+        nlp_processor = NLPProcessor(index_dir='../data/search_index')
+        recommender = initialize_recommender(version)
         if recommender is None:
             raise Exception("Recommender không được khởi tạo")
-        chatbot = FoodChatbot(recommender, nlp_processor)
+        recipes = load_recipes(version)
+        chatbot = FoodChatbot(recommender, nlp_processor, recipes_df=recipes)
         logger.info("Chatbot khởi tạo thành công")
         return chatbot
     except Exception as e:
@@ -166,7 +256,7 @@ def display_recipe_card(recipe_data, score=None):
             st.write(f"Món: {name} (Lỗi hiển thị)")
 
 
-def chatbot_interface():
+def chatbot_interface(version):
     """Giao diện chatbot"""
     st.header(" AI Chatbot Đặt Món")
     st.markdown("*Hãy mô tả món ăn bạn muốn bằng ngôn ngữ tự nhiên!*")
@@ -174,8 +264,8 @@ def chatbot_interface():
     # Khởi tạo session state
     if 'chat_history' not in st.session_state:
         st.session_state.chat_history = []
-    if 'chatbot' not in st.session_state:
-        st.session_state.chatbot = load_chatbot()
+    # Lấy từ cache mỗi lần chạy để phiên đang mở cũng chuyển sang chatbot mới khi dữ liệu đổi phiên bản
+    st.session_state.chatbot = load_chatbot(version)
     
     if st.session_state.chatbot is None:
         st.error("Không thể khởi tạo chatbot. Vui lòng kiểm tra cấu hình.")
@@ -333,46 +423,46 @@ def main():
     st.markdown('<h1 class="main-header">🍽️ Hệ thống Gợi ý Thực đơn Nhà hàng</h1>', unsafe_allow_html=True)
     
     with st.spinner("Đang tải dữ liệu..."):
-        data = load_data()
-        recommender = initialize_recommender()
+        version = data_version([CLEANED_DATA_PATH, *DATA_FILES.values()])
+        data = load_data(version)
+        recommender = initialize_recommender(version)
     
     if not data or not recommender:
         st.error("Không thể tải dữ liệu hoặc khởi tạo hệ thống. Vui lòng kiểm tra lại các file dữ liệu.")
         return
     
-    user_ids = sorted(data['cleaned_data']['user_id'].unique().tolist()) if 'cleaned_data' in data else []
+    analytics = load_analytics(data, version)
+    user_ids = analytics.get('user_ids', [])
     
     tabs = st.tabs(["Trang chủ", "Gợi ý cá nhân", "Phân tích dữ liệu", "Khám phá món ăn", "AI Chatbot"])
     
     with tabs[0]:
         st.markdown('<h2 class="sub-header">Tổng quan Hệ thống</h2>', unsafe_allow_html=True)
         
-        if 'cleaned_data' in data:
+        if 'metrics' in analytics:
+            metrics = analytics['metrics']
             col1, col2, col3, col4 = st.columns(4)
             with col1:
-                st.metric("Tổng số món ăn", len(data['cleaned_data']['recipe_id'].unique()))
+                st.metric("Tổng số món ăn", metrics['n_recipes'])
             with col2:
                 st.metric("Số người dùng", len(user_ids))
             with col3:
-                avg_rating = data['cleaned_data']['rating'].mean() if 'rating' in data['cleaned_data'].columns else 0
-                st.metric("Đánh giá trung bình", f"{avg_rating:.2f}")
+                st.metric("Đánh giá trung bình", f"{metrics['avg_rating']:.2f}")
             with col4:
-                avg_time = data['cleaned_data']['minutes'].mean() if 'minutes' in data['cleaned_data'].columns else 0
-                st.metric("Thời gian nấu TB", f"{avg_time:.0f} phút")
+                st.metric("Thời gian nấu TB", f"{metrics['avg_minutes']:.0f} phút")
         
         st.markdown('<h3 class="sub-header">Biểu đồ Thống kê</h3>', unsafe_allow_html=True)
-        if 'cleaned_data' in data:
+        if 'histograms' in analytics:
+            histograms = analytics['histograms']
             col1, col2 = st.columns(2)
             with col1:
-                if 'minutes' in data['cleaned_data'].columns:
-                    fig = px.histogram(data['cleaned_data'], x='minutes', title='Phân bố Thời gian Nấu ăn', nbins=30)
-                    fig.update_layout(showlegend=False)
-                    st.plotly_chart(fig, use_container_width=True)
+                if 'minutes' in histograms:
+                    st.plotly_chart(histogram_figure(histograms['minutes'], 'minutes', 'Phân bố Thời gian Nấu ăn'),
+                                    use_container_width=True)
             with col2:
-                if 'rating' in data['cleaned_data'].columns:
-                    fig = px.histogram(data['cleaned_data'], x='rating', title='Phân bố Điểm Đánh giá', nbins=10)
-                    fig.update_layout(showlegend=False)
-                    st.plotly_chart(fig, use_container_width=True)
+                if 'rating' in histograms:
+                    st.plotly_chart(histogram_figure(histograms['rating'], 'rating', 'Phân bố Điểm Đánh giá'),
+                                    use_container_width=True)
         pass
     
     with tabs[1]:
@@ -401,7 +491,11 @@ def main():
                     st.error(f"ID {user_id} không tồn tại trong hệ thống.")
                     user_id = None
             
-            seasons = ['Không chọn', 'Hè', 'Thu', 'Xuân', 'Đông']
+            # Mùa lấy theo dữ liệu (bảng mùa có thể khác bốn mùa ôn đới, vd. mùa khô/mùa mưa)
+            default_seasons = ['Hè', 'Thu', 'Xuân', 'Đông']
+            data_seasons = analytics['seasons'] if 'seasons' in analytics else default_seasons
+            seasons = (['Không chọn'] + [s for s in default_seasons if s in data_seasons]
+                       + sorted(s for s in data_seasons if s not in default_seasons))
             season = st.selectbox("Mùa", seasons)
             season = None if season == 'Không chọn' else season
             
@@ -410,8 +504,8 @@ def main():
             max_recommendations = 5
             if user_id and user_id in user_ids:
                 try:
-                    recipe_ids = recommender.recommend_for_user(user_id=user_id, season=season, n_recommendations=100)
-                    max_recommendations = min(len(recipe_ids), 10)
+                    recipe_ids = cached_recommendations(recommender, user_id, season)
+                    max_recommendations = max(len(recipe_ids), 1)
                 except:
                     max_recommendations = 5
             
@@ -426,9 +520,9 @@ def main():
                         if user_id not in user_ids:
                             st.error(f"ID {user_id} không tồn tại.")
                             return
-                        recipe_ids = recommender.recommend_for_user(user_id=user_id, season=season, n_recommendations=n_recommendations)
+                        recipe_ids = cached_recommendations(recommender, user_id, season, n_recommendations)
                         if recipe_ids:
-                            recommendations = data['menu'][data['menu']['id'].isin(recipe_ids)]
+                            recommendations = menu_rows(data['menu'], recipe_ids)
                             recommendations = recommendations.assign(similarity_score=np.random.uniform(0.7, 1.0, len(recommendations)))
                             st.session_state['recommendations'] = recommendations
                         else:
@@ -464,13 +558,15 @@ def main():
         
         elif analysis_type == 'Phân cụm món ăn' and 'clustered_data' in data:
             st.subheader("Phân cụm Món ăn")
-            clustered_data = data['clustered_data']
-            if 'cluster' in clustered_data.columns:
-                fig = px.scatter(clustered_data, x='minutes', y='ingredient_count', color='cluster', title='Phân cụm Món ăn', hover_data=['name'])
+            if 'cluster_sample' in analytics:
+                # Mẫu phân tầng theo cụm thay cho toàn bộ dữ liệu
+                sample = analytics['cluster_sample']
+                hover_data = ['name'] if 'name' in sample.columns else None
+                fig = px.scatter(sample, x='minutes', y='ingredient_count', color='cluster',
+                                 title=f"Phân cụm Món ăn ({len(sample)}/{analytics['n_clustered']} món)", hover_data=hover_data)
                 st.plotly_chart(fig, use_container_width=True)
-                cluster_stats = clustered_data.groupby('cluster').agg({'minutes': 'mean', 'ingredient_count': 'mean'}).round(2)
                 st.subheader("Đặc điểm các nhóm món ăn")
-                st.dataframe(cluster_stats)
+                st.dataframe(analytics['cluster_stats'])
             else:
                 st.info("Chưa có dữ liệu phân cụm")
         
@@ -485,16 +581,13 @@ def main():
             else:
                 st.info("Chưa có dữ liệu luật kết hợp")
         
-        elif analysis_type == 'Thống kê tổng quan' and 'cleaned_data' in data:
+        elif analysis_type == 'Thống kê tổng quan' and 'metrics' in analytics:
             st.subheader("Thống kê Tổng quan")
-            df = data['cleaned_data']
-            numeric_cols = df.select_dtypes(include=[np.number]).columns
-            if len(numeric_cols) > 1:
-                corr_matrix = df[numeric_cols].corr()
-                fig = px.imshow(corr_matrix, text_auto=True, aspect="auto", title="Ma trận Tương quan")
+            if analytics.get('correlation') is not None:
+                fig = px.imshow(analytics['correlation'], text_auto=True, aspect="auto", title="Ma trận Tương quan")
                 st.plotly_chart(fig, use_container_width=True)
-            if 'name' in df.columns:
-                top_recipes = df['name'].value_counts().head(10)
+            if analytics.get('top_recipes') is not None:
+                top_recipes = analytics['top_recipes']
                 fig = px.bar(x=top_recipes.values, y=top_recipes.index, orientation='h', title='Top 10 Món ăn Phổ biến')
                 st.plotly_chart(fig, use_container_width=True)
         pass
@@ -504,38 +597,37 @@ def main():
         
         if 'menu' in data:
             df = data['menu']
+            menu_index = load_menu_index(df, version)
             col1, col2, col3 = st.columns([1.5, 1.5, 1])
             with col1:
                 time_filter = st.slider("Thời gian nấu (phút)", int(df['minutes'].min()), int(df['minutes'].max()), (0, 120))
             with col2:
                 price_filter = st.slider("Giá tối đa", float(df['price'].min()), float(df['price'].max()), float(df['price'].max()))
             with col3:
-                season_filter = st.selectbox("Mùa", ['all'] + sorted(df['season'].unique().tolist()))
+                season_filter = st.selectbox("Mùa", ['all'] + menu_index.seasons)
             
-            filtered_df = df[
-                (df['minutes'] >= time_filter[0]) & 
-                (df['minutes'] <= time_filter[1]) &
-                (df['price'] <= price_filter)
-            ]
-            if season_filter != 'all':
-                filtered_df = filtered_df[filtered_df['season'] == season_filter]
+            # Lọc qua index (tìm kiếm nhị phân + bitmap mùa), kết quả đã sắp theo minutes
+            positions = menu_index.query(
+                minutes=time_filter,
+                price=(None, price_filter),
+                season=None if season_filter == 'all' else season_filter
+            )
             
-            st.write(f"Tìm thấy {len(filtered_df)} món ăn phù hợp")
+            st.write(f"Tìm thấy {len(positions)} món ăn phù hợp")
             
-            if len(filtered_df) > 0:
-                filtered_df = filtered_df.sort_values('minutes')
+            if len(positions) > 0:
                 items_per_page = st.selectbox("Số món mỗi trang", [10, 20, 50], index=1)
-                total_items = len(filtered_df)
+                total_items = len(positions)
                 total_pages = (total_items + items_per_page - 1) // items_per_page
                 page = st.number_input("Trang", min_value=1, max_value=total_pages, value=1, step=1)
                 
                 start_idx = (page - 1) * items_per_page
                 end_idx = min(start_idx + items_per_page, total_items)
-                page_df = filtered_df.iloc[start_idx:end_idx]
+                page_df = menu_index.page(positions, page, items_per_page)
                 
                 st.write(f"Hiển thị {start_idx + 1} - {end_idx} / {total_items} món ăn")
                 
-                for idx, (_, recipe) in enumerate(page_df.iterrows()):
+                for idx, recipe in enumerate(page_df.to_dict('records')):
                     display_recipe_card(recipe)
                     if idx < len(page_df) - 1:
                         st.markdown("---")
@@ -557,7 +649,7 @@ def main():
         pass
     
     with tabs[4]:
-        chatbot_interface()
+        chatbot_interface(version)
         chatbot_sidebar()
         
         user_input = st.chat_input("Nhập yêu cầu của bạn...", key="chat_input_tab4")
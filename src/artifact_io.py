@@ -0,0 +1,371 @@
+import logging
+import os
+import shutil
+from typing import Dict, Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+try:
+    import pyarrow  # noqa: F401
+    HAS_PYARROW = True
+except ImportError:
+    HAS_PYARROW = False
+
+logger = logging.getLogger(__name__)
+
+# Định dạng ghi mặc định; CSV chỉ còn là tùy chọn xuất
+DEFAULT_FORMAT = 'parquet' if HAS_PYARROW else 'csv'
+
+# Thứ tự ưu tiên khi tìm file artifact trên đĩa
+FORMAT_EXTENSIONS = {'parquet': '.parquet', 'feather': '.feather', 'csv': '.csv'}
+
+COOKING_TIME_CATEGORIES = ['Nhanh', 'Trung bình', 'Lâu', 'Rất lâu']
+
+# Kiểu dữ liệu tường minh theo tên cột, dùng chung cho mọi artifact
+COLUMN_DTYPES = {
+    'user_id': 'int32',
+    'recipe_id': 'int32',
+    'id': 'int32',
+    'rating': 'int8',
+    'minutes': 'int32',
+    'calories': 'float32',
+    'ingredient_count': 'int16',
+    'n_ingredients': 'int16',
+    'cluster': 'int8',
+    'price': 'float32',
+    'avg_rating': 'float32',
+    'recipe_count': 'int32',
+    'avg_minutes': 'float32',
+    'avg_ingredients': 'float32',
+    'antecedent support': 'float32',
+    'consequent support': 'float32',
+    'support': 'float32',
+    'confidence': 'float32',
+    'lift': 'float32',
+    'season': 'category',
+    'cluster_name': 'category',
+    'cooking_time_category': pd.CategoricalDtype(COOKING_TIME_CATEGORIES, ordered=True)
+}
+
+DATE_COLUMNS = ['date']
+
+# Thư mục chứa các phần ghi nối của artifact (vd. cleaned_data.parts/part-00001.parquet)
+PARTS_SUFFIX = '.parts'
+
+
+def _cast_column(series: pd.Series, dtype) -> pd.Series:
+    if isinstance(dtype, pd.CategoricalDtype):
+        return series.astype(dtype)
+    if dtype == 'category':
+        # Sắp xếp categories để kết quả không phụ thuộc thứ tự xuất hiện (vd. khi ghi theo khối)
+        series = series.astype('category')
+        categories = series.cat.categories
+        if not categories.is_monotonic_increasing:
+            series = series.cat.reorder_categories(categories.sort_values())
+        return series
+    if np.dtype(dtype).kind in 'iu':
+        # Chỉ ép kiểu nguyên khi không có giá trị thiếu và không làm mất phần thập phân
+        numeric = pd.to_numeric(series, errors='coerce')
+        if numeric.isna().any() or not (numeric % 1 == 0).all():
+            return numeric.astype('float32')
+        return numeric.astype(dtype)
+    return pd.to_numeric(series, errors='coerce').astype(dtype)
+
+
+def apply_dtypes(df: pd.DataFrame) -> pd.DataFrame:
+    """Ép các cột đã biết về kiểu tường minh (categorical, int32, float32, datetime)"""
+    df = df.copy()
+    for col, dtype in COLUMN_DTYPES.items():
+        if col in df.columns and (df[col].dtype != dtype or dtype == 'category'):
+            df[col] = _cast_column(df[col], dtype)
+    for col in DATE_COLUMNS:
+        if col in df.columns and not pd.api.types.is_datetime64_any_dtype(df[col]):
+            df[col] = pd.to_datetime(df[col], errors='coerce')
+    return df
+
+
+def _stem(path: str) -> str:
+    root, ext = os.path.splitext(path)
+    return root if ext in FORMAT_EXTENSIONS.values() else path
+
+
+def artifact_path(path: str, fmt: Optional[str] = None) -> str:
+    """Đường dẫn của artifact theo định dạng (đổi phần mở rộng)"""
+    return _stem(path) + FORMAT_EXTENSIONS[fmt or DEFAULT_FORMAT]
+
+
+def resolve_artifact(path: str, formats: Optional[Iterable[str]] = None) -> Optional[str]:
+    """Tìm file thật của artifact: ưu tiên bản mới nhất, cùng thời điểm thì ưu tiên parquet > feather > csv"""
+    formats = list(formats or FORMAT_EXTENSIONS)
+    if not HAS_PYARROW:
+        formats = [fmt for fmt in formats if fmt == 'csv']
+    candidates = []
+    for rank, fmt in enumerate(formats):
+        candidate = artifact_path(path, fmt)
+        if os.path.exists(candidate):
+            candidates.append((os.path.getmtime(candidate), -rank, candidate))
+    if not candidates:
+        return None
+    return max(candidates)[2]
+
+
+def artifact_exists(path: str) -> bool:
+    return resolve_artifact(path) is not None
+
+
+def _format_of(path: str) -> str:
+    ext = os.path.splitext(path)[1]
+    return next(fmt for fmt, fmt_ext in FORMAT_EXTENSIONS.items() if fmt_ext == ext)
+
+
+def artifact_parts(path: str, fmt: Optional[str] = None) -> List[str]:
+    """Các phần ghi nối của artifact ở định dạng fmt, theo thứ tự ghi"""
+    directory = _stem(path) + PARTS_SUFFIX
+    if not os.path.isdir(directory):
+        return []
+    ext = FORMAT_EXTENSIONS[fmt or DEFAULT_FORMAT]
+    return [os.path.join(directory, name) for name in sorted(os.listdir(directory)) if name.endswith(ext)]
+
+
+def clear_artifact_parts(path: str) -> None:
+    """Xóa các phần ghi nối (sau khi bản chính được ghi lại toàn bộ)"""
+    directory = _stem(path) + PARTS_SUFFIX
+    if os.path.isdir(directory):
+        shutil.rmtree(directory)
+
+
+def artifact_mtime(path: str) -> Optional[float]:
+    """Thời điểm sửa mới nhất của artifact, tính cả các phần ghi nối (None nếu không có artifact)"""
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        return None
+    directory = _stem(path) + PARTS_SUFFIX
+    mtime = os.path.getmtime(resolved)
+    return max(mtime, os.path.getmtime(directory)) if os.path.isdir(directory) else mtime
+
+
+def artifact_stamp(path: str) -> Optional[List[list]]:
+    """Dấu nhận diện rẻ của artifact: [tên, kích thước, mtime_ns] của bản chính và từng phần ghi nối
+
+    Chỉ cần stat các file, không đọc nội dung; dạng list để lưu được vào JSON và so sánh lại sau khi tải.
+    None nếu không có artifact.
+    """
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        return None
+    stamp = []
+    for file in [resolved] + artifact_parts(resolved, _format_of(resolved)):
+        stat = os.stat(file)
+        stamp.append([os.path.basename(file), stat.st_size, stat.st_mtime_ns])
+    return stamp
+
+
+def read_artifact(path: str, columns: Optional[List[str]] = None, nrows: Optional[int] = None) -> pd.DataFrame:
+    """Đọc artifact ở định dạng có sẵn (bản chính rồi các phần ghi nối) và áp kiểu dữ liệu tường minh"""
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        raise FileNotFoundError(f"Không tìm thấy artifact: {path}")
+    df = _read_file(resolved, columns, nrows)
+    parts = artifact_parts(resolved, _format_of(resolved))
+    if parts and (nrows is None or len(df) < nrows):
+        df = pd.concat([df] + [_read_file(part, columns, None) for part in parts], ignore_index=True)
+    if nrows is not None:
+        df = df.head(nrows)
+    return apply_dtypes(df)
+
+
+def read_artifact_parts(path: str, start: int = 0, columns: Optional[List[str]] = None) -> pd.DataFrame:
+    """Chỉ đọc các phần ghi nối từ phần thứ start trở đi, không đọc bản chính (DataFrame rỗng nếu không có)"""
+    resolved = resolve_artifact(path)
+    if resolved is None:
+        raise FileNotFoundError(f"Không tìm thấy artifact: {path}")
+    parts = artifact_parts(resolved, _format_of(resolved))[start:]
+    if not parts:
+        return pd.DataFrame()
+    return apply_dtypes(pd.concat([_read_file(part, columns, None) for part in parts], ignore_index=True))
+
+
+def _read_file(resolved: str, columns: Optional[List[str]], nrows: Optional[int]) -> pd.DataFrame:
+    if resolved.endswith('.parquet'):
+        df = pd.read_parquet(resolved, columns=columns)
+    elif resolved.endswith('.feather'):
+        df = pd.read_feather(resolved, columns=columns)
+    else:
+        dates = [col for col in DATE_COLUMNS if columns is None or col in columns]
+        df = pd.read_csv(resolved, usecols=columns, nrows=nrows)
+        dates = [col for col in dates if col in df.columns]
+        if dates:
+            df[dates] = df[dates].apply(pd.to_datetime, errors='coerce')
+    return df
+
+
+def _write_file(typed: pd.DataFrame, target: str, fmt: str) -> None:
+    if fmt == 'parquet':
+        typed.to_parquet(target, index=False)
+    elif fmt == 'feather':
+        typed.reset_index(drop=True).to_feather(target)
+    else:
+        typed.to_csv(target, index=False)
+
+
+def write_artifact(df: pd.DataFrame, path: str, fmt: Optional[str] = None, export_csv: bool = False) -> str:
+    """Ghi artifact dạng cột với kiểu tường minh; export_csv=True ghi thêm bản CSV"""
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt != 'csv' and not HAS_PYARROW:
+        logger.warning("Chưa cài pyarrow, ghi artifact dạng CSV")
+        fmt = 'csv'
+    typed = apply_dtypes(df)
+    target = artifact_path(path, fmt)
+    # Ghi bản CSV trước để bản dạng cột luôn là bản mới nhất khi resolve
+    if export_csv and fmt != 'csv':
+        typed.to_csv(artifact_path(path, 'csv'), index=False)
+    _write_file(typed, target, fmt)
+    # Bản chính đã chứa toàn bộ dữ liệu nên các phần ghi nối cũ không còn hiệu lực
+    clear_artifact_parts(path)
+    return target
+
+
+def append_artifact_part(df: pd.DataFrame, path: str, fmt: Optional[str] = None, export_csv: bool = False) -> str:
+    """Ghi nối df thành một phần mới của artifact đã có, không ghi lại bản chính
+
+    Mỗi phần được ghi qua file tạm rồi đổi tên; export_csv=True ghi thêm phần CSV cho bản CSV.
+    """
+    fmt = fmt or DEFAULT_FORMAT
+    if fmt != 'csv' and not HAS_PYARROW:
+        logger.warning("Chưa cài pyarrow, ghi artifact dạng CSV")
+        fmt = 'csv'
+    typed = apply_dtypes(df)
+    directory = _stem(path) + PARTS_SUFFIX
+    os.makedirs(directory, exist_ok=True)
+    numbers = [int(name.split('.')[0][len('part-'):]) for name in os.listdir(directory)
+               if name.startswith('part-') and not name.endswith('.tmp')]
+    name = f"part-{max(numbers, default=0) + 1:05d}"
+    for part_fmt in (['csv'] if export_csv and fmt != 'csv' else []) + [fmt]:
+        target = os.path.join(directory, name + FORMAT_EXTENSIONS[part_fmt])
+        _write_file(typed, target + '.tmp', part_fmt)
+        os.replace(target + '.tmp', target)
+    return target
+
+
+def save_array(path: str, values: np.ndarray) -> None:
+    """Ghi mảng .npy qua file tạm rồi đổi tên để process khác đang memory-map bản cũ không bị ghi đè"""
+    tmp = path + '.tmp'
+    with open(tmp, 'wb') as f:
+        np.save(f, np.ascontiguousarray(values))
+    os.replace(tmp, path)
+
+
+def load_array(path: str, mmap: bool = True) -> np.ndarray:
+    """Đọc mảng .npy; mmap=True mở chỉ đọc bằng memory-map để các process dùng chung page cache của OS"""
+    if mmap:
+        try:
+            return np.load(path, mmap_mode='r')
+        except ValueError:
+            # Mảng rỗng không memory-map được
+            pass
+    return np.load(path)
+
+
+def _conform_chunk(typed: pd.DataFrame, categories: Dict[str, pd.CategoricalDtype]) -> pd.DataFrame:
+    # Đưa chunk về kiểu cố định theo COLUMN_DTYPES để mọi chunk có cùng schema Arrow:
+    # category tự do không khai báo categories ghi dạng chuỗi (dictionary của mỗi chunk khác nhau),
+    # cột nguyên giữ kiểu nguyên kể cả khi chunk có giá trị thiếu. Khi đọc lại, apply_dtypes dựng lại categorical.
+    for col, dtype in COLUMN_DTYPES.items():
+        if col not in typed.columns or isinstance(dtype, pd.CategoricalDtype):
+            continue
+        if col in categories:
+            typed[col] = typed[col].astype(categories[col])
+        elif dtype == 'category':
+            typed[col] = typed[col].astype(object).where(typed[col].notna(), None)
+        elif np.dtype(dtype).kind in 'iu':
+            typed[col] = typed[col].astype(dtype.capitalize())
+    return typed
+
+
+class ArtifactWriter:
+    """Ghi artifact theo từng phần (chunk) vào file tạm, đổi tên khi đóng để không để lại file dở dang
+
+    categories cố định trước tập giá trị của các cột category (vd. các mùa) để mọi chunk dùng chung dictionary.
+    """
+
+    def __init__(self, path: str, fmt: Optional[str] = None, export_csv: bool = False,
+                 categories: Optional[Dict[str, List[str]]] = None):
+        self.fmt = fmt or DEFAULT_FORMAT
+        if self.fmt != 'csv' and not HAS_PYARROW:
+            logger.warning("Chưa cài pyarrow, ghi artifact dạng CSV")
+            self.fmt = 'csv'
+        self.export_csv = export_csv and self.fmt != 'csv'
+        self.path = artifact_path(path, self.fmt)
+        self.csv_path = artifact_path(path, 'csv') if self.export_csv else None
+        # Sắp xếp như apply_dtypes để đọc lại cho cùng categories
+        self.categories = {col: pd.CategoricalDtype(sorted(values)) for col, values in (categories or {}).items()}
+        self.rows = 0
+        self._writer = None
+        self._schema = None
+        self._started = False
+
+    def __enter__(self) -> 'ArtifactWriter':
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+        return False
+
+    def append(self, df: pd.DataFrame) -> None:
+        """Áp kiểu dữ liệu và ghi nối một chunk"""
+        typed = apply_dtypes(df)
+        if self.csv_path:
+            typed.to_csv(self.csv_path + '.tmp', mode='a' if self._started else 'w',
+                         header=not self._started, index=False)
+        if self.fmt == 'csv':
+            typed.to_csv(self.path + '.tmp', mode='a' if self._started else 'w',
+                         header=not self._started, index=False)
+        else:
+            import pyarrow as pa
+            import pyarrow.parquet as pq
+            # Các chunk sau được ép về schema của chunk đầu tiên
+            table = pa.Table.from_pandas(_conform_chunk(typed, self.categories), schema=self._schema, preserve_index=False)
+            if self._writer is None:
+                # Cột toàn giá trị thiếu ở chunk đầu chưa có kiểu: ghi dạng chuỗi
+                self._schema = pa.schema(
+                    [pa.field(field.name, pa.string()) if pa.types.is_null(field.type) else field
+                     for field in table.schema],
+                    metadata=table.schema.metadata
+                )
+                table = table.cast(self._schema)
+                if self.fmt == 'parquet':
+                    self._writer = pq.ParquetWriter(self.path + '.tmp', self._schema)
+                else:
+                    self._writer = pa.ipc.new_file(self.path + '.tmp', self._schema)
+            if self.fmt == 'parquet':
+                self._writer.write_table(table)
+            else:
+                self._writer.write(table)
+        self._started = True
+        self.rows += len(typed)
+
+    def close(self) -> Optional[str]:
+        """Hoàn tất file; trả về đường dẫn artifact (None nếu chưa ghi chunk nào)"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        if not self._started:
+            return None
+        if self.csv_path:
+            os.replace(self.csv_path + '.tmp', self.csv_path)
+        os.replace(self.path + '.tmp', self.path)
+        clear_artifact_parts(self.path)
+        return self.path
+
+    def abort(self) -> None:
+        """Bỏ file tạm khi quá trình ghi bị lỗi"""
+        if self._writer is not None:
+            self._writer.close()
+            self._writer = None
+        for tmp in [self.path + '.tmp', (self.csv_path or self.path) + '.tmp']:
+            if os.path.exists(tmp):
+                os.remove(tmp)
@@ -3,9 +3,66 @@ from itertools import combinations
 import numpy as np
 import pandas as pd
 
+# Longest itemset handled by the vectorized path
+MAX_VECTORIZED_LEN = 3
+
+COLUMNS_ORDERED = [
+    "antecedent support",
+    "consequent support",
+    "support",
+    "confidence",
+    "lift",
+    "leverage",
+    "conviction",
+    "zhangs_metric",
+]
+
+
+def _conviction(sAC, sA, sC):
+    confidence = sAC / sA
+    conviction = np.full(confidence.shape, np.inf, dtype=float)
+    mask = confidence < 1.0
+    conviction[mask] = (1.0 - sC[mask]) / (1.0 - confidence[mask])
+    return conviction
+
+
+def _zhangs_metric(sAC, sA, sC):
+    numerator = METRICS["leverage"](sAC, sA, sC)
+    denominator = np.maximum(sAC * (1 - sA), sA * (sC - sAC))
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return np.where(denominator == 0, 0, numerator / denominator)
+
+
+# Metrics dictionary
+METRICS = {
+    "antecedent support": lambda _, sA, __: sA,
+    "consequent support": lambda _, __, sC: sC,
+    "support": lambda sAC, _, __: sAC,
+    "confidence": lambda sAC, sA, _: sAC / sA,
+    "lift": lambda sAC, sA, sC: METRICS["confidence"](sAC, sA, sC) / sC,
+    "leverage": lambda sAC, sA, sC: sAC - sA * sC,
+    "conviction": _conviction,
+    "zhangs_metric": _zhangs_metric,
+}
+
+# Rules of an itemset of length 2 or 3 as (antecedent positions, consequent positions),
+# in the order the combinations loop emits them (larger antecedents first)
+_RULE_SPLITS = {
+    2: [((0,), (1,)), ((1,), (0,))],
+    3: [((0, 1), (2,)), ((0, 2), (1,)), ((1, 2), (0,)),
+        ((0,), (1, 2)), ((1,), (0, 2)), ((2,), (0, 1))],
+}
+
+
+def association_rules(df, metric="confidence", min_threshold=0.8, support_only=False,
+                      min_lift=None, top_k=None):
+    """Generate rules from frequent itemsets
+
+    min_lift drops rules with a lower lift and top_k keeps only the best top_k
+    rules (by confidence, then lift) of each antecedent. Both are applied while
+    the rules are still arrays, before any frozenset or DataFrame is built.
+    """
 
-def association_rules(df, metric="confidence", min_threshold=0.8, support_only=False):
-   
     if df.empty:
         raise ValueError(
             "The input DataFrame `df` containing the frequent itemsets is empty."
@@ -17,48 +74,65 @@ def association_rules(df, metric="confidence", min_threshold=0.8, support_only=F
             "DataFrame must contain the columns 'support' and 'itemsets'."
         )
 
-    def conviction_helper(sAC, sA, sC):
-        confidence = sAC / sA
-        conviction = np.full(confidence.shape, np.inf, dtype=float)
-        mask = confidence < 1.0
-        conviction[mask] = (1.0 - sC[mask]) / (1.0 - confidence[mask])
-        return conviction
-
-    def zhangs_metric_helper(sAC, sA, sC):
-        numerator = metric_dict["leverage"](sAC, sA, sC)
-        denominator = np.maximum(sAC * (1 - sA), sA * (sC - sAC))
-        with np.errstate(divide="ignore", invalid="ignore"):
-            return np.where(denominator == 0, 0, numerator / denominator)
-
-    # Metrics dictionary
-    metric_dict = {
-        "antecedent support": lambda _, sA, __: sA,
-        "consequent support": lambda _, __, sC: sC,
-        "support": lambda sAC, _, __: sAC,
-        "confidence": lambda sAC, sA, _: sAC / sA,
-        "lift": lambda sAC, sA, sC: metric_dict["confidence"](sAC, sA, sC) / sC,
-        "leverage": lambda sAC, sA, sC: sAC - sA * sC,
-        "conviction": conviction_helper,
-        "zhangs_metric": zhangs_metric_helper,
-    }
-
-    columns_ordered = [
-        "antecedent support",
-        "consequent support",
-        "support",
-        "confidence",
-        "lift",
-        "leverage",
-        "conviction",
-        "zhangs_metric",
-    ]
-
     # Enforce metric if support_only
     if support_only:
         metric = "support"
-    elif metric not in metric_dict:
-        raise ValueError(f"Metric must be one of {list(metric_dict.keys())}, got '{metric}'")
+        if min_lift is not None or top_k is not None:
+            raise ValueError("`min_lift` and `top_k` need the full metrics; they cannot be used with `support_only`.")
+    elif metric not in METRICS:
+        raise ValueError(f"Metric must be one of {list(METRICS.keys())}, got '{metric}'")
+
+    encoded = _encode_itemsets(df["itemsets"].values)
+    if encoded is not None:
+        return _rules_vectorized(encoded, df["support"].values, metric, min_threshold, support_only,
+                                 min_lift, top_k)
+    return _rules_by_combinations(df, metric, min_threshold, support_only, min_lift, top_k)
+
+
+def _empty_rules():
+    return pd.DataFrame(columns=["antecedents", "consequents"] + COLUMNS_ORDERED)
+
+
+def _prune_mask(keep, groups, sAC, sA, sC, min_lift, top_k):
+    """Narrow `keep` to rules with lift >= min_lift and the top_k rules of each antecedent group"""
+    if min_lift is None and top_k is None:
+        return keep
+    with np.errstate(divide="ignore", invalid="ignore"):
+        confidence = METRICS["confidence"](sAC, sA, sC)
+        lift = METRICS["lift"](sAC, sA, sC)
+    if min_lift is not None:
+        keep = keep & (lift >= min_lift)
+    if top_k is not None:
+        rows = np.flatnonzero(keep)
+        # Stable sort by antecedent, then confidence and lift descending; rank = position in the group
+        order = rows[np.lexsort((-lift[rows], -confidence[rows], groups[rows]))]
+        _, starts, counts = np.unique(groups[order], return_index=True, return_counts=True)
+        rank = np.arange(len(order)) - np.repeat(starts, counts)
+        keep = np.zeros_like(keep)
+        keep[order[rank < top_k]] = True
+    return keep
+
+
+def _rules_frame(rule_antecedents, rule_consequents, sAC, sA, sC, support_only):
+    df_rules = pd.DataFrame({
+        "antecedents": rule_antecedents,
+        "consequents": rule_consequents
+    })
+
+    if support_only:
+        df_rules["support"] = sAC
+        for col in COLUMNS_ORDERED:
+            if col != "support":
+                df_rules[col] = np.nan
+    else:
+        for col in COLUMNS_ORDERED:
+            df_rules[col] = METRICS[col](sAC, sA, sC)
+
+    return df_rules
 
+
+def _rules_by_combinations(df, metric, min_threshold, support_only, min_lift=None, top_k=None):
+    """Generic path: enumerate every split of every itemset"""
     # Build frequent itemset support dict
     frequent_items = dict(zip(
         map(frozenset, df["itemsets"].values),
@@ -92,29 +166,139 @@ def association_rules(df, metric="confidence", min_threshold=0.8, support_only=F
                             " Use `support_only=True` to skip computing other metrics."
                         )
 
-                score = metric_dict[metric](sAC, sA, sC)
+                score = METRICS[metric](sAC, sA, sC)
                 if score >= min_threshold:
                     rule_antecedents.append(antecedent)
                     rule_consequents.append(consequent)
                     rule_supports.append([sAC, sA, sC])
 
     if not rule_supports:
-        return pd.DataFrame(columns=["antecedents", "consequents"] + columns_ordered)
+        return _empty_rules()
 
     rule_supports = np.array(rule_supports).T.astype(float)
-    df_rules = pd.DataFrame({
-        "antecedents": rule_antecedents,
-        "consequents": rule_consequents
-    })
+    sAC, sA, sC = rule_supports
+    if min_lift is not None or top_k is not None:
+        groups, _ = pd.factorize(pd.Series(rule_antecedents, dtype=object))
+        keep = _prune_mask(np.ones(len(sAC), dtype=bool), groups, sAC, sA, sC, min_lift, top_k)
+        if not keep.any():
+            return _empty_rules()
+        rule_antecedents = [rule for rule, kept in zip(rule_antecedents, keep) if kept]
+        rule_consequents = [rule for rule, kept in zip(rule_consequents, keep) if kept]
+        sAC, sA, sC = sAC[keep], sA[keep], sC[keep]
+    return _rules_frame(rule_antecedents, rule_consequents, sAC, sA, sC, support_only)
+
+
+def _encode_itemsets(itemsets):
+    """Encode itemsets as a sorted (n, 3) code matrix padded with -1
+
+    Returns (codes, items, lengths) or None when an itemset is longer than
+    MAX_VECTORIZED_LEN. Codes only need a consistent order, so items of any
+    hashable type are supported.
+    """
+    itemsets = [tuple(itemset) for itemset in itemsets]
+    lengths = np.fromiter((len(itemset) for itemset in itemsets), dtype=np.int64, count=len(itemsets))
+    if len(itemsets) == 0 or lengths.max() > MAX_VECTORIZED_LEN or lengths.min() < 1:
+        return None
+    flat = [item for itemset in itemsets for item in itemset]
+    flat_codes, items = pd.factorize(pd.Series(flat, dtype=object))
+    items = np.asarray(items, dtype=object)
+
+    codes = np.full((len(itemsets), MAX_VECTORIZED_LEN), -1, dtype=np.int64)
+    rows = np.repeat(np.arange(len(itemsets)), lengths)
+    cols = np.arange(len(flat)) - np.repeat(np.cumsum(lengths) - lengths, lengths)
+    codes[rows, cols] = flat_codes
+    # Sort each row ascending with the -1 padding kept at the end
+    padded = np.where(codes < 0, len(items), codes)
+    codes = np.sort(padded, axis=1)
+    codes[codes == len(items)] = -1
+    return codes, items, lengths
+
 
+def _itemset_keys(codes, n_items):
+    """One int64 key per sorted code row (base n_items + 1, padding -> 0)"""
+    base = n_items + 1
+    keys = np.zeros(len(codes), dtype=np.int64)
+    for col in range(codes.shape[1]):
+        keys = keys * base + (codes[:, col] + 1)
+    return keys
+
+
+def _rules_vectorized(encoded, supports, metric, min_threshold, support_only, min_lift=None, top_k=None):
+    """Fast path for itemsets of length <= 3: all splits and metrics as array ops"""
+    codes, items, lengths = encoded
+    supports = np.asarray(supports, dtype=float)
+    keys = _itemset_keys(codes, len(items))
+    # Later duplicates win, as in the dict built by the generic path
+    unique_keys, last = np.unique(keys[::-1], return_index=True)
+    itemset_rows = len(keys) - 1 - last
+    # Rules are emitted once per distinct itemset, in order of first appearance
+    _, first = np.unique(keys, return_index=True)
+    first.sort()
+
+    antecedents, consequents, sources, slots = [], [], [], []
+    for length, splits in _RULE_SPLITS.items():
+        rows = first[lengths[first] == length]
+        for slot, (ante_pos, cons_pos) in enumerate(splits):
+            ante = np.full((len(rows), MAX_VECTORIZED_LEN), -1, dtype=np.int64)
+            cons = np.full((len(rows), MAX_VECTORIZED_LEN), -1, dtype=np.int64)
+            ante[:, :len(ante_pos)] = codes[rows][:, list(ante_pos)]
+            cons[:, :len(cons_pos)] = codes[rows][:, list(cons_pos)]
+            antecedents.append(ante)
+            consequents.append(cons)
+            sources.append(rows)
+            slots.append(np.full(len(rows), slot))
+    antecedents = np.concatenate(antecedents)
+    consequents = np.concatenate(consequents)
+    sources = np.concatenate(sources)
+    slots = np.concatenate(slots)
+    if len(sources) == 0:
+        return _empty_rules()
+    order = np.lexsort((slots, sources))
+    antecedents, consequents, sources = antecedents[order], consequents[order], sources[order]
+
+    sAC = supports[itemset_rows[np.searchsorted(unique_keys, keys[sources])]]
     if support_only:
-        df_rules["support"] = rule_supports[0]
-        for col in columns_ordered:
-            if col != "support":
-                df_rules[col] = np.nan
+        sA = sC = None
+        score = sAC
     else:
-        sAC, sA, sC = rule_supports
-        for col in columns_ordered:
-            df_rules[col] = metric_dict[col](sAC, sA, sC)
+        sA = _lookup_support(antecedents, items, unique_keys, itemset_rows, supports)
+        sC = _lookup_support(consequents, items, unique_keys, itemset_rows, supports)
+        with np.errstate(divide="ignore", invalid="ignore"):
+            score = METRICS[metric](sAC, sA, sC)
 
-    return df_rules
+    keep = score >= min_threshold
+    if not support_only:
+        keep = _prune_mask(keep, _itemset_keys(antecedents, len(items)), sAC, sA, sC, min_lift, top_k)
+    if not keep.any():
+        return _empty_rules()
+
+    def to_frozensets(rule_codes):
+        # Build each distinct frozenset once and share it between rules
+        _, first_rows, inverse = np.unique(_itemset_keys(rule_codes, len(items)),
+                                           return_index=True, return_inverse=True)
+        sets = [frozenset(items[row[row >= 0]].tolist()) for row in rule_codes[first_rows]]
+        return [sets[i] for i in inverse]
+
+    with np.errstate(divide="ignore", invalid="ignore"):
+        return _rules_frame(
+            to_frozensets(antecedents[keep]),
+            to_frozensets(consequents[keep]),
+            sAC[keep],
+            None if support_only else sA[keep],
+            None if support_only else sC[keep],
+            support_only
+        )
+
+
+def _lookup_support(rule_codes, items, unique_keys, itemset_rows, supports):
+    """Support of each antecedent/consequent by sorted search on the itemset keys"""
+    keys = _itemset_keys(rule_codes, len(items))
+    pos = np.minimum(np.searchsorted(unique_keys, keys), len(unique_keys) - 1)
+    missing = unique_keys[pos] != keys
+    if missing.any():
+        row = rule_codes[np.argmax(missing)]
+        raise KeyError(
+            f"{frozenset(items[row[row >= 0]].tolist())}\nLikely missing antecedent/consequent support."
+            " Use `support_only=True` to skip computing other metrics."
+        )
+    return supports[itemset_rows[pos]]
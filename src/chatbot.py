@@ -1,19 +1,57 @@
 import pandas as pd
 import numpy as np
 from typing import Dict, List
-import os
 import logging
 
+from artifact_io import artifact_mtime, resolve_artifact, read_artifact
+
 # Cấu hình logging
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(levelname)s - %(message)s')
 logger = logging.getLogger(__name__)
 
+# Các cột theo từng lượt đánh giá của cleaned_data, không thuộc về món
+INTERACTION_COLUMNS = ['user_id', 'rating', 'date', 'season']
+
+# Cột chatbot cần và giá trị mặc định khi dữ liệu không có
+RECIPE_DEFAULTS = {'tags': '', 'ingredients': '', 'calories': 0, 'ingredient_count': 0}
+
+
+def recipe_table(data: pd.DataFrame) -> pd.DataFrame:
+    """Bảng một dòng mỗi món từ bảng tương tác (bỏ các cột theo lượt đánh giá, thêm cột còn thiếu)
+
+    Bảng có thể được dùng chung giữa các phiên nên mọi cột cần thiết được tạo ở đây, không sửa tại chỗ khi tìm kiếm.
+    """
+    recipes = data
+    if 'recipe_id' in data.columns:
+        recipes = data.drop_duplicates('recipe_id').drop(columns=INTERACTION_COLUMNS, errors='ignore')
+    recipes = recipes.reset_index(drop=True)
+    for col, default in RECIPE_DEFAULTS.items():
+        if col not in recipes.columns:
+            recipes[col] = default
+    return recipes
+
+
+def load_recipe_table(data_path: str = '../data/cleaned_data.csv') -> pd.DataFrame:
+    """Đọc artifact cleaned_data và thu về bảng theo món; None nếu không có artifact"""
+    if resolve_artifact(data_path) is None:
+        return None
+    return recipe_table(read_artifact(data_path))
+
+
 class FoodChatbot:
-    def __init__(self, recommender_system, nlp_processor):
-        """Khởi tạo chatbot với hệ thống gợi ý và NLP processor"""
+    def __init__(self, recommender_system, nlp_processor, recipes_df: pd.DataFrame = None):
+        """Khởi tạo chatbot với hệ thống gợi ý và NLP processor
+
+        recipes_df: bảng một dòng mỗi món dùng chung (ví dụ app đọc một lần cho mọi phiên); nếu không có,
+        chatbot tự thu bảng theo món từ dữ liệu của recommender hoặc từ artifact cleaned_data.
+        """
         self.recommender = recommender_system
         self.nlp = nlp_processor
+        self.recipes_df = recipes_df
         self.conversation_history = []
+        # Bảng theo món tự thu khi không được truyền vào, cùng nguồn của nó (dữ liệu recommender hoặc file + mtime)
+        self._recipes_df = None
+        self._recipes_source = None
         
         # Templates để trả lời
         self.response_templates = {
@@ -103,17 +141,32 @@ class FoodChatbot:
         
         return response
     
+    def _recipes(self) -> pd.DataFrame:
+        """Bảng theo món để tìm kiếm: bảng được truyền vào, nếu không thì thu từ dữ liệu recommender/artifact"""
+        if self.recipes_df is not None:
+            return self.recipes_df
+        data = getattr(self.recommender, 'data', None) if self.recommender is not None else None
+        if data is not None:
+            # Dữ liệu của recommender chỉ thay đổi cùng phiên bản model (tải dữ liệu, cập nhật tăng dần)
+            source = ('recommender', getattr(self.recommender, 'model_version', None))
+        else:
+            data_path = resolve_artifact('../data/cleaned_data.csv')
+            if data_path is None:
+                return None
+            # Đọc lại khi file được ghi đè tại cùng đường dẫn (thời điểm sửa thay đổi)
+            source = (data_path, artifact_mtime(data_path))
+        if self._recipes_df is None or self._recipes_source != source:
+            self._recipes_df = recipe_table(data) if data is not None else load_recipe_table(data_path)
+            self._recipes_source = source
+        return self._recipes_df
+
     def find_matching_dishes(self, intent: Dict, user_input: str) -> List[Dict]:
         """Tìm món ăn phù hợp với ý định"""
         try:
-            if self.recommender and hasattr(self.recommender, 'data'):
-                recipes_df = self.recommender.data
-            else:
-                data_path = '../data/cleaned_data.csv'
-                if not os.path.exists(data_path):
-                    logger.error("Không tìm thấy file cleaned_data.csv")
-                    return []
-                recipes_df = pd.read_csv(data_path)
+            recipes_df = self._recipes()
+            if recipes_df is None:
+                logger.error("Không tìm thấy file cleaned_data")
+                return []
             
             # Kiểm tra cột cần thiết
             required_columns = ['name']
@@ -148,8 +201,8 @@ class FoodChatbot:
             
             # Fuzzy matching
             if 'name' in recipes_df.columns:
-                dish_names = recipes_df['name'].dropna().astype(str).tolist()
-                fuzzy_matches = self.nlp.fuzzy_match_dishes(user_input, dish_names)
+                dish_index = self.nlp.get_dish_index(recipes_df)
+                fuzzy_matches = self.nlp.fuzzy_match_dishes(user_input, dish_index)
                 for dish_name, score in fuzzy_matches[:5]:
                     matching_recipes = recipes_df[recipes_df['name'] == dish_name]
                     for _, recipe in matching_recipes.iterrows():
@@ -1,7 +1,8 @@
-import pandas as pd
 import numpy as np
 import os
 
+from artifact_io import resolve_artifact, read_artifact
+
 class DataChecker:
     def __init__(self):
         self.data_files = {
@@ -20,7 +21,9 @@ class DataChecker:
         missing_files = []
         
         for name, path in self.data_files.items():
-            if os.path.exists(path):
+            resolved = resolve_artifact(path)
+            if resolved is not None:
+                path = resolved
                 size = os.path.getsize(path) / 1024  # KB
                 print(f" {name}: {path} ({size:.1f} KB)")
             else:
@@ -34,8 +37,8 @@ class DataChecker:
         print("\n=== KIỂM TRA TÍNH TOÀN VẸN DỮ LIỆU ===")
         
         # Kiểm tra cleaned_data
-        if os.path.exists(self.data_files['cleaned_data']):
-            df = pd.read_csv(self.data_files['cleaned_data'])
+        if resolve_artifact(self.data_files['cleaned_data']):
+            df = read_artifact(self.data_files['cleaned_data'])
             print(f"Cleaned data: {len(df)} rows, {len(df.columns)} columns")
             
             # Kiểm tra missing values
@@ -57,8 +60,8 @@ class DataChecker:
                     print(" Rating trong khoảng hợp lệ")
         
         # Kiểm tra clustered_data
-        if os.path.exists(self.data_files['clustered_data']):
-            df_cluster = pd.read_csv(self.data_files['clustered_data'])
+        if resolve_artifact(self.data_files['clustered_data']):
+            df_cluster = read_artifact(self.data_files['clustered_data'])
             if 'cluster' in df_cluster.columns:
                 n_clusters = df_cluster['cluster'].nunique()
                 print(f" Số clusters: {n_clusters}")
@@ -69,8 +72,8 @@ class DataChecker:
         """Kiểm tra chất lượng dữ liệu"""
         print("\n=== KIỂM TRA CHẤT LƯỢNG DỮ LIỆU ===")
         
-        if os.path.exists(self.data_files['cleaned_data']):
-            df = pd.read_csv(self.data_files['cleaned_data'])
+        if resolve_artifact(self.data_files['cleaned_data']):
+            df = read_artifact(self.data_files['cleaned_data'])
             
             # Số lượng users và recipes
             n_users = df['user_id'].nunique()
@@ -95,8 +98,8 @@ class DataChecker:
         print("\n=== KIỂM TRA KẾT QUẢ MODEL ===")
         
         # Association rules
-        if os.path.exists(self.data_files['association_rules']):
-            rules_df = pd.read_csv(self.data_files['association_rules'])
+        if resolve_artifact(self.data_files['association_rules']):
+            rules_df = read_artifact(self.data_files['association_rules'])
             print(f" Association rules: {len(rules_df)} rules")
 
             if len(rules_df) > 0:
@@ -108,8 +111,8 @@ class DataChecker:
 
         
         # Seasonal trends
-        if os.path.exists(self.data_files['seasonal_trends']):
-            trends_df = pd.read_csv(self.data_files['seasonal_trends'])
+        if resolve_artifact(self.data_files['seasonal_trends']):
+            trends_df = read_artifact(self.data_files['seasonal_trends'])
             print(f" Seasonal trends: {len(trends_df)} entries")
             
             seasons = trends_df['season'].unique()
@@ -118,8 +121,8 @@ class DataChecker:
             print(" Không có seasonal trends")
         
         # Menu
-        if os.path.exists(self.data_files['menu']):
-            menu_df = pd.read_csv(self.data_files['menu'])
+        if resolve_artifact(self.data_files['menu']):
+            menu_df = read_artifact(self.data_files['menu'])
             print(f" Menu: {len(menu_df)} items")
         else:
             print(" Không có menu")
@@ -155,7 +158,7 @@ class DataChecker:
                 
                 # Test với user có sẵn
                 if user_id is None:
-                    df = pd.read_csv(self.data_files['cleaned_data'])
+                    df = read_artifact(self.data_files['cleaned_data'])
                     user_id = df['user_id'].iloc[0]
                 
                 recs = recommender.recommend_for_user(user_id, season='Hè', n_recommendations=5)
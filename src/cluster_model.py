@@ -0,0 +1,137 @@
+import json
+import logging
+import os
+from typing import List, Optional, Sequence, Tuple
+
+import numpy as np
+from scipy.optimize import linear_sum_assignment
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi bố cục file của cluster model thay đổi
+CLUSTER_MODEL_VERSION = 1
+
+# Tên theo đặc điểm tâm cụm so với trung bình toàn danh mục: (thấp hơn, cao hơn)
+SPEED_NAMES = ('Nhanh', 'Lâu')
+WEIGHT_NAMES = ('Nhẹ', 'Đậm')
+
+
+def derive_cluster_names(centers: np.ndarray, feature_names: Sequence[str], reference: np.ndarray,
+                         taken: Sequence[str] = ()) -> List[str]:
+    """Đặt tên cụm theo thời gian nấu (nhanh/lâu) và calo (nhẹ/đậm) của tâm cụm; tên trùng được đánh số"""
+    minutes = list(feature_names).index('minutes')
+    calories = list(feature_names).index('calories')
+    used = set(taken)
+    names = []
+    for center in centers:
+        base = (f"{SPEED_NAMES[int(center[minutes] >= reference[minutes])]} & "
+                f"{WEIGHT_NAMES[int(center[calories] >= reference[calories])]}")
+        name, k = base, 2
+        while name in used:
+            name, k = f"{base} {k}", k + 1
+        used.add(name)
+        names.append(name)
+    return names
+
+
+class ClusterModel:
+    """Tâm cụm (đơn vị gốc), tham số scaler và tên cụm; gán cụm cho món mới trong O(k) không cần fit lại"""
+
+    def __init__(self, feature_names: List[str], mean: np.ndarray, scale: np.ndarray,
+                 cluster_ids: np.ndarray, centers: np.ndarray, names: List[str]):
+        self.feature_names = list(feature_names)
+        self.mean = np.asarray(mean, dtype=np.float64)
+        self.scale = np.asarray(scale, dtype=np.float64)
+        self.cluster_ids = np.asarray(cluster_ids, dtype=np.int64)
+        self.centers = np.asarray(centers, dtype=np.float64)
+        self.names = list(names)
+
+    def __len__(self) -> int:
+        return len(self.cluster_ids)
+
+    def name_map(self) -> dict:
+        return dict(zip(self.cluster_ids.tolist(), self.names))
+
+    @classmethod
+    def from_fit(cls, feature_names: List[str], mean: np.ndarray, scale: np.ndarray, centers: np.ndarray,
+                 previous: Optional['ClusterModel'] = None) -> Tuple['ClusterModel', np.ndarray]:
+        """Dựng model từ kết quả fit, ghép với model trước theo độ gần tâm cụm
+
+        Trả về (model, relabel) với relabel[nhãn của lần fit] = id cụm ổn định. Cụm ghép được giữ id
+        và tên cũ; cụm mới nhận id chưa dùng và tên suy ra từ tâm cụm.
+        """
+        centers = np.asarray(centers, dtype=np.float64)
+        relabel = np.full(len(centers), -1, dtype=np.int64)
+        names = [None] * len(centers)
+        if previous is not None and len(previous) > 0 and previous.feature_names == list(feature_names):
+            # Khoảng cách giữa các tâm cụm trên thang đo của lần fit mới
+            new_scaled = (centers - mean) / scale
+            old_scaled = (previous.centers - mean) / scale
+            cost = ((new_scaled[:, None, :] - old_scaled[None, :, :]) ** 2).sum(axis=2)
+            rows, cols = linear_sum_assignment(cost)
+            relabel[rows] = previous.cluster_ids[cols]
+            for row, col in zip(rows, cols):
+                names[row] = previous.names[col]
+        unmatched = np.flatnonzero(relabel < 0)
+        if len(unmatched) > 0:
+            used = set(relabel[relabel >= 0].tolist())
+            free = [cluster_id for cluster_id in range(len(centers) + len(used)) if cluster_id not in used]
+            relabel[unmatched] = free[:len(unmatched)]
+            fresh = derive_cluster_names(centers[unmatched], feature_names, np.asarray(mean),
+                                         taken=[name for name in names if name is not None])
+            for row, name in zip(unmatched, fresh):
+                names[row] = name
+        order = np.argsort(relabel)
+        model = cls(feature_names, mean, scale, relabel[order], centers[order], [names[k] for k in order])
+        return model, relabel
+
+    def assign(self, features: np.ndarray) -> np.ndarray:
+        """Id cụm gần nhất cho từng dòng đặc trưng (đơn vị gốc, theo thứ tự feature_names)"""
+        features = np.asarray(features, dtype=np.float64)
+        if len(features) == 0 or len(self) == 0:
+            return np.empty(0, dtype=np.int64)
+        scaled = (features - self.mean) / self.scale
+        centers = (self.centers - self.mean) / self.scale
+        distances = ((scaled[:, None, :] - centers[None, :, :]) ** 2).sum(axis=2)
+        return self.cluster_ids[distances.argmin(axis=1)]
+
+    def to_dict(self) -> dict:
+        return {
+            'format_version': CLUSTER_MODEL_VERSION,
+            'feature_names': self.feature_names,
+            'mean': self.mean.tolist(),
+            'scale': self.scale.tolist(),
+            'cluster_ids': self.cluster_ids.tolist(),
+            'centers': self.centers.tolist(),
+            'names': self.names
+        }
+
+    @classmethod
+    def from_dict(cls, meta: dict) -> Optional['ClusterModel']:
+        """Dựng model từ dict của to_dict; None nếu khác phiên bản"""
+        if meta.get('format_version') != CLUSTER_MODEL_VERSION:
+            return None
+        return cls(meta['feature_names'], np.asarray(meta['mean']), np.asarray(meta['scale']),
+                   np.asarray(meta['cluster_ids']), np.asarray(meta['centers']), meta['names'])
+
+    def save(self, path: str) -> None:
+        """Lưu model ra file JSON (ghi file tạm rồi đổi tên)"""
+        os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+        with open(path + '.tmp', 'w', encoding='utf-8') as f:
+            json.dump(self.to_dict(), f, ensure_ascii=False)
+        os.replace(path + '.tmp', path)
+
+    @classmethod
+    def load(cls, path: str) -> Optional['ClusterModel']:
+        """Tải model đã lưu; trả về None nếu không có hoặc lỗi thời"""
+        if not os.path.exists(path):
+            return None
+        try:
+            with open(path, encoding='utf-8') as f:
+                model = cls.from_dict(json.load(f))
+            if model is not None:
+                logger.info(f"Đã tải cluster model từ {path}: {len(model)} cụm")
+            return model
+        except Exception as e:
+            logger.warning(f"Không thể tải cluster model từ {path}: {e}")
+            return None
@@ -3,11 +3,61 @@ import numpy as np
 import re
 from datetime import datetime
 import ast
+import argparse
+import io
+import json
+import os
+import warnings
+
+from artifact_io import (ArtifactWriter, append_artifact_part, apply_dtypes, artifact_exists, read_artifact,
+                         write_artifact)
+
+# Các cột cần đọc từ file thô
+RECIPE_COLUMNS = ['id', 'name', 'minutes', 'ingredients', 'nutrition']
+INTERACTION_COLUMNS = ['user_id', 'recipe_id', 'date', 'rating']
+
+# 7 trường của cột nutrition theo thứ tự trong RAW_recipes
+NUTRITION_FIELDS = ['calories', 'total_fat', 'sugar', 'sodium', 'protein', 'saturated_fat', 'carbohydrates']
+
+# Danh sách số dạng "[a, b, ...]" và danh sách chuỗi dạng "['x', "y's", ...]"
+_NUMBER_LIST = re.compile(r'^\[[-+0-9.eE,\s]*\]$')
+_SIMPLE_STRING_LIST = re.compile(r"^\[(?:'[^'\\]*'(?:, '[^'\\]*')*)?\]$")
+_QUOTED = r"'(?:[^'\\]|\\.)*'|\"(?:[^\"\\]|\\.)*\""
+_STRING_LIST = re.compile(rf'^\s*\[\s*(?:(?:{_QUOTED})(?:\s*,\s*(?:{_QUOTED}))*(?:\s*,)?)?\s*\]\s*$')
+_QUOTED_ITEM = re.compile(rf'({_QUOTED})')
+
+# Định dạng ngày trong RAW_interactions
+DATE_FORMAT = '%Y-%m-%d'
+
+# Bảng tháng (1-12) -> mùa; 'south_vietnam' chỉ có mùa khô (12-4) và mùa mưa (5-11)
+SEASON_TABLES = {
+    'temperate': ['Đông', 'Đông', 'Xuân', 'Xuân', 'Xuân', 'Hè', 'Hè', 'Hè', 'Thu', 'Thu', 'Thu', 'Đông'],
+    'southern_hemisphere': ['Hè', 'Hè', 'Thu', 'Thu', 'Thu', 'Đông', 'Đông', 'Đông', 'Xuân', 'Xuân', 'Xuân', 'Hè'],
+    'south_vietnam': ['Mùa khô'] * 4 + ['Mùa mưa'] * 7 + ['Mùa khô']
+}
+
+# Các cột của cleaned_data
+OUTPUT_COLUMNS = [
+    'user_id', 'recipe_id', 'rating', 'date', 'season',
+    'name', 'minutes', 'calories', 'ingredient_count', 'cooking_time_category'
+]
 
 class DataProcessor:
-    def __init__(self):
+    def __init__(self, season_table='temperate', date_format=DATE_FORMAT):
+        if season_table not in SEASON_TABLES:
+            raise ValueError(f"Bảng mùa không hợp lệ: {season_table}, chọn một trong {list(SEASON_TABLES)}")
+        self.season_table = season_table
+        self.date_format = date_format
+        # Mảng tra cứu: mã category của mùa theo chỉ số tháng (0 cho NaT)
+        month_seasons = SEASON_TABLES[season_table]
+        self._season_categories = list(dict.fromkeys(month_seasons))
+        self._season_codes = np.array(
+            [-1] + [self._season_categories.index(season) for season in month_seasons], dtype=np.int8
+        )
         self.recipes_df = None
         self.interactions_df = None
+        # Số dòng nutrition/ingredients sai định dạng ở lần làm sạch gần nhất
+        self.parse_report = {}
         
     def load_raw_data(self, recipes_path, interactions_path):
         """Tải dữ liệu thô từ file CSV"""
@@ -36,11 +86,22 @@ class DataProcessor:
         self.recipes_df = self.recipes_df[self.recipes_df['minutes'] > 0]
         self.recipes_df = self.recipes_df[self.recipes_df['minutes'] <= 300]  # Loại bỏ thời gian quá dài
         
-        # Xử lý nutrition (lấy calories)
-        self.recipes_df['calories'] = self.recipes_df['nutrition'].apply(self._extract_calories)
+        # Xử lý nutrition (7 trường, dòng sai định dạng có calories = 0)
+        nutrition, nutrition_malformed = self._parse_nutrition_bulk(self.recipes_df['nutrition'])
+        for field in NUTRITION_FIELDS:
+            self.recipes_df[field] = nutrition[field]
         
         # Xử lý ingredients
-        self.recipes_df['ingredient_count'] = self.recipes_df['ingredients'].apply(self._count_ingredients)
+        ingredient_count, ingredients_malformed = self._parse_ingredients_bulk(self.recipes_df['ingredients'])
+        self.recipes_df['ingredient_count'] = ingredient_count
+        
+        self.parse_report.update({
+            'nutrition_malformed': int(nutrition_malformed.sum()),
+            'ingredients_malformed': int(ingredients_malformed.sum())
+        })
+        if nutrition_malformed.any() or ingredients_malformed.any():
+            print(f"Dòng sai định dạng: {self.parse_report['nutrition_malformed']} nutrition, "
+                  f"{self.parse_report['ingredients_malformed']} ingredients")
         
         # Phân loại theo thời gian nấu
         self.recipes_df['cooking_time_category'] = pd.cut(
@@ -56,7 +117,7 @@ class DataProcessor:
         try:
             nutrition_list = ast.literal_eval(nutrition_str)
             return nutrition_list[0] if len(nutrition_list) > 0 else 0
-        except:
+        except (ValueError, SyntaxError, TypeError):
             return 0
     
     def _count_ingredients(self, ingredients_str):
@@ -64,72 +125,309 @@ class DataProcessor:
         try:
             ingredients_list = ast.literal_eval(ingredients_str)
             return len(ingredients_list)
-        except:
+        except (ValueError, SyntaxError, TypeError):
             return 0
     
+    def _parse_nutrition_bulk(self, nutrition):
+        """Tách 7 trường nutrition cho cả cột bằng các phép str vector hóa
+
+        Trả về (DataFrame các trường, mask dòng sai định dạng). Dòng sai định dạng
+        có calories = 0 như _extract_calories, các trường còn lại để NaN.
+        """
+        n_fields = len(NUTRITION_FIELDS)
+        text = nutrition.astype(str).str.strip()
+        candidate = (nutrition.notna() & text.str.match(_NUMBER_LIST)).to_numpy()
+        inner = text.str.slice(1, -1).str.strip().str.rstrip(',')
+        sizes = np.where(inner.to_numpy() == '', 0, inner.str.count(',').to_numpy() + 1)
+        values = np.full((len(nutrition), n_fields), np.nan, dtype=np.float32)
+        malformed = ~candidate
+        
+        # Đường nhanh: mọi dòng đủ 7 trường được đọc trong một lần np.fromstring
+        full = candidate & (sizes == n_fields)
+        slow = candidate & (sizes > 0) & ~full
+        if full.any():
+            with warnings.catch_warnings():
+                warnings.simplefilter('ignore', DeprecationWarning)
+                parsed = np.fromstring(','.join(inner[full].tolist()), dtype=np.float64, sep=',')
+            if parsed.size == n_fields * full.sum():
+                values[full] = parsed.reshape(-1, n_fields)
+            else:
+                slow |= full
+        
+        # Các dòng còn lại (số trường khác 7 hoặc có token lỗi) được tách theo cột
+        if slow.any():
+            parts = inner[slow].str.split(',', expand=True)
+            numeric = parts.apply(lambda col: pd.to_numeric(col.str.strip(), errors='coerce'))
+            bad = (numeric.isna() & parts.notna()).any(axis=1).to_numpy()
+            rows = np.flatnonzero(slow)
+            k = min(n_fields, numeric.shape[1])
+            values[rows[~bad], :k] = numeric.to_numpy(dtype=np.float64)[~bad, :k]
+            malformed[rows[bad]] = True
+        
+        fields = pd.DataFrame(values, index=nutrition.index, columns=NUTRITION_FIELDS)
+        # Danh sách rỗng hoặc sai định dạng: calories = 0
+        fields['calories'] = fields['calories'].fillna(0)
+        return fields, pd.Series(malformed, index=nutrition.index)
+    
+    def _parse_ingredients_bulk(self, ingredients, return_lists=False):
+        """Đếm (và tách nếu cần) danh sách nguyên liệu cho cả cột
+
+        Trả về (số nguyên liệu, mask dòng sai định dạng) hoặc thêm Series các list
+        khi return_lists=True. Dòng sai định dạng có số nguyên liệu = 0.
+        """
+        text = ingredients.astype(str)
+        present = ingredients.notna().to_numpy()
+        counts = np.zeros(len(ingredients), dtype=np.int16)
+        
+        # Đường nhanh: danh sách chỉ gồm chuỗi nháy đơn không escape, số phần tử = số dấu nháy / 2
+        simple = present & text.str.match(_SIMPLE_STRING_LIST).to_numpy()
+        counts[simple] = text[simple].str.count("'").to_numpy() // 2
+        well_formed = simple.copy()
+        
+        # Các dòng còn lại dùng regex đầy đủ (nháy kép, escape)
+        rest = present & ~simple
+        if rest.any():
+            rest_text = text[rest]
+            rest_ok = rest_text.str.match(_STRING_LIST).to_numpy()
+            rows = np.flatnonzero(rest)[rest_ok]
+            counts[rows] = rest_text[rest_ok].str.count(_QUOTED_ITEM).to_numpy()
+            well_formed[rows] = True
+        
+        counts = pd.Series(counts, index=ingredients.index)
+        malformed = pd.Series(~well_formed, index=ingredients.index)
+        if not return_lists:
+            return counts, malformed
+        # Chỉ phần tử có ký tự escape mới cần literal_eval
+        lists = text.where(well_formed, '').str.findall(_QUOTED_ITEM).map(
+            lambda items: [ast.literal_eval(item) if '\\' in item else item[1:-1] for item in items]
+        )
+        return counts, malformed, lists
+    
     def clean_interactions_data(self):
         """Làm sạch dữ liệu tương tác"""
         if self.interactions_df is None:
             return None
             
+        self.parse_report['invalid_dates'] = 0
+        self.interactions_df = self._clean_interactions_chunk(self.interactions_df)
+        return self.interactions_df
+    
+    def _clean_interactions_chunk(self, interactions):
+        """Lọc rating, chuyển đổi date và thêm mùa cho một khối tương tác"""
         # Chỉ giữ rating từ 1-5
-        self.interactions_df = self.interactions_df[
-            (self.interactions_df['rating'] >= 1) & 
-            (self.interactions_df['rating'] <= 5)
-        ]
+        interactions = interactions[
+            (interactions['rating'] >= 1) & 
+            (interactions['rating'] <= 5)
+        ].copy()
         
-        # Chuyển đổi date
-        self.interactions_df['date'] = pd.to_datetime(self.interactions_df['date'])
+        # Chuyển đổi date theo định dạng cố định, bỏ các dòng ngày không hợp lệ
+        interactions['date'] = pd.to_datetime(interactions['date'], format=self.date_format, errors='coerce')
+        invalid_dates = interactions['date'].isna()
+        if invalid_dates.any():
+            self.parse_report['invalid_dates'] = self.parse_report.get('invalid_dates', 0) + int(invalid_dates.sum())
+            print(f"Bỏ {int(invalid_dates.sum())} tương tác có ngày không hợp lệ")
+            interactions = interactions[~invalid_dates].copy()
         
         # Thêm thông tin mùa
-        self.interactions_df['season'] = self.interactions_df['date'].dt.month.apply(self._get_season)
+        interactions['season'] = self._season_from_dates(interactions['date'])
         
-        return self.interactions_df
+        return interactions
+    
+    def _season_from_dates(self, dates):
+        """Tra mùa theo tháng bằng mảng tra cứu, trả về categorical"""
+        months = dates.dt.month.fillna(0).to_numpy(dtype=np.int64)
+        return pd.Categorical.from_codes(self._season_codes[months], categories=self._season_categories)
     
     def _get_season(self, month):
         """Xác định mùa từ tháng"""
-        if month in [12, 1, 2]:
-            return 'Đông'
-        elif month in [3, 4, 5]:
-            return 'Xuân'
-        elif month in [6, 7, 8]:
-            return 'Hè'
-        else:
-            return 'Thu'
+        return SEASON_TABLES[self.season_table][int(month) - 1]
     
-    def merge_and_save(self, output_path):
-        """Kết hợp dữ liệu và lưu file"""
+    def merge_and_save(self, output_path, export_csv=False):
+        """Kết hợp dữ liệu và lưu file (dạng cột, export_csv=True để ghi thêm CSV)"""
         if self.recipes_df is None or self.interactions_df is None:
             return False
             
-        # Kết hợp dữ liệu
+        cleaned_df = self._merge_interactions(self.interactions_df, self.recipes_df)
+        
+        # Lưu file
+        saved_path = write_artifact(cleaned_df, output_path, export_csv=export_csv)
+        print(f"Đã lưu {len(cleaned_df)} bản ghi vào {saved_path}")
+        
+        return cleaned_df
+    
+    def _merge_interactions(self, interactions, recipes):
+        """Kết hợp tương tác với công thức và chọn các cột cần thiết"""
         merged_df = pd.merge(
-            self.interactions_df, 
-            self.recipes_df, 
+            interactions, 
+            recipes, 
             left_on='recipe_id', 
             right_on='id', 
             how='inner'
         )
-        
-        # Chọn các cột cần thiết
-        columns_to_keep = [
-            'user_id', 'recipe_id', 'rating', 'date', 'season',
-            'name', 'minutes', 'calories', 'ingredient_count', 'cooking_time_category'
+        return merged_df[OUTPUT_COLUMNS]
+    
+    def _load_recipe_lookup(self, recipes_path):
+        """Tải và làm sạch RAW_recipes, chỉ giữ các cột cần cho việc kết hợp"""
+        try:
+            self.recipes_df = pd.read_csv(recipes_path, usecols=RECIPE_COLUMNS)
+        except Exception as e:
+            print(f"Lỗi tải dữ liệu: {e}")
+            return None
+        self.clean_recipes_data()
+        self.recipes_df = self.recipes_df[
+            ['id', 'name', 'minutes', 'calories', 'ingredient_count', 'cooking_time_category']
         ]
+        return self.recipes_df
+    
+    def process_streaming(self, recipes_path, interactions_path, output_path, chunk_size=500000, export_csv=False):
+        """Xử lý RAW_interactions theo từng khối và ghi nối dần ra file
+
+        Bộ nhớ tối đa chỉ gồm bảng công thức đã làm sạch và một khối tương tác.
+        """
+        recipe_lookup = self._load_recipe_lookup(recipes_path)
+        if recipe_lookup is None:
+            return 0
+        
+        n_read = 0
+        self.parse_report['invalid_dates'] = 0
+        with ArtifactWriter(output_path, export_csv=export_csv,
+                            categories={'season': self._season_categories}) as writer:
+            for chunk in pd.read_csv(interactions_path, usecols=INTERACTION_COLUMNS, chunksize=chunk_size):
+                n_read += len(chunk)
+                merged = self._merge_interactions(self._clean_interactions_chunk(chunk), recipe_lookup)
+                if len(merged) > 0:
+                    writer.append(merged)
+                print(f"Đã xử lý {n_read} tương tác, ghi {writer.rows} bản ghi")
+        print(f"Đã lưu {writer.rows} bản ghi vào {writer.path}")
+        return writer.rows
+
+    def process_incremental(self, recipes_path, interactions_path, output_path, chunk_size=500000, export_csv=False):
+        """Chỉ làm sạch các tương tác mới kể từ lần chạy trước và ghi nối chúng thành một phần mới của cleaned_data
+
+        RAW_interactions được coi là file chỉ ghi nối: watermark lưu vị trí byte đã xử lý nên lần sau chỉ đọc
+        phần phía sau. Nếu chưa có vị trí này hoặc file đã bị thay (ngắn hơn vị trí đã lưu) thì đọc lại toàn bộ,
+        lọc theo ngày watermark và bỏ các dòng đã có trong store.
+        Trả về DataFrame các bản ghi mới được thêm (rỗng nếu không có gì mới).
+        """
+        if not artifact_exists(output_path):
+            print("Chưa có cleaned_data, xử lý toàn bộ dữ liệu")
+            raw_size = os.path.getsize(interactions_path)
+            self.process_streaming(recipes_path, interactions_path, output_path, chunk_size, export_csv)
+            if not artifact_exists(output_path):
+                return pd.DataFrame(columns=OUTPUT_COLUMNS)
+            store = read_artifact(output_path)
+            self._write_watermark(output_path, store['date'].max(), len(store), raw_size)
+            return store
         
-        cleaned_df = merged_df[columns_to_keep]
+        state = self._read_watermark_state(output_path)
+        if state is None:
+            dates = read_artifact(output_path, columns=['date'])['date']
+            state = {'date': dates.max(), 'rows': len(dates), 'raw_offset': None}
+        watermark = state['date']
+        raw_size = os.path.getsize(interactions_path)
+        offset = state['raw_offset']
+        appended_only = bool(offset) and offset <= raw_size
+        if appended_only:
+            chunks, raw_offset = self._read_appended_interactions(interactions_path, offset, raw_size, chunk_size)
+        else:
+            print(f"Không dùng được vị trí đã đọc của {interactions_path}, đọc lại toàn bộ từ {watermark.date()}")
+            chunks = pd.read_csv(interactions_path, usecols=INTERACTION_COLUMNS, chunksize=chunk_size)
+            raw_offset = raw_size
         
-        # Lưu file
-        cleaned_df.to_csv(output_path, index=False)
-        print(f"Đã lưu {len(cleaned_df)} bản ghi vào {output_path}")
+        new_parts = []
+        recipe_lookup = None
+        self.parse_report['invalid_dates'] = 0
+        for chunk in chunks:
+            cleaned = self._clean_interactions_chunk(chunk)
+            if not appended_only:
+                cleaned = cleaned[cleaned['date'] >= watermark]
+            if len(cleaned) == 0:
+                continue
+            # Bảng công thức chỉ được tải khi thực sự có tương tác mới
+            if recipe_lookup is None:
+                recipe_lookup = self._load_recipe_lookup(recipes_path)
+                if recipe_lookup is None:
+                    return pd.DataFrame(columns=OUTPUT_COLUMNS)
+            new_parts.append(self._merge_interactions(cleaned, recipe_lookup))
+        delta = apply_dtypes(pd.concat(new_parts, ignore_index=True)) if new_parts else None
         
-        return cleaned_df
+        if delta is not None and not appended_only:
+            # Đọc lại toàn bộ file thô: các tương tác từ ngày watermark có thể đã nằm trong store
+            key = ['user_id', 'recipe_id', 'date']
+            store_keys = read_artifact(output_path, columns=key)
+            seen = store_keys[store_keys['date'] >= watermark].drop_duplicates()
+            delta = delta.merge(seen.assign(_seen=True), on=key, how='left')
+            delta = delta[delta['_seen'].isna()].drop(columns='_seen').reset_index(drop=True)
+        if delta is None or len(delta) == 0:
+            print(f"Không có tương tác mới từ {watermark.date()}")
+            self._write_watermark(output_path, watermark, state['rows'], raw_offset)
+            return pd.DataFrame(columns=OUTPUT_COLUMNS)
+        
+        saved_path = append_artifact_part(delta, output_path, export_csv=export_csv)
+        n_rows = state['rows'] + len(delta)
+        self._write_watermark(output_path, max(watermark, delta['date'].max()), n_rows, raw_offset)
+        print(f"Đã ghi {len(delta)} bản ghi mới vào {saved_path} ({n_rows} bản ghi)")
+        return delta
+    
+    @staticmethod
+    def _read_appended_interactions(interactions_path, offset, end, chunk_size):
+        """Đọc các dòng được ghi nối vào file thô từ vị trí offset; trả về (các khối, vị trí đã đọc tới)"""
+        header = pd.read_csv(interactions_path, nrows=0).columns.tolist()
+        with open(interactions_path, 'rb') as f:
+            f.seek(offset)
+            data = f.read(end - offset)
+        # Chỉ lấy tới hết dòng đầy đủ cuối cùng, dòng đang ghi dở được đọc ở lần sau
+        data = data[:data.rfind(b'\n') + 1]
+        if not data.strip():
+            return [], offset + len(data)
+        chunks = pd.read_csv(io.BytesIO(data), names=header, header=None, usecols=INTERACTION_COLUMNS,
+                             chunksize=chunk_size)
+        return chunks, offset + len(data)
+    
+    @staticmethod
+    def _watermark_path(output_path):
+        return os.path.splitext(output_path)[0] + '.watermark.json'
+    
+    def _read_watermark_state(self, output_path):
+        path = self._watermark_path(output_path)
+        if not os.path.exists(path):
+            return None
+        with open(path, encoding='utf-8') as f:
+            state = json.load(f)
+        return {'date': pd.Timestamp(state['date']), 'rows': state['rows'], 'raw_offset': state.get('raw_offset')}
+    
+    def read_watermark(self, output_path):
+        """Ngày mới nhất đã được xử lý vào cleaned_data (None nếu chưa có)"""
+        state = self._read_watermark_state(output_path)
+        return state['date'] if state is not None else None
+    
+    def _write_watermark(self, output_path, date, n_rows, raw_offset=None):
+        with open(self._watermark_path(output_path), 'w', encoding='utf-8') as f:
+            json.dump({'date': pd.Timestamp(date).isoformat(), 'rows': int(n_rows), 'raw_offset': raw_offset}, f)
 
 if __name__ == "__main__":
-    processor = DataProcessor()
+    parser = argparse.ArgumentParser(description='Làm sạch và kết hợp dữ liệu thô')
+    parser.add_argument('--export-csv', action='store_true', help='ghi thêm bản CSV của cleaned_data')
+    parser.add_argument('--stream', action='store_true', help='xử lý RAW_interactions theo từng khối')
+    parser.add_argument('--incremental', action='store_true', help='chỉ xử lý tương tác mới hơn watermark')
+    parser.add_argument('--chunk-size', type=int, default=500000, help='số dòng tương tác mỗi khối')
+    parser.add_argument('--season-table', default='temperate', choices=list(SEASON_TABLES), help='bảng tháng -> mùa')
+    args = parser.parse_args()
+
+    processor = DataProcessor(season_table=args.season_table)
     
     # Xử lý dữ liệu
-    if processor.load_raw_data('../data/RAW_recipes.csv', '../data/RAW_interactions.csv'):
+    if args.incremental:
+        processor.process_incremental(
+            '../data/RAW_recipes.csv', '../data/RAW_interactions.csv', '../data/cleaned_data.csv',
+            chunk_size=args.chunk_size, export_csv=args.export_csv
+        )
+    elif args.stream:
+        processor.process_streaming(
+            '../data/RAW_recipes.csv', '../data/RAW_interactions.csv', '../data/cleaned_data.csv',
+            chunk_size=args.chunk_size, export_csv=args.export_csv
+        )
+    elif processor.load_raw_data('../data/RAW_recipes.csv', '../data/RAW_interactions.csv'):
         processor.clean_recipes_data()
         processor.clean_interactions_data()
-        processor.merge_and_save('../data/cleaned_data.csv')
\ No newline at end of file
+        processor.merge_and_save('../data/cleaned_data.csv', export_csv=args.export_csv)
\ No newline at end of file
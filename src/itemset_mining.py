@@ -0,0 +1,123 @@
+import logging
+import os
+from concurrent.futures import ProcessPoolExecutor
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy.sparse import csc_matrix, triu
+
+logger = logging.getLogger(__name__)
+
+# Danh sách tid (chỉ số giao dịch) của các món phổ biến, dùng chung trong mỗi process con
+_TIDS = None
+
+
+def _init_eclat_worker(tids):
+    global _TIDS
+    _TIDS = tids
+
+
+def _min_count(min_support: float, n_transactions: int) -> int:
+    """Số giao dịch nhỏ nhất c với c / n >= min_support (so sánh theo tỉ lệ như apriori)"""
+    count = max(int(np.ceil(min_support * n_transactions)), 0)
+    while count > 0 and (count - 1) / n_transactions >= min_support:
+        count -= 1
+    while count / n_transactions < min_support:
+        count += 1
+    return count
+
+
+def _extend(prefix: Tuple[int, ...], candidates: List[Tuple[int, np.ndarray]], min_count: int, max_len: int, found: List[Tuple[Tuple[int, ...], int]]) -> None:
+    """Eclat theo chiều sâu: giao tid-list của tiền tố với từng ứng viên cùng lớp tương đương"""
+    for k, (item, tids) in enumerate(candidates):
+        itemset = prefix + (item,)
+        found.append((itemset, len(tids)))
+        if len(itemset) >= max_len:
+            continue
+        extensions = []
+        for other, other_tids in candidates[k + 1:]:
+            common = np.intersect1d(tids, other_tids, assume_unique=True)
+            if len(common) >= min_count:
+                extensions.append((other, common))
+        if extensions:
+            _extend(itemset, extensions, min_count, max_len, found)
+
+
+def _mine_prefix_class(task) -> List[Tuple[Tuple[int, ...], int]]:
+    """Khai phá các tập >= 3 phần tử bắt đầu bằng món `first` từ các cặp phổ biến của nó"""
+    first, partners, min_count, max_len = task
+    first_tids = _TIDS[first]
+    candidates = [(j, np.intersect1d(first_tids, _TIDS[j], assume_unique=True)) for j in partners]
+    found = []
+    _extend((first,), candidates, min_count, max_len, found)
+    # Các cặp đã được đếm vector hóa
+    return [(itemset, count) for itemset, count in found if len(itemset) >= 3]
+
+
+def mine_frequent_itemsets(matrix, min_support: float = 0.005, max_len: Optional[int] = None,
+                           n_jobs: int = 1, item_ids=None) -> pd.DataFrame:
+    """Tìm tập món phổ biến trực tiếp trên ma trận thưa giao dịch x món (Eclat)
+
+    Tập 1 và 2 phần tử được đếm vector hóa trên ma trận CSC (X^T X cho các cặp),
+    tập dài hơn được mở rộng bằng giao tid-list theo từng lớp tiền tố, chia cho
+    n_jobs process. Trả về DataFrame ['support', 'itemsets'] như mlxtend.apriori,
+    itemsets là frozenset các id món (item_ids, mặc định là chỉ số cột).
+    """
+    X = csc_matrix(matrix, dtype=bool)
+    X.eliminate_zeros()
+    X.sum_duplicates()
+    X.sort_indices()
+    n_transactions, n_items = X.shape
+    item_ids = np.arange(n_items) if item_ids is None else np.asarray(item_ids)
+    if max_len is None:
+        max_len = n_items
+    if n_transactions == 0 or max_len < 1:
+        return pd.DataFrame({'support': pd.Series(dtype=float), 'itemsets': pd.Series(dtype=object)})
+    min_count = _min_count(min_support, n_transactions)
+    counts = np.diff(X.indptr)
+    frequent = np.flatnonzero(counts >= min_count)
+
+    itemsets = [(int(i),) for i in frequent]
+    supports = counts[frequent].tolist()
+    logger.info(f"{len(frequent)}/{n_items} món đạt min_support")
+
+    if max_len >= 2 and len(frequent) >= 2:
+        Xf = X[:, frequent].astype(np.int32)
+        pairs = triu((Xf.T @ Xf).tocsr(), k=1).tocoo()
+        keep = pairs.data >= min_count
+        rows, cols, pair_counts = pairs.row[keep], pairs.col[keep], pairs.data[keep]
+        order = np.lexsort((cols, rows))
+        rows, cols, pair_counts = rows[order], cols[order], pair_counts[order]
+        itemsets.extend(zip(frequent[rows].tolist(), frequent[cols].tolist()))
+        supports.extend(pair_counts.tolist())
+
+        if max_len >= 3 and len(rows) > 0:
+            tids = [X.indices[X.indptr[i]:X.indptr[i + 1]] for i in frequent]
+            starts = np.flatnonzero(np.r_[True, rows[1:] != rows[:-1]])
+            ends = np.r_[starts[1:], len(rows)]
+            tasks = [(int(rows[s]), cols[s:e].tolist(), min_count, max_len)
+                     for s, e in zip(starts, ends) if e - s >= 2]
+            if n_jobs is None or n_jobs < 1:
+                n_jobs = os.cpu_count() or 1
+            if n_jobs == 1 or len(tasks) <= 1:
+                _init_eclat_worker(tids)
+                results = list(map(_mine_prefix_class, tasks))
+            else:
+                with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_eclat_worker,
+                                         initargs=(tids,)) as executor:
+                    results = list(executor.map(_mine_prefix_class, tasks,
+                                                chunksize=max(1, len(tasks) // (4 * n_jobs))))
+            for found in results:
+                for positions, count in found:
+                    itemsets.append(tuple(int(frequent[p]) for p in positions))
+                    supports.append(count)
+
+    result = pd.DataFrame({
+        'support': np.asarray(supports, dtype=float) / n_transactions,
+        'itemsets': [frozenset(item_ids[list(itemset)].tolist()) for itemset in itemsets],
+        '_length': [len(itemset) for itemset in itemsets]
+    })
+    # Sắp xếp theo độ dài tập như apriori, giữ thứ tự tìm thấy trong cùng độ dài
+    result = result.sort_values('_length', kind='mergesort').drop(columns='_length').reset_index(drop=True)
+    return result
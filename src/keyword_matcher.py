@@ -0,0 +1,103 @@
+from collections import deque
+from typing import Callable, Dict, Iterable, List, Set, Tuple
+
+
+class KeywordAutomaton:
+    """Automaton Aho–Corasick: tìm mọi mẫu xuất hiện trong văn bản (kể cả chồng lấn) trong một lần duyệt"""
+
+    def __init__(self, patterns: Iterable[str]):
+        self.patterns = list(dict.fromkeys(p for p in patterns if p))
+        self._goto: List[Dict[str, int]] = [{}]
+        self._fail: List[int] = [0]
+        self._out: List[List[int]] = [[]]
+
+        for pattern_id, pattern in enumerate(self.patterns):
+            state = 0
+            for ch in pattern:
+                nxt = self._goto[state].get(ch)
+                if nxt is None:
+                    nxt = len(self._goto)
+                    self._goto[state][ch] = nxt
+                    self._goto.append({})
+                    self._fail.append(0)
+                    self._out.append([])
+                state = nxt
+            self._out[state].append(pattern_id)
+
+        # Dựng liên kết thất bại theo BFS (các nút độ sâu 1 luôn trỏ về gốc)
+        # và gộp output của trạng thái thất bại
+        queue = deque(self._goto[0].values())
+        while queue:
+            state = queue.popleft()
+            for ch, nxt in self._goto[state].items():
+                queue.append(nxt)
+                fail = self._fail[state]
+                while fail and ch not in self._goto[fail]:
+                    fail = self._fail[fail]
+                self._fail[nxt] = self._goto[fail].get(ch, 0)
+                self._out[nxt] = self._out[nxt] + self._out[self._fail[nxt]]
+
+    def find_all(self, text: str) -> Set[int]:
+        """Tập id các mẫu xuất hiện trong văn bản"""
+        found = set()
+        goto, fail, out = self._goto, self._fail, self._out
+        state = 0
+        for ch in text:
+            while state and ch not in goto[state]:
+                state = fail[state]
+            state = goto[state].get(ch, 0)
+            if out[state]:
+                found.update(out[state])
+        return found
+
+
+class IntentKeywordMatcher:
+    """Bảng từ khóa ý định đã biên dịch sẵn (gốc và chuẩn hóa) thành một automaton duy nhất"""
+
+    def __init__(self, categories: List[Tuple[str, Dict[str, List[str]]]], normalize: Callable[[str], str]):
+        # Mỗi slot là một cặp (category, item) theo đúng thứ tự duyệt của bảng từ khóa
+        self._slots: List[Tuple[str, str, List[str]]] = []
+        raw_entries: Dict[str, List[Tuple[int, int]]] = {}
+        normalized_entries: Dict[str, List[Tuple[int, int]]] = {}
+        for category_name, category_dict in categories:
+            for item, keywords in category_dict.items():
+                slot = len(self._slots)
+                self._slots.append((category_name, item, list(keywords)))
+                for kw_idx, keyword in enumerate(keywords):
+                    raw_entries.setdefault(keyword, []).append((slot, kw_idx))
+                    normalized_entries.setdefault(normalize(keyword), []).append((slot, kw_idx))
+
+        self._automaton = KeywordAutomaton(list(raw_entries) + list(normalized_entries))
+        self._raw_entries = [raw_entries.get(p, []) for p in self._automaton.patterns]
+        self._normalized_entries = [normalized_entries.get(p, []) for p in self._automaton.patterns]
+
+    def match(self, original_input: str, normalized_input: str) -> List[Tuple[str, str, str]]:
+        """Trả về (category, item, keyword đầu tiên khớp) theo thứ tự bảng từ khóa
+
+        Một từ khóa khớp khi: keyword có trong text gốc, keyword chuẩn hóa có trong
+        text chuẩn hóa, hoặc keyword có trong text chuẩn hóa.
+        """
+        best: Dict[int, int] = {}
+
+        def record(entries):
+            for slot, kw_idx in entries:
+                if kw_idx < best.get(slot, kw_idx + 1):
+                    best[slot] = kw_idx
+
+        found_original = self._automaton.find_all(original_input)
+        if normalized_input == original_input:
+            found_normalized = found_original
+        else:
+            found_normalized = self._automaton.find_all(normalized_input)
+
+        for pattern_id in found_original:
+            record(self._raw_entries[pattern_id])
+        for pattern_id in found_normalized:
+            record(self._raw_entries[pattern_id])
+            record(self._normalized_entries[pattern_id])
+
+        matches = []
+        for slot in sorted(best):
+            category_name, item, keywords = self._slots[slot]
+            matches.append((category_name, item, keywords[best[slot]]))
+        return matches
@@ -0,0 +1,82 @@
+import logging
+from typing import List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+Bounds = Tuple[Optional[float], Optional[float]]
+
+
+def _within(values: np.ndarray, bounds: Bounds) -> np.ndarray:
+    low, high = bounds
+    keep = np.ones(len(values), dtype=bool)
+    if low is not None:
+        keep &= values >= low
+    if high is not None:
+        keep &= values <= high
+    return keep
+
+
+class MenuIndex:
+    """Index truy vấn menu: vị trí dòng sắp sẵn theo minutes và price, bitmap theo mùa
+
+    Lọc khoảng giá trị bằng tìm kiếm nhị phân trên mảng đã sắp rồi giao với các điều kiện còn lại;
+    kết quả là mảng vị trí dòng (theo thứ tự minutes tăng dần), chỉ trang đang xem mới được lấy ra DataFrame.
+    """
+
+    def __init__(self, menu: pd.DataFrame):
+        self.menu = menu
+        self.minutes = menu['minutes'].to_numpy(dtype=np.float64)
+        self.price = menu['price'].to_numpy(dtype=np.float64)
+        self.by_minutes = np.argsort(self.minutes, kind='stable')
+        self.sorted_minutes = self.minutes[self.by_minutes]
+        self.by_price = np.argsort(self.price, kind='stable')
+        self.sorted_price = self.price[self.by_price]
+        # Thứ hạng theo minutes của từng dòng, để sắp lại kết quả khi lọc theo giá trước
+        self.minutes_rank = np.empty(len(menu), dtype=np.int64)
+        self.minutes_rank[self.by_minutes] = np.arange(len(menu))
+        codes, seasons = pd.factorize(menu['season'])
+        self.season_bitmaps = {season: codes == k for k, season in enumerate(seasons.tolist())}
+        logger.info(f"Đã dựng index cho menu {len(menu)} món, {len(self.season_bitmaps)} mùa")
+
+    def __len__(self) -> int:
+        return len(self.menu)
+
+    @property
+    def seasons(self) -> List[str]:
+        return sorted(self.season_bitmaps)
+
+    @staticmethod
+    def _range(sorted_values: np.ndarray, bounds: Bounds) -> Tuple[int, int]:
+        # Khoảng [start, end) của các giá trị nằm trong bounds (hai đầu đều tính)
+        low, high = bounds
+        start = 0 if low is None else int(np.searchsorted(sorted_values, low, side='left'))
+        end = len(sorted_values) if high is None else int(np.searchsorted(sorted_values, high, side='right'))
+        return start, max(start, end)
+
+    def query(self, minutes: Bounds = (None, None), price: Bounds = (None, None),
+              season: Optional[str] = None) -> np.ndarray:
+        """Vị trí các dòng thỏa điều kiện, sắp theo minutes tăng dần"""
+        minutes_start, minutes_end = self._range(self.sorted_minutes, minutes)
+        price_start, price_end = self._range(self.sorted_price, price)
+        # Duyệt khoảng hẹp hơn rồi kiểm tra điều kiện còn lại trên các ứng viên
+        if minutes_end - minutes_start <= price_end - price_start:
+            positions = self.by_minutes[minutes_start:minutes_end]
+            positions = positions[_within(self.price[positions], price)]
+        else:
+            positions = self.by_price[price_start:price_end]
+            positions = positions[_within(self.minutes[positions], minutes)]
+            positions = positions[np.argsort(self.minutes_rank[positions], kind='stable')]
+        if season is not None:
+            bitmap = self.season_bitmaps.get(season)
+            if bitmap is None:
+                return positions[:0]
+            positions = positions[bitmap[positions]]
+        return positions
+
+    def page(self, positions: np.ndarray, page: int, per_page: int) -> pd.DataFrame:
+        """Các dòng của trang (đánh số từ 1), chỉ lấy đúng số dòng của trang từ menu"""
+        start = max(page - 1, 0) * per_page
+        return self.menu.iloc[positions[start:start + per_page]]
@@ -0,0 +1,74 @@
+import json
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+import numpy as np
+
+from artifact_io import load_array, save_array
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi bố cục bundle thay đổi; bundle khác phiên bản sẽ không được tải
+BUNDLE_FORMAT_VERSION = 3
+
+MANIFEST_FILE = 'manifest.json'
+
+
+def save_bundle(bundle_dir: str, arrays: Dict[str, np.ndarray], meta: Dict) -> None:
+    """Ghi các mảng thành file .npy kèm manifest mô tả kiểu/kích thước từng mảng và metadata của model"""
+    os.makedirs(bundle_dir, exist_ok=True)
+    # Xóa manifest trước và ghi lại sau cùng để bundle dở dang không bao giờ được coi là hợp lệ
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if os.path.exists(manifest_path):
+        os.remove(manifest_path)
+    described = {}
+    for name, values in arrays.items():
+        values = np.ascontiguousarray(values)
+        save_array(os.path.join(bundle_dir, f'{name}.npy'), values)
+        described[name] = {'dtype': values.dtype.str, 'shape': list(values.shape)}
+    manifest = {
+        'format_version': BUNDLE_FORMAT_VERSION,
+        'created_at': time.strftime('%Y-%m-%dT%H:%M:%S'),
+        'arrays': described,
+        'meta': meta
+    }
+    with open(manifest_path, 'w', encoding='utf-8') as f:
+        json.dump(manifest, f, ensure_ascii=False, indent=1)
+
+
+def read_manifest(bundle_dir: str) -> Optional[Dict]:
+    """Manifest của bundle; None nếu không có hoặc khác phiên bản"""
+    manifest_path = os.path.join(bundle_dir, MANIFEST_FILE)
+    if not os.path.exists(manifest_path):
+        return None
+    with open(manifest_path, encoding='utf-8') as f:
+        manifest = json.load(f)
+    if manifest.get('format_version') != BUNDLE_FORMAT_VERSION:
+        logger.warning(f"Bundle {bundle_dir} có phiên bản {manifest.get('format_version')}, "
+                       f"cần {BUNDLE_FORMAT_VERSION}")
+        return None
+    return manifest
+
+
+def load_bundle(bundle_dir: str, mmap: bool = True) -> Optional[Tuple[Dict[str, np.ndarray], Dict]]:
+    """Tải (mảng, metadata) của bundle
+
+    Mảng được memory-map chỉ đọc: tải gần như tức thời và mọi worker mở cùng bundle dùng chung
+    page cache của OS thay vì mỗi process giữ một bản sao.
+    """
+    try:
+        manifest = read_manifest(bundle_dir)
+        if manifest is None:
+            return None
+        arrays = {}
+        for name, info in manifest['arrays'].items():
+            values = load_array(os.path.join(bundle_dir, f'{name}.npy'), mmap)
+            if values.dtype.str != info['dtype'] or list(values.shape) != info['shape']:
+                raise ValueError(f"Mảng {name} không khớp manifest")
+            arrays[name] = values
+        return arrays, manifest['meta']
+    except Exception as e:
+        logger.warning(f"Không thể tải bundle từ {bundle_dir}: {e}")
+        return None
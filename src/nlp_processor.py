@@ -3,15 +3,49 @@ import spacy
 import re
 import pandas as pd
 from typing import List, Dict, Tuple, Set
-from fuzzywuzzy import fuzz, process
-from sklearn.feature_extraction.text import TfidfVectorizer
-from sklearn.metrics.pairwise import cosine_similarity
-import numpy as np
-from unidecode import unidecode
+from functools import lru_cache
+from keyword_matcher import IntentKeywordMatcher
+from search_index import DishNameIndex, RecipeSearchIndex, ENGLISH_STOPWORDS, fingerprint_file, fingerprint_frame, top_k_indices
+
+# Thay thế các ký tự đặc biệt tiếng Việt (sau khi đã lower)
+VIETNAMESE_CHARS = {
+    'à': 'a', 'á': 'a', 'ạ': 'a', 'ả': 'a', 'ã': 'a', 'â': 'a', 'ầ': 'a', 'ấ': 'a',
+    'ậ': 'a', 'ẩ': 'a', 'ẫ': 'a', 'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ặ': 'a', 'ẳ': 'a', 'ẵ': 'a',
+    'è': 'e', 'é': 'e', 'ẹ': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ê': 'e', 'ề': 'e', 'ế': 'e',
+    'ệ': 'e', 'ể': 'e', 'ễ': 'e',
+    'ì': 'i', 'í': 'i', 'ị': 'i', 'ỉ': 'i', 'ĩ': 'i',
+    'ò': 'o', 'ó': 'o', 'ọ': 'o', 'ỏ': 'o', 'õ': 'o', 'ô': 'o', 'ồ': 'o', 'ố': 'o',
+    'ộ': 'o', 'ổ': 'o', 'ỗ': 'o', 'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ợ': 'o', 'ở': 'o', 'ỡ': 'o',
+    'ù': 'u', 'ú': 'u', 'ụ': 'u', 'ủ': 'u', 'ũ': 'u', 'ư': 'u', 'ừ': 'u', 'ứ': 'u',
+    'ự': 'u', 'ử': 'u', 'ữ': 'u',
+    'ỳ': 'y', 'ý': 'y', 'ỵ': 'y', 'ỷ': 'y', 'ỹ': 'y',
+    'đ': 'd', 'Đ': 'd'
+}
+
+# Bảng dịch biên dịch sẵn: một lần str.translate thay cho ~70 lần str.replace
+_VIETNAMESE_TRANSLATION = str.maketrans(VIETNAMESE_CHARS)
+
+NORMALIZE_CACHE_SIZE = 65536
+NORMALIZE_CACHE_MAX_LENGTH = 256
+
+
+@lru_cache(maxsize=NORMALIZE_CACHE_SIZE)
+def _normalize_cached(text: str) -> str:
+    return text.lower().translate(_VIETNAMESE_TRANSLATION)
+
 
 class NLPProcessor:
-    def __init__(self):
-        """Khởi tạo bộ xử lý NLP với hỗ trợ tiếng Việt mạnh"""
+    def __init__(self, index_dir: str = None):
+        """Khởi tạo bộ xử lý NLP với hỗ trợ tiếng Việt mạnh
+
+        index_dir: thư mục lưu TF-IDF index; None thì chỉ giữ index trong bộ nhớ
+        """
+        self.index_dir = index_dir
+        self._search_index = None
+        self._search_index_frame = None
+        self._search_index_source = None
+        self._dish_index = None
+        self._dish_index_frame = None
         self.setup_nlp()
         self.load_food_keywords()
         self.setup_vietnamese_stopwords()
@@ -275,35 +309,30 @@ class NLPProcessor:
                 'cơm nhà', 'com nha', 'tự nấu', 'tu nau'
             ]
         }
+        
+        self.compile_keyword_matcher()
+
+    def compile_keyword_matcher(self):
+        """Biên dịch các bảng từ khóa thành automaton; gọi lại nếu sửa bảng từ khóa sau khi khởi tạo"""
+        self.intent_matcher = IntentKeywordMatcher([
+            ('cuisine', self.cuisine_keywords),
+            ('dietary', self.dietary_keywords),
+            ('ingredients', self.ingredient_keywords),
+            ('meal_time', self.meal_time_keywords),
+            ('taste', self.taste_keywords),
+            ('cooking_method', self.cooking_method_keywords),
+            ('restaurant_type', self.restaurant_type_keywords)
+        ], self.normalize_vietnamese_text)
 
     def normalize_vietnamese_text(self, text: str) -> str:
         """Chuẩn hóa văn bản tiếng Việt"""
         if not isinstance(text, str):
             text = str(text)
         
-        # Loại bỏ dấu thanh
-        normalized = unidecode(text.lower())
-        
-        # Thay thế các ký tự đặc biệt tiếng Việt
-        vietnamese_chars = {
-            'à': 'a', 'á': 'a', 'ạ': 'a', 'ả': 'a', 'ã': 'a', 'â': 'a', 'ầ': 'a', 'ấ': 'a',
-            'ậ': 'a', 'ẩ': 'a', 'ẫ': 'a', 'ă': 'a', 'ằ': 'a', 'ắ': 'a', 'ặ': 'a', 'ẳ': 'a', 'ẵ': 'a',
-            'è': 'e', 'é': 'e', 'ẹ': 'e', 'ẻ': 'e', 'ẽ': 'e', 'ê': 'e', 'ề': 'e', 'ế': 'e',
-            'ệ': 'e', 'ể': 'e', 'ễ': 'e',
-            'ì': 'i', 'í': 'i', 'ị': 'i', 'ỉ': 'i', 'ĩ': 'i',
-            'ò': 'o', 'ó': 'o', 'ọ': 'o', 'ỏ': 'o', 'õ': 'o', 'ô': 'o', 'ồ': 'o', 'ố': 'o',
-            'ộ': 'o', 'ổ': 'o', 'ỗ': 'o', 'ơ': 'o', 'ờ': 'o', 'ớ': 'o', 'ợ': 'o', 'ở': 'o', 'ỡ': 'o',
-            'ù': 'u', 'ú': 'u', 'ụ': 'u', 'ủ': 'u', 'ũ': 'u', 'ư': 'u', 'ừ': 'u', 'ứ': 'u',
-            'ự': 'u', 'ử': 'u', 'ữ': 'u',
-            'ỳ': 'y', 'ý': 'y', 'ỵ': 'y', 'ỷ': 'y', 'ỹ': 'y',
-            'đ': 'd', 'Đ': 'd'
-        }
-        
-        result = text.lower()
-        for vn_char, replacement in vietnamese_chars.items():
-            result = result.replace(vn_char, replacement)
-        
-        return result
+        # Chỉ cache chuỗi ngắn (tên món, từ khóa, câu hỏi); mô tả dài hiếm khi lặp lại
+        if len(text) <= NORMALIZE_CACHE_MAX_LENGTH:
+            return _normalize_cached(text)
+        return text.lower().translate(_VIETNAMESE_TRANSLATION)
 
     def extract_intent(self, user_input: str) -> Dict:
         """Trích xuất ý định từ câu hỏi của người dùng với độ chính xác cao"""
@@ -330,33 +359,11 @@ class NLPProcessor:
         total_matches = 0
         found_keywords = []
         
-        # Hàm helper để tìm keywords
-        def find_keywords_in_category(category_dict, category_name):
-            nonlocal total_matches, found_keywords
-            
-            for item, keywords in category_dict.items():
-                for keyword in keywords:
-                    normalized_keyword = self.normalize_vietnamese_text(keyword)
-                    
-                    # Kiểm tra trong cả text gốc và text chuẩn hóa
-                    if (keyword in original_input or 
-                        normalized_keyword in normalized_input or
-                        keyword in normalized_input):
-                        
-                        if item not in intent[category_name]:
-                            intent[category_name].append(item)
-                            total_matches += 1
-                            found_keywords.append(f"{category_name}:{item}:{keyword}")
-                        break
-        
-        # Tìm tất cả các loại keywords
-        find_keywords_in_category(self.cuisine_keywords, 'cuisine')
-        find_keywords_in_category(self.dietary_keywords, 'dietary')
-        find_keywords_in_category(self.ingredient_keywords, 'ingredients')
-        find_keywords_in_category(self.meal_time_keywords, 'meal_time')
-        find_keywords_in_category(self.taste_keywords, 'taste')
-        find_keywords_in_category(self.cooking_method_keywords, 'cooking_method')
-        find_keywords_in_category(self.restaurant_type_keywords, 'restaurant_type')
+        # Tìm tất cả các loại keywords trong một lần duyệt automaton
+        for category_name, item, keyword in self.intent_matcher.match(original_input, normalized_input):
+            intent[category_name].append(item)
+            total_matches += 1
+            found_keywords.append(f"{category_name}:{item}:{keyword}")
         
         intent['keywords_found'] = found_keywords
         
@@ -372,85 +379,70 @@ class NLPProcessor:
         
         return intent
 
-    def semantic_search(self, query: str, recipe_df: pd.DataFrame, top_k: int = 10) -> List[Dict]:
-        """Tìm kiếm ngữ nghĩa với hỗ trợ tiếng Việt"""
+    def get_search_index(self, recipe_df: pd.DataFrame, source_path: str = None) -> RecipeSearchIndex:
+        """Lấy TF-IDF index cho corpus, chỉ fit lại khi dấu vân tay dữ liệu nguồn thay đổi"""
+        if (self._search_index is not None and self._search_index_frame is recipe_df
+                and self._search_index_source == source_path):
+            return self._search_index
+        
+        fingerprint = fingerprint_file(source_path) if source_path else fingerprint_frame(recipe_df)
+        index = None
+        if self._search_index is not None and self._search_index.fingerprint == fingerprint:
+            index = self._search_index
+        if index is None and self.index_dir:
+            index = RecipeSearchIndex.load(self.index_dir, fingerprint)
+            if index is not None and index.matrix.shape[0] != len(recipe_df):
+                index = None
+        built = index is None
+        if built:
+            stopwords = list(self.vietnamese_stopwords) + ENGLISH_STOPWORDS
+            index = RecipeSearchIndex.build(recipe_df, self.normalize_vietnamese_text, stopwords, fingerprint)
+        
+        # Ma trận khớp từ khóa cho điểm thưởng được tính cùng index và lưu kèm
+        features_rebuilt = index.attach(recipe_df, self.cuisine_keywords, self.ingredient_keywords)
+        if self.index_dir and (built or features_rebuilt):
+            index.save(self.index_dir)
+        
+        self._search_index = index
+        self._search_index_frame = recipe_df
+        self._search_index_source = source_path
+        return index
+
+    def semantic_search(self, query: str, recipe_df: pd.DataFrame, top_k: int = 10, source_path: str = None) -> List[Dict]:
+        """Tìm kiếm ngữ nghĩa với hỗ trợ tiếng Việt
+        
+        source_path: file CSV gốc của recipe_df (nếu có) để nhận biết phiên bản corpus
+        """
         if not isinstance(recipe_df, pd.DataFrame) or recipe_df.empty:
             print("Lỗi: DataFrame công thức không hợp lệ hoặc rỗng")
             return []
         
-        # Chuẩn bị text từ recipes
-        recipe_texts = []
-        for _, recipe in recipe_df.iterrows():
-            text_parts = []
-            for col in ['name', 'ingredients', 'tags', 'description']:
-                if col in recipe and pd.notna(recipe[col]):
-                    original_text = str(recipe[col])
-                    normalized_text = self.normalize_vietnamese_text(original_text)
-                    text_parts.extend([original_text, normalized_text])
-            recipe_texts.append(' '.join(text_parts))
-        
         # Chuẩn bị query
         normalized_query = self.normalize_vietnamese_text(query)
         combined_query = f"{query} {normalized_query}"
         
-        # Tạo vectorizer với stop words tiếng Việt
-        all_stopwords = list(self.vietnamese_stopwords) + ['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by']
-        
-        vectorizer = TfidfVectorizer(
-            max_features=8000,
-            stop_words=all_stopwords,
-            ngram_range=(1, 3),
-            lowercase=True,
-            min_df=1,
-            max_df=0.8,
-            token_pattern=r'[a-zA-ZàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđĐ]+'
-        )
-        
         try:
-            all_texts = recipe_texts + [combined_query]
-            tfidf_matrix = vectorizer.fit_transform(all_texts)
-            query_vector = tfidf_matrix[-1]
-            recipe_vectors = tfidf_matrix[:-1]
-            similarities = cosine_similarity(query_vector, recipe_vectors).flatten()
+            # Index được fit một lần cho mỗi phiên bản corpus, mỗi truy vấn chỉ cần transform
+            search_index = self.get_search_index(recipe_df, source_path)
+            similarities = search_index.similarities(combined_query)
             
-            # Cải thiện scoring với weight cho các yếu tố quan trọng
-            enhanced_scores = []
+            # Cải thiện scoring với weight cho các yếu tố quan trọng, tính trên toàn bộ mảng
             intent = self.extract_intent(query)
+            enhanced_scores = similarities.copy()
+            
+            # Bonus cho exact name match
+            enhanced_scores += 0.3 * search_index.name_hits(query.lower().split())
             
-            for idx, base_score in enumerate(similarities):
-                recipe = recipe_df.iloc[idx]
-                enhanced_score = base_score
-                
-                # Bonus cho exact name match
-                recipe_name = str(recipe.get('name', '')).lower()
-                if any(word in recipe_name for word in query.lower().split()):
-                    enhanced_score += 0.3
-                
-                # Bonus cho cuisine match
-                if intent['cuisine']:
-                    recipe_text = ' '.join([
-                        str(recipe.get('name', '')),
-                        str(recipe.get('tags', '')),
-                        str(recipe.get('ingredients', ''))
-                    ]).lower()
-                    
-                    for cuisine in intent['cuisine']:
-                        if cuisine in recipe_text or any(kw in recipe_text for kw in self.cuisine_keywords.get(cuisine, [])):
-                            enhanced_score += 0.2
-                            break
-                
-                # Bonus cho ingredient match
-                if intent['ingredients']:
-                    recipe_ingredients = str(recipe.get('ingredients', '')).lower()
-                    for ingredient in intent['ingredients']:
-                        if ingredient in recipe_ingredients or any(kw in recipe_ingredients for kw in self.ingredient_keywords.get(ingredient, [])):
-                            enhanced_score += 0.15
-                
-                enhanced_scores.append(enhanced_score)
+            # Bonus cho cuisine match
+            if intent['cuisine']:
+                enhanced_scores += 0.2 * search_index.features['cuisine'].any_hit(intent['cuisine'])
             
-            # Sắp xếp theo enhanced score
-            enhanced_scores = np.array(enhanced_scores)
-            top_indices = enhanced_scores.argsort()[-top_k:][::-1]
+            # Bonus cho ingredient match (cộng dồn cho mỗi nguyên liệu khớp)
+            if intent['ingredients']:
+                enhanced_scores += 0.15 * search_index.features['ingredients'].count_hits(intent['ingredients'])
+            
+            # Chỉ cần top_k kết quả nên dùng argpartition thay vì sắp xếp toàn bộ
+            top_indices = top_k_indices(enhanced_scores, top_k)
             
             results = []
             for idx in top_indices:
@@ -475,42 +467,33 @@ class NLPProcessor:
             print(f"Lỗi khi thực hiện tìm kiếm ngữ nghĩa: {e}")
             return []
 
-    def fuzzy_match_dishes(self, query: str, dish_names: List[str], threshold: int = 60) -> List[Tuple[str, int]]:
-        """Tìm kiếm mờ cho tên món ăn với hỗ trợ tiếng Việt"""
-        if not dish_names:
+    def get_dish_index(self, recipe_df: pd.DataFrame) -> DishNameIndex:
+        """Lấy index tên món cho corpus, chỉ dựng lại khi corpus thay đổi"""
+        if self._dish_index is None or self._dish_index_frame is not recipe_df:
+            dish_names = recipe_df['name'].dropna().astype(str).unique().tolist()
+            self._dish_index = DishNameIndex(dish_names, self.normalize_vietnamese_text)
+            self._dish_index_frame = recipe_df
+        return self._dish_index
+
+    def fuzzy_match_dishes(self, query: str, dish_names, threshold: int = 60) -> List[Tuple[str, int]]:
+        """Tìm kiếm mờ cho tên món ăn với hỗ trợ tiếng Việt
+        
+        dish_names: danh sách tên món hoặc DishNameIndex dựng sẵn (nên dùng cho corpus lớn)
+        """
+        if dish_names is None or len(dish_names) == 0:
             print("Lỗi: Danh sách tên món ăn rỗng")
             return []
         
         try:
-            # Chuẩn bị query variants
-            original_query = query.lower()
-            normalized_query = self.normalize_vietnamese_text(query)
-            
-            # Chuẩn bị dish name variants
-            dish_variants = {}
-            for dish in dish_names:
-                original_dish = dish.lower()
-                normalized_dish = self.normalize_vietnamese_text(dish)
-                dish_variants[original_dish] = dish
-                if normalized_dish != original_dish:
-                    dish_variants[normalized_dish] = dish
-            
-            all_dish_names = list(dish_variants.keys())
+            if isinstance(dish_names, DishNameIndex):
+                dish_index = dish_names
+            else:
+                dish_index = DishNameIndex(dish_names, self.normalize_vietnamese_text)
             
             # Thực hiện fuzzy matching với các query variants
-            matches_original = process.extract(original_query, all_dish_names, limit=15, scorer=fuzz.token_sort_ratio)
-            matches_normalized = process.extract(normalized_query, all_dish_names, limit=15, scorer=fuzz.token_sort_ratio)
-            
-            # Kết hợp và loại bỏ trùng lặp
-            all_matches = {}
-            for match, score in matches_original + matches_normalized:
-                original_dish_name = dish_variants[match]
-                if original_dish_name not in all_matches or all_matches[original_dish_name] < score:
-                    all_matches[original_dish_name] = score
-            
-            # Sắp xếp và lọc theo threshold
-            sorted_matches = sorted(all_matches.items(), key=lambda x: x[1], reverse=True)
-            return [(dish, score) for dish, score in sorted_matches if score >= threshold]
+            original_query = query.lower()
+            normalized_query = self.normalize_vietnamese_text(query)
+            return dish_index.match([original_query, normalized_query], threshold=threshold, limit=15)
             
         except Exception as e:
             print(f"Lỗi khi thực hiện tìm kiếm mờ: {e}")
@@ -0,0 +1,156 @@
+import logging
+from collections.abc import Mapping
+from typing import Dict, Iterator, List, Optional
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger(__name__)
+
+# Thứ tự cột của ma trận stats
+STAT_NAMES = ['avg_rating', 'total_ratings', 'avg_cook_time', 'avg_calories', 'avg_ingredients']
+
+
+def _rounded(value: float) -> float:
+    # Giá trị lưu float32, trả ra float làm tròn 2 chữ số như profile dạng dict trước đây
+    return round(float(value), 2)
+
+
+class UserProfile(Mapping):
+    """View nhẹ của một profile: profile['stats'] và profile['seasonal_prefs'] được tạo khi đọc"""
+
+    __slots__ = ('_store', '_row')
+
+    def __init__(self, store: 'UserProfileStore', row: int):
+        self._store = store
+        self._row = row
+
+    def __getitem__(self, key: str) -> Dict[str, float]:
+        if key == 'stats':
+            return self._store.stats_dict(self._row)
+        if key == 'seasonal_prefs':
+            return self._store.seasonal_dict(self._row)
+        raise KeyError(key)
+
+    def __iter__(self) -> Iterator[str]:
+        return iter(('stats', 'seasonal_prefs'))
+
+    def __len__(self) -> int:
+        return 2
+
+
+class UserProfileStore(Mapping):
+    """Profile người dùng lưu bằng mảng NumPy: user_id -> UserProfile
+
+    Các user_id được sắp xếp tăng dần, tra hàng bằng searchsorted; stats là ma trận
+    float32 (user x STAT_NAMES), sở thích mùa là ma trận float32 (user x season).
+    """
+
+    def __init__(self, user_ids: np.ndarray, stats: np.ndarray, seasons: List[str],
+                 seasonal: np.ndarray, has_seasonal: np.ndarray):
+        self.user_ids = user_ids
+        self.stats = stats
+        self.seasons = list(seasons)
+        self.seasonal = seasonal
+        self.has_seasonal = has_seasonal
+
+    @classmethod
+    def empty(cls) -> 'UserProfileStore':
+        return cls(np.array([], dtype=np.int64), np.zeros((0, len(STAT_NAMES)), dtype=np.float32),
+                   [], np.zeros((0, 0), dtype=np.float32), np.zeros(0, dtype=bool))
+
+    @classmethod
+    def from_totals(cls, profile_totals: pd.DataFrame, seasonal_totals: pd.DataFrame) -> 'UserProfileStore':
+        """Dựng store từ tổng/số đếm theo user và theo (user, season), hoàn toàn vector hóa"""
+        profile_totals = profile_totals.sort_index()
+        user_ids = profile_totals.index.to_numpy(dtype=np.int64)
+        stats = cls._stats_from_totals(profile_totals)
+
+        seasons = sorted(seasonal_totals.index.get_level_values('season').unique())
+        seasonal = np.zeros((len(user_ids), len(seasons)), dtype=np.float32)
+        has_seasonal = np.zeros(len(user_ids), dtype=bool)
+        if len(seasonal_totals) > 0:
+            rows = np.searchsorted(user_ids, seasonal_totals.index.get_level_values('user_id').to_numpy(dtype=np.int64))
+            cols = pd.Index(seasons).get_indexer(seasonal_totals.index.get_level_values('season'))
+            seasonal[rows, cols] = (seasonal_totals['sum'] / seasonal_totals['count']).to_numpy()
+            has_seasonal[rows] = True
+        return cls(user_ids, stats, seasons, seasonal, has_seasonal)
+
+    @staticmethod
+    def _stats_from_totals(totals: pd.DataFrame) -> np.ndarray:
+        # Chia tổng cho số đếm theo từng cột; 0/0 cho NaN như mean của pandas
+        with np.errstate(divide='ignore', invalid='ignore'):
+            return np.column_stack([
+                totals['rating_sum'] / totals['rating_count'],
+                totals['rating_count'],
+                totals['minutes_sum'] / totals['minutes_count'],
+                totals['calories_sum'] / totals['calories_count'],
+                totals['ingredient_count_sum'] / totals['ingredient_count_count']
+            ]).astype(np.float32)
+
+    def update(self, profile_totals: pd.DataFrame, seasonal_totals: pd.DataFrame,
+               user_ids: np.ndarray) -> 'UserProfileStore':
+        """Cập nhật tại chỗ các hàng của user đã có; trả về store mới nếu có user hoặc mùa mới
+
+        Store tải từ bundle (memory-map chỉ đọc) cũng được dựng lại thay vì ghi đè.
+        """
+        user_ids = np.asarray(user_ids, dtype=np.int64)
+        rows = self._rows(user_ids)
+        new_seasons = set(seasonal_totals.index.get_level_values('season')) - set(self.seasons)
+        if (rows < 0).any() or new_seasons or not self.stats.flags.writeable:
+            return UserProfileStore.from_totals(profile_totals, seasonal_totals)
+        self.stats[rows] = self._stats_from_totals(profile_totals.loc[user_ids])
+        user_seasonal = seasonal_totals[seasonal_totals.index.get_level_values('user_id').isin(user_ids)]
+        seasonal_rows = self._rows(user_seasonal.index.get_level_values('user_id').to_numpy(dtype=np.int64))
+        cols = pd.Index(self.seasons).get_indexer(user_seasonal.index.get_level_values('season'))
+        self.seasonal[rows] = 0
+        self.seasonal[seasonal_rows, cols] = (user_seasonal['sum'] / user_seasonal['count']).to_numpy()
+        self.has_seasonal[seasonal_rows] = True
+        return self
+
+    def _rows(self, user_ids: np.ndarray) -> np.ndarray:
+        """Chỉ số hàng của các user (-1 nếu không có)"""
+        if len(self.user_ids) == 0:
+            return np.full(len(user_ids), -1, dtype=np.int64)
+        rows = np.minimum(np.searchsorted(self.user_ids, user_ids), len(self.user_ids) - 1)
+        return np.where(self.user_ids[rows] == user_ids, rows, -1)
+
+    def row(self, user_id) -> Optional[int]:
+        if len(self.user_ids) == 0:
+            return None
+        # Ép về cùng kiểu với mảng để searchsorted không phải chuyển kiểu cả mảng
+        try:
+            user_id = np.int64(user_id)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        i = int(np.searchsorted(self.user_ids, user_id))
+        if i < len(self.user_ids) and self.user_ids[i] == user_id:
+            return i
+        return None
+
+    def stats_dict(self, row: int) -> Dict[str, float]:
+        return {name: _rounded(value) for name, value in zip(STAT_NAMES, self.stats[row])}
+
+    def seasonal_dict(self, row: int) -> Dict[str, float]:
+        if not self.has_seasonal[row]:
+            return {}
+        return {season: float(value) for season, value in zip(self.seasons, self.seasonal[row])}
+
+    def __getitem__(self, user_id) -> UserProfile:
+        row = self.row(user_id)
+        if row is None:
+            raise KeyError(user_id)
+        return UserProfile(self, row)
+
+    def __contains__(self, user_id) -> bool:
+        return self.row(user_id) is not None
+
+    def __iter__(self) -> Iterator:
+        return iter(self.user_ids.tolist())
+
+    def __len__(self) -> int:
+        return len(self.user_ids)
+
+    @property
+    def nbytes(self) -> int:
+        return self.user_ids.nbytes + self.stats.nbytes + self.seasonal.nbytes + self.has_seasonal.nbytes
@@ -1,15 +1,25 @@
 import os
+import argparse
 import logging
+import uuid
+from concurrent.futures import ProcessPoolExecutor
 
 import numpy as np
 import pandas as pd
-from sklearn.cluster import KMeans
+from sklearn.cluster import KMeans, MiniBatchKMeans
 from sklearn.preprocessing import StandardScaler
-from mlxtend.frequent_patterns import apriori, association_rules
 from scipy.sparse import csr_matrix
 import matplotlib.pyplot as plt
 import seaborn as sns
 
+from artifact_io import artifact_stamp, read_artifact_parts, read_artifact, write_artifact
+from association_rules import association_rules
+from cluster_model import ClusterModel
+from itemset_mining import mine_frequent_itemsets
+from model_bundle import load_bundle, save_bundle
+from profile_store import UserProfileStore
+from rule_store import RuleAdjacency
+
 # Cấu hình log
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -17,90 +27,362 @@ logger = logging.getLogger(__name__)
 # Tạo thư mục lưu dữ liệu nếu chưa có
 os.makedirs('../data', exist_ok=True)
 
+# Cột dùng cho thống kê profile: (cột dữ liệu, tên trong stats)
+PROFILE_STAT_COLUMNS = [
+    ('rating', 'avg_rating'),
+    ('minutes', 'avg_cook_time'),
+    ('calories', 'avg_calories'),
+    ('ingredient_count', 'avg_ingredients')
+]
+
+# Đặc trưng món ăn dùng để phân cụm: (cột dữ liệu, cách gộp theo recipe)
+CLUSTER_FEATURES = {
+    'rating': 'mean',
+    'minutes': 'first',
+    'calories': 'first',
+    'ingredient_count': 'first'
+}
+
+# Số lần khởi tạo mặc định của từng engine phân cụm
+CLUSTER_ENGINE_N_INIT = {'kmeans': 10, 'minibatch': 3}
+
+# File lưu tâm cụm, tham số scaler và tên cụm giữa các lần huấn luyện
+CLUSTER_MODEL_PATH = '../data/cluster_model.json'
+
+# Thư mục bundle model đã huấn luyện (app chỉ tải bundle, không huấn luyện lại)
+MODEL_BUNDLE_DIR = '../data/model_bundle'
+
+# Thư mục lưu adjacency luật kết hợp dạng nhị phân (memory-map khi tải)
+RULE_STORE_DIR = '../data/rule_adjacency'
+
+# Recommender dùng chung trong mỗi process con của recommend_batch
+_BATCH_RECOMMENDER = None
+
+
+def _init_batch_worker(recommender):
+    global _BATCH_RECOMMENDER
+    _BATCH_RECOMMENDER = recommender
+
+
+def _recommend_shard(args):
+    user_ids, season, n_recommendations = args
+    return [_BATCH_RECOMMENDER.recommend_for_user(user_id, season, n_recommendations) for user_id in user_ids]
+
 
 class RestaurantRecommender:
-    def __init__(self, max_users=10000, max_recipes=50000):
+    def __init__(self, max_users=10000, max_recipes=50000, popularity_top_n=500, export_csv=False,
+                 rules_top_k=20, rules_min_lift=1.0, cluster_model_path=CLUSTER_MODEL_PATH,
+                 rule_store_dir=RULE_STORE_DIR):
         self.data = None
-        self.user_profiles = {}
+        self.user_profiles = UserProfileStore.empty()
         self.clusters = None
         self.association_rules_df = None
+        # Mã ngẫu nhiên tạo mới mỗi khi model thay đổi (tải dữ liệu, huấn luyện, cập nhật) và lưu cùng bundle:
+        # định danh đúng một trạng thái model kể cả giữa các process, dùng làm khóa cho cache gợi ý
+        self.model_version = uuid.uuid4().hex
+        # Dấu nhận diện (kích thước, mtime) của cleaned_data đã dùng để huấn luyện, lưu trong bundle để phát hiện bundle cũ
+        self.data_stamp = None
+        # Tổng cộng dồn cho profile và số tương tác mới kể từ lần phân cụm/tìm luật gần nhất
+        self._profile_totals = None
+        self._seasonal_totals = None
+        self._n_clusters = 5
+        # Tùy chọn engine của lần phân cụm gần nhất, dùng lại khi phân cụm lại do drift
+        self._clustering_options = {}
+        # Cluster của từng món: _recipe_clusters[k] là cluster của _cluster_recipe_ids[k] (đã sắp tăng dần)
+        self._cluster_recipe_ids = None
+        self._recipe_clusters = None
+        # Tâm cụm, scaler và tên cụm của lần phân cụm gần nhất (để warm-start, giữ id/tên cụm ổn định)
+        self._cluster_model = None
+        # Nơi lưu model phân cụm sau mỗi lần huấn luyện (None: không lưu)
+        self.cluster_model_path = cluster_model_path
+        self._interactions_since_clustering = 0
+        self._interactions_since_rules = 0
+        # Adjacency tiền đề -> hệ quả, dựng lại khi association_rules_df được thay thế
+        self._rule_adjacency_source = None
+        self._rule_adjacency = None
+        # Chỉ giữ top-k hệ quả (theo confidence, lift) của mỗi tiền đề và các luật có lift >= rules_min_lift
+        self.rules_top_k = rules_top_k
+        self.rules_min_lift = rules_min_lift
+        # Nơi lưu adjacency luật kết hợp sau mỗi lần tìm luật (None: không lưu)
+        self.rule_store_dir = rule_store_dir
         self.seasonal_trends = None
         self.max_users = max_users
         self.max_recipes = max_recipes
+        # Ghi thêm bản CSV bên cạnh artifact dạng cột
+        self.export_csv = export_csv
+        # Index theo user kiểu CSR: các dòng của user k nằm ở _user_rows[_user_offsets[k]:_user_offsets[k + 1]]
+        self._user_index_data = None
+        self._user_ids = None
+        self._user_offsets = None
+        self._user_rows = None
+        # Khi tải từ bundle (không có self.data): các cột tương tác đã sắp theo user, dùng chung _user_offsets
+        self._user_columns = None
+        # Xếp hạng phổ biến theo từng mùa (khóa None: mọi mùa), tính một lần cho mỗi phiên bản dữ liệu
+        self.popularity_top_n = popularity_top_n
+        self._popularity_source = None
+        self._popularity_rankings = {}
+        # Danh sách recipe trong mỗi cluster đã xếp theo rating
+        self._cluster_rankings_source = None
+        self._cluster_rankings = {}
+
+    def _new_model_version(self):
+        self.model_version = uuid.uuid4().hex
 
     def load_data(self, data_path):
         # Tải dữ liệu và lọc top users, top recipes
         try:
-            self.data = pd.read_csv(data_path)
+            self.data = read_artifact(data_path)
+            self.data_stamp = artifact_stamp(data_path)
             if self.max_users:
                 top_users = self.data['user_id'].value_counts().head(self.max_users).index
                 self.data = self.data[self.data['user_id'].isin(top_users)]
             if self.max_recipes:
                 top_recipes = self.data['recipe_id'].value_counts().head(self.max_recipes).index
                 self.data = self.data[self.data['recipe_id'].isin(top_recipes)]
+            self._build_user_index()
+            self._new_model_version()
             logger.info(f"Đã tải {len(self.data)} bản ghi")
             return True
         except Exception as e:
             logger.error(f"Lỗi tải dữ liệu: {e}")
             return False
 
+    def _build_user_index(self):
+        # Sắp xếp vị trí dòng theo user (ổn định để giữ thứ tự gốc) và tính offsets
+        user_codes, user_ids = pd.factorize(self.data['user_id'], sort=True)
+        self._user_rows = np.argsort(user_codes, kind='stable')
+        counts = np.bincount(user_codes, minlength=len(user_ids))
+        self._user_offsets = np.concatenate([[0], np.cumsum(counts)])
+        self._user_ids = user_ids.to_numpy()
+        self._user_columns = None
+        self._user_index_data = self.data
+
+    def _user_position(self, user_id):
+        # Vị trí của user trong _user_ids đã sắp (None nếu không có)
+        if self._user_ids is None or len(self._user_ids) == 0:
+            return None
+        try:
+            user_id = np.int64(user_id)
+        except (TypeError, ValueError, OverflowError):
+            return None
+        k = int(np.searchsorted(self._user_ids, user_id))
+        if k < len(self._user_ids) and self._user_ids[k] == user_id:
+            return k
+        return None
+
+    def _user_data(self, user_id):
+        # Các dòng tương tác của user, lấy qua index thay vì lọc toàn bảng
+        if self._user_columns is not None and self.data is None:
+            # Model tải từ bundle: cắt trực tiếp các cột đã sắp theo user
+            k = self._user_position(user_id)
+            start, end = (0, 0) if k is None else (self._user_offsets[k], self._user_offsets[k + 1])
+            return pd.DataFrame({col: values[start:end] for col, values in self._user_columns.items()})
+        if self._user_index_data is not self.data:
+            self._build_user_index()
+        k = self._user_position(user_id)
+        if k is None:
+            return self.data.iloc[0:0]
+        rows = self._user_rows[self._user_offsets[k]:self._user_offsets[k + 1]]
+        return self.data.iloc[rows]
+
+    def _cluster_ranking(self, cluster):
+        # Recipe của cluster xếp theo rating giảm dần, tính một lần cho mỗi kết quả phân cụm
+        if self._cluster_rankings_source is not self.clusters:
+            ranked = self.clusters.sort_values('rating', ascending=False, kind='mergesort')
+            self._cluster_rankings = {
+                c: group.index.to_numpy() for c, group in ranked.groupby('cluster', sort=False)
+            }
+            self._cluster_rankings_source = self.clusters
+        return self._cluster_rankings.get(cluster, np.array([], dtype=np.int64))
+
     def build_user_profiles(self):
         # Xây dựng profile người dùng
         try:
-            user_stats = self.data.groupby('user_id').agg({
-                'rating': ['mean', 'count'],
-                'minutes': 'mean',
-                'calories': 'mean',
-                'ingredient_count': 'mean'
-            }).round(2)
-            user_stats.columns = ['avg_rating', 'total_ratings', 'avg_cook_time', 'avg_calories', 'avg_ingredients']
-            seasonal_prefs = self.data.groupby(['user_id', 'season'])['rating'].mean().unstack(fill_value=0)
-            for user_id in user_stats.index:
-                self.user_profiles[user_id] = {
-                    'stats': user_stats.loc[user_id].to_dict(),
-                    'seasonal_prefs': seasonal_prefs.loc[user_id].to_dict() if user_id in seasonal_prefs.index else {}
-                }
+            self._profile_totals = self._aggregate_profile_totals(self.data)
+            self._seasonal_totals = self._aggregate_seasonal_totals(self.data)
+            self.user_profiles = UserProfileStore.from_totals(self._profile_totals, self._seasonal_totals)
+            self._new_model_version()
             logger.info(f"Đã xây dựng profile cho {len(self.user_profiles)} người dùng")
             return self.user_profiles
         except Exception as e:
             logger.error(f"Lỗi xây dựng user profile: {e}")
             return {}
 
-    def perform_clustering(self, n_clusters=5):
-        # Phân cụm món ăn
+    def _aggregate_profile_totals(self, data):
+        # Tổng và số giá trị (khác NaN) theo user, đủ để cập nhật trung bình cộng dồn
+        totals = data.groupby('user_id')[[col for col, _ in PROFILE_STAT_COLUMNS]].agg(['sum', 'count'])
+        totals.columns = [f'{col}_{stat}' for col, stat in totals.columns]
+        return totals.astype('float64')
+
+    def _aggregate_seasonal_totals(self, data):
+        totals = data.groupby(['user_id', 'season'], observed=True)['rating'].agg(['sum', 'count'])
+        totals.index = totals.index.set_levels(totals.index.levels[1].astype(object), level=1)
+        return totals.astype('float64')
+
+    def update_incremental(self, new_data, cluster_drift=0.1, rules_drift=0.1):
+        # Gộp tương tác mới: cập nhật profile tại chỗ, chỉ phân cụm/tìm luật lại khi vượt ngưỡng drift
+        summary = {'new_interactions': 0 if new_data is None else len(new_data), 'updated_users': 0,
+                   'reclustered': False, 'assigned_recipes': 0, 'rules_recomputed': False}
+        if summary['new_interactions'] == 0:
+            return summary
+        # Cluster của món được tra qua recipe_cluster nên các món đã biết tự giữ cluster cũ
+        new_data = new_data.drop(columns=['cluster', 'cluster_name'], errors='ignore')
+        if self.data is None:
+            # Model tải từ bundle: dựng lại bảng tương tác từ các cột đã lưu để không mất lịch sử
+            self.data = self._data_from_bundle()
+        self.data = pd.concat([self.data, new_data], ignore_index=True)
+        if 'season' in self.data.columns:
+            self.data['season'] = self.data['season'].astype('category')
+
+        # Cộng dồn tổng/số đếm rồi tính lại profile của những user có tương tác mới
+        if self._profile_totals is not None:
+            delta_totals = self._aggregate_profile_totals(new_data)
+            self._profile_totals = self._profile_totals.add(delta_totals, fill_value=0)
+            self._seasonal_totals = self._seasonal_totals.add(self._aggregate_seasonal_totals(new_data), fill_value=0)
+            self.user_profiles = self.user_profiles.update(
+                self._profile_totals, self._seasonal_totals, delta_totals.index.to_numpy()
+            )
+            summary['updated_users'] = len(delta_totals)
+
+        self._interactions_since_clustering += len(new_data)
+        self._interactions_since_rules += len(new_data)
+        n_clustered = max(len(self.data) - self._interactions_since_clustering, 1)
+        unseen = ~new_data['recipe_id'].isin(self.clusters.index) if self.clusters is not None else None
+        if self.clusters is not None and (
+            self._interactions_since_clustering / n_clustered > cluster_drift
+            or new_data.loc[unseen, 'recipe_id'].nunique() / max(len(self.clusters), 1) > cluster_drift
+        ):
+            self.perform_clustering(self._n_clusters, warm_start=True, **self._clustering_options)
+            summary['reclustered'] = True
+        elif self.clusters is not None and unseen.any():
+            # Món mới được gán vào cụm gần nhất mà không fit lại
+            summary['assigned_recipes'] = self._assign_new_recipes(new_data[unseen])
+        n_mined = max(len(self.data) - self._interactions_since_rules, 1)
+        has_rules = self.association_rules_df is not None or self._has_rules()
+        if has_rules and self._interactions_since_rules / n_mined > rules_drift:
+            self.find_association_rules()
+            summary['rules_recomputed'] = True
+        if self.seasonal_trends is not None:
+            self.analyze_seasonal_trends()
+        self._new_model_version()
+        logger.info(f"Cập nhật tăng dần: {summary}")
+        return summary
+
+    def update_from_artifact(self, data_path, cluster_drift=0.1, rules_drift=0.1):
+        # Cập nhật tăng dần bằng các phần được ghi nối vào data_path kể từ lần huấn luyện/cập nhật trước;
+        # None nếu bản chính hoặc các phần đã đọc bị ghi lại (khi đó cần huấn luyện lại toàn bộ)
+        stamp = artifact_stamp(data_path)
+        previous = self.data_stamp
+        if stamp is None or not previous or stamp[:len(previous)] != previous:
+            return None
+        # Phần tử đầu của dấu nhận diện là bản chính, các phần tử sau là các phần đã đọc
+        summary = self.update_incremental(read_artifact_parts(data_path, start=len(previous) - 1),
+                                          cluster_drift=cluster_drift, rules_drift=rules_drift)
+        self.data_stamp = stamp
+        return summary
+
+    def _data_from_bundle(self):
+        # Bảng tương tác dựng từ các cột của bundle (đã sắp theo user), nối đặc trưng món từ bảng cụm
+        if self._user_columns is None:
+            raise ValueError("Chưa có dữ liệu tương tác: cần load_data() hoặc load_model() trước khi cập nhật tăng dần")
+        data = pd.DataFrame({
+            'user_id': np.repeat(np.asarray(self._user_ids), np.diff(self._user_offsets)),
+            **{col: values if isinstance(values, pd.Categorical) else np.array(values)
+               for col, values in self._user_columns.items()}
+        })
+        if self.clusters is not None:
+            features = [col for col in CLUSTER_FEATURES if col != 'rating']
+            data = data.join(self.clusters[features], on='recipe_id')
+        return data
+
+    def perform_clustering(self, n_clusters=5, engine='kmeans', n_init=None, batch_size=4096, warm_start=False):
+        # Phân cụm món ăn; engine='minibatch' dùng MiniBatchKMeans cho danh mục lớn,
+        # warm_start=True khởi tạo từ tâm cụm của lần trước (n_init=1)
         try:
-            recipe_features = self.data.groupby('recipe_id').agg({
-                'rating': 'mean',
-                'minutes': 'first',
-                'calories': 'first',
-                'ingredient_count': 'first'
-            }).dropna()
+            if engine not in CLUSTER_ENGINE_N_INIT:
+                raise ValueError(f"engine phải là một trong {list(CLUSTER_ENGINE_N_INIT)}, nhận '{engine}'")
+            recipe_features = self.data.groupby('recipe_id').agg(CLUSTER_FEATURES).dropna()
             scaler = StandardScaler()
             features_scaled = scaler.fit_transform(recipe_features)
-            kmeans = KMeans(n_clusters=n_clusters, n_init=10, random_state=42)
-            clusters = kmeans.fit_predict(features_scaled)
+            init, n_starts = 'k-means++', n_init or CLUSTER_ENGINE_N_INIT[engine]
+            previous = self._cluster_model
+            if warm_start and previous is not None and len(previous) == n_clusters:
+                # Tâm cụm cũ được lưu theo đơn vị gốc nên đưa về thang đo của scaler mới
+                # (qua DataFrame có tên cột như lúc fit scaler); nhãn được ghép lại bởi ClusterModel.from_fit
+                centers = pd.DataFrame(previous.centers, columns=recipe_features.columns)
+                init, n_starts = scaler.transform(centers), 1
+            if engine == 'minibatch':
+                model = MiniBatchKMeans(n_clusters=n_clusters, init=init, n_init=n_starts,
+                                        batch_size=batch_size, random_state=42)
+            else:
+                model = KMeans(n_clusters=n_clusters, init=init, n_init=n_starts, random_state=42)
+            labels = model.fit_predict(features_scaled)
+            # Ghép với cụm của lần trước theo độ gần tâm cụm để id và tên cụm không đổi giữa các lần huấn luyện
+            cluster_model, relabel = ClusterModel.from_fit(
+                list(CLUSTER_FEATURES), scaler.mean_, scaler.scale_,
+                scaler.inverse_transform(model.cluster_centers_), previous=previous
+            )
+            clusters = relabel[labels]
             recipe_features['cluster'] = clusters
-            recipe_features['cluster_name'] = recipe_features['cluster'].map({
-                0: 'Nhanh & Nhẹ',
-                1: 'Truyền thống',
-                2: 'Cao cấp',
-                3: 'Gia đình',
-                4: 'Đặc biệt'
-            })
+            recipe_features['cluster_name'] = recipe_features['cluster'].map(cluster_model.name_map())
             self.clusters = recipe_features
-            self.data = pd.merge(
-                self.data, recipe_features[['cluster', 'cluster_name']],
-                on='recipe_id', how='left'
-            )
-            self.data.to_csv('../data/clustered_data.csv', index=False)
-            logger.info(f"Đã phân cụm {len(recipe_features)} món ăn thành {n_clusters} nhóm")
+            self._n_clusters = n_clusters
+            self._clustering_options = {'engine': engine, 'n_init': n_init, 'batch_size': batch_size}
+            self._cluster_model = cluster_model
+            if self.cluster_model_path:
+                cluster_model.save(self.cluster_model_path)
+            # Index của groupby đã sắp tăng dần nên tra cứu được bằng searchsorted
+            self._cluster_recipe_ids = recipe_features.index.to_numpy()
+            self._recipe_clusters = clusters.astype(np.int8)
+            self._interactions_since_clustering = 0
+            self._new_model_version()
+            write_artifact(self._clustered_recipes(), '../data/clustered_data.csv', export_csv=self.export_csv)
+            logger.info(f"Đã phân cụm {len(recipe_features)} món ăn thành {n_clusters} nhóm ({engine})")
             return recipe_features
         except Exception as e:
             logger.error(f"Lỗi phân cụm: {e}")
             return None
 
-    def find_association_rules(self, min_support=0.005, min_confidence=0.1):
-        # Tìm luật kết hợp giữa các món ăn
+    def load_cluster_model(self, path=None):
+        # Tải tâm cụm đã lưu để lần phân cụm sau giữ id/tên cụm của lần huấn luyện trước
+        path = path or self.cluster_model_path
+        cluster_model = ClusterModel.load(path) if path else None
+        if cluster_model is None:
+            return False
+        self._cluster_model = cluster_model
+        return True
+
+    def _assign_new_recipes(self, new_data):
+        # Gán món chưa phân cụm vào tâm cụm gần nhất (O(k) mỗi món), giữ bảng recipe -> cluster đã sắp
+        features = new_data.groupby('recipe_id').agg(CLUSTER_FEATURES).dropna()
+        if len(features) == 0:
+            return 0
+        clusters = self._cluster_model.assign(features[self._cluster_model.feature_names].to_numpy())
+        features['cluster'] = clusters
+        features['cluster_name'] = features['cluster'].map(self._cluster_model.name_map())
+        self.clusters = pd.concat([self.clusters, features]).sort_index()
+        self._cluster_recipe_ids = self.clusters.index.to_numpy()
+        self._recipe_clusters = self.clusters['cluster'].to_numpy().astype(np.int8)
+        return len(features)
+
+    def recipe_cluster(self, recipe_ids):
+        # Cluster của từng recipe id (-1 nếu món chưa được phân cụm), tra bằng searchsorted
+        recipe_ids = np.asarray(recipe_ids)
+        if self._cluster_recipe_ids is None or len(self._cluster_recipe_ids) == 0:
+            return np.full(len(recipe_ids), -1, dtype=np.int8)
+        pos = np.minimum(np.searchsorted(self._cluster_recipe_ids, recipe_ids), len(self._cluster_recipe_ids) - 1)
+        return np.where(self._cluster_recipe_ids[pos] == recipe_ids, self._recipe_clusters[pos], -1).astype(np.int8)
+
+    def _clustered_recipes(self):
+        # Bảng cụm theo món (một dòng mỗi recipe) thay cho bản sao toàn bộ tương tác
+        clustered = self.clusters.rename_axis('recipe_id').reset_index()
+        if 'name' in self.data.columns:
+            names = self.data.drop_duplicates('recipe_id').set_index('recipe_id')['name']
+            clustered.insert(1, 'name', clustered['recipe_id'].map(names))
+        return clustered
+
+    def find_association_rules(self, min_support=0.005, min_confidence=0.1, max_len=None, n_jobs=1):
+        # Tìm luật kết hợp giữa các món ăn (khai phá trực tiếp trên ma trận thưa)
         try:
             user_ids = self.data['user_id'].astype('category')
             recipe_ids = self.data['recipe_id'].astype('category')
@@ -111,25 +393,30 @@ class RestaurantRecommender:
                 (ratings, (user_idx, recipe_idx)),
                 shape=(len(user_ids.cat.categories), len(recipe_ids.cat.categories))
             )
-            recipe_columns = [str(col) for col in recipe_ids.cat.categories]
-            user_item_df = pd.DataFrame.sparse.from_spmatrix(
+            frequent_itemsets = mine_frequent_itemsets(
                 user_item_matrix,
-                index=user_ids.cat.categories,
-                columns=recipe_columns
+                min_support=min_support,
+                max_len=max_len,
+                n_jobs=n_jobs,
+                item_ids=recipe_ids.cat.categories.to_numpy()
             )
-            user_item_df = user_item_df.astype(bool)
-            frequent_itemsets = apriori(user_item_df, min_support=min_support, use_colnames=True)
             if len(frequent_itemsets) > 0:
-                rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence)
-                rules = rules.sort_values('confidence', ascending=False)
+                # Lọc lift và top-k theo tiền đề ngay khi sinh luật, không dựng toàn bộ bảng luật rồi mới lọc
+                rules = association_rules(frequent_itemsets, metric="confidence", min_threshold=min_confidence,
+                                          min_lift=self.rules_min_lift, top_k=self.rules_top_k)
+                rules = rules.sort_values(['confidence', 'lift'], ascending=False, kind='mergesort')
                 rules['antecedents'] = rules['antecedents'].apply(
-                    lambda x: list(x)[0] if len(x) == 1 else str(list(x))
+                    lambda x: str(list(x)[0]) if len(x) == 1 else str(sorted(x))
                 )
                 rules['consequents'] = rules['consequents'].apply(
-                    lambda x: list(x)[0] if len(x) == 1 else str(list(x))
+                    lambda x: str(list(x)[0]) if len(x) == 1 else str(sorted(x))
                 )
                 self.association_rules_df = rules
-                rules.to_csv('../data/association_rules.csv', index=False)
+                self._interactions_since_rules = 0
+                self._new_model_version()
+                if self.rule_store_dir:
+                    self.rule_adjacency().save(self.rule_store_dir)
+                write_artifact(rules, '../data/association_rules.csv', export_csv=self.export_csv)
                 logger.info(f"Tìm được {len(rules)} luật kết hợp")
                 return rules
             else:
@@ -142,7 +429,11 @@ class RestaurantRecommender:
     def analyze_seasonal_trends(self):
         # Phân tích xu hướng theo mùa
         try:
-            seasonal_stats = self.data.groupby('season').agg({
+            clusters = self.recipe_cluster(self.data['recipe_id'].to_numpy()).astype(float)
+            clusters[clusters < 0] = np.nan
+            seasonal_stats = self.data[['season', 'recipe_id', 'minutes', 'ingredient_count']].assign(
+                cluster=clusters
+            ).groupby('season', observed=True).agg({
                 'recipe_id': 'count',
                 'minutes': 'mean',
                 'ingredient_count': 'mean',
@@ -150,7 +441,7 @@ class RestaurantRecommender:
             }).round(2).reset_index()
             seasonal_stats.columns = ['season', 'recipe_count', 'avg_minutes', 'avg_ingredients', 'popular_cluster']
             self.seasonal_trends = seasonal_stats
-            seasonal_stats.to_csv('../data/seasonal_trends.csv', index=False)
+            write_artifact(seasonal_stats, '../data/seasonal_trends.csv', export_csv=self.export_csv)
             self._plot_seasonal_trends(seasonal_stats)
             logger.info("Đã phân tích xu hướng theo mùa")
             return seasonal_stats
@@ -180,65 +471,281 @@ class RestaurantRecommender:
             recommendations = []
             cluster_recs = self._recommend_by_cluster(user_id, max(n_recommendations // 2, 1))
             recommendations.extend(cluster_recs)
-            if self.association_rules_df is not None and len(self.association_rules_df) > 0:
+            if self._has_rules():
                 rule_recs = self._recommend_by_rules(user_id, max(n_recommendations // 3, 1))
                 recommendations.extend(rule_recs)
             remaining = n_recommendations - len(recommendations)
             if remaining > 0:
-                seasonal_recs = self._recommend_by_season(user_id, season, remaining)
+                seasonal_recs = self._recommend_by_season(user_id, season, remaining, exclude=recommendations)
                 recommendations.extend(seasonal_recs)
             unique_recs = list(dict.fromkeys(recommendations))
             if len(unique_recs) < n_recommendations:
                 remaining = n_recommendations - len(unique_recs)
-                popular_recs = self._recommend_popular_items(season, remaining)
+                popular_recs = self._recommend_popular_items(season, remaining, exclude=unique_recs)
                 unique_recs.extend(popular_recs)
             return unique_recs[:n_recommendations]
         except Exception as e:
             logger.error(f"Lỗi gợi ý cho người dùng {user_id}: {e}")
             return []
 
+    def recommend_batch(self, user_ids=None, season='Hè', n_recommendations=5, n_jobs=1, chunk_size=2000):
+        # Gợi ý cho nhiều người dùng, trả về DataFrame gọn (user_id, rank, recipe_id) theo thứ tự user_ids
+        if user_ids is None:
+            user_ids = sorted(self.user_profiles)
+        user_ids = list(dict.fromkeys(user_ids))
+        if n_jobs is None or n_jobs < 1:
+            n_jobs = os.cpu_count() or 1
+
+        # Dựng sẵn các index trước khi chia shard để process con không phải dựng lại
+        if self.data is not None and len(self.data) > 0:
+            self._user_data(None)
+            self._popularity_ranking(season)
+        if self.clusters is not None:
+            self._cluster_ranking(None)
+        self.rule_adjacency()
+
+        # Người dùng mới đều nhận cùng danh sách phổ biến nên chỉ tính một lần
+        known = [user_id for user_id in user_ids if user_id in self.user_profiles]
+        popular = self._recommend_popular_items(season, n_recommendations) if len(known) < len(user_ids) else []
+        shards = [known[i:i + chunk_size] for i in range(0, len(known), chunk_size)]
+        tasks = [(shard, season, n_recommendations) for shard in shards]
+        if n_jobs == 1 or len(shards) <= 1:
+            _init_batch_worker(self)
+            shard_results = [_recommend_shard(task) for task in tasks]
+        else:
+            with ProcessPoolExecutor(max_workers=n_jobs, initializer=_init_batch_worker,
+                                     initargs=(self,)) as pool:
+                shard_results = list(pool.map(_recommend_shard, tasks))
+        known_recs = {}
+        for shard, recs in zip(shards, shard_results):
+            known_recs.update(zip(shard, recs))
+
+        per_user = [known_recs.get(user_id, popular) for user_id in user_ids]
+        lengths = np.fromiter((len(recs) for recs in per_user), dtype=np.int64, count=len(per_user))
+        recipe_ids = [recipe_id for recs in per_user for recipe_id in recs]
+        offsets = np.repeat(np.cumsum(lengths) - lengths, lengths)
+        return pd.DataFrame({
+            'user_id': np.repeat(np.asarray(user_ids, dtype=np.int64), lengths),
+            'rank': (np.arange(int(lengths.sum())) - offsets + 1).astype(np.int16),
+            'recipe_id': np.asarray(recipe_ids, dtype=np.int64)
+        })
+
     def _recommend_by_cluster(self, user_id, n_recs):
         if self.clusters is None:
             return []
-        user_data = self.data[self.data['user_id'] == user_id]
-        user_clusters = user_data.groupby('cluster')['rating'].mean().sort_values(ascending=False)
+        user_data = self._user_data(user_id)
+        clusters = self.recipe_cluster(user_data['recipe_id'].to_numpy())
+        known = clusters >= 0
+        user_clusters = user_data['rating'][known].groupby(clusters[known]).mean().sort_values(ascending=False)
         if len(user_clusters) == 0:
             return []
-        fav_cluster = user_clusters.index[0]
-        cluster_recipes = self.clusters[self.clusters['cluster'] == fav_cluster].sort_values('rating', ascending=False)
-        return cluster_recipes.index[:n_recs].tolist()
+        fav_cluster = int(user_clusters.index[0])
+        return self._cluster_ranking(fav_cluster)[:n_recs].tolist()
 
     def _recommend_by_rules(self, user_id, n_recs):
-        if self.association_rules_df is None or len(self.association_rules_df) == 0:
+        if not self._has_rules():
             return []
-        user_liked = self.data[
-            (self.data['user_id'] == user_id) & (self.data['rating'] >= 4)
-        ]['recipe_id'].tolist()
-        recommendations = []
-        for recipe in user_liked:
-            rules = self.association_rules_df[
-                self.association_rules_df['antecedents'] == str(recipe)
-            ]
-            if len(rules) > 0:
-                recommendations.extend([
-                    int(r) if r.isdigit() else r for r in rules['consequents']
-                ])
-        return recommendations[:n_recs]
-
-    def _recommend_by_season(self, user_id, season, n_recs):
-        seasonal_data = self.data[self.data['season'] == season]
-        popular_in_season = seasonal_data.groupby('recipe_id')['rating'].mean().sort_values(ascending=False)
-        return popular_in_season.index[:n_recs].tolist()
-
-    def _recommend_popular_items(self, season, n_recs):
-        seasonal_data = self.data[self.data['season'] == season] if season else self.data
-        popular_items = seasonal_data.groupby('recipe_id')['rating'].mean().sort_values(ascending=False)
-        return popular_items.index[:n_recs].tolist()
+        user_data = self._user_data(user_id)
+        user_liked = user_data.loc[user_data['rating'] >= 4, 'recipe_id'].tolist()
+        return self.rule_adjacency().recommend(user_liked, n_recs)
+
+    def rule_adjacency(self):
+        # Adjacency của bảng luật hiện tại, chỉ dựng lại khi bảng luật thay đổi
+        # (bảng luật đã được lọc lift/top-k khi sinh luật nên không lọc lại ở đây)
+        if self._rule_adjacency is None or self._rule_adjacency_source is not self.association_rules_df:
+            self._rule_adjacency = RuleAdjacency.from_rules(self.association_rules_df)
+            self._rule_adjacency_source = self.association_rules_df
+        return self._rule_adjacency
+
+    def load_rule_adjacency(self, store_dir=None):
+        # Memory-map adjacency đã lưu thay vì đọc lại bảng luật; bảng luật được coi là chưa tải
+        store_dir = store_dir or self.rule_store_dir
+        if not store_dir:
+            return False
+        adjacency = RuleAdjacency.load(store_dir)
+        if adjacency is None:
+            return False
+        self._rule_adjacency = adjacency
+        self._new_model_version()
+        self._rule_adjacency_source = self.association_rules_df
+        return True
+
+    def _has_rules(self):
+        return len(self.rule_adjacency()) > 0
+
+    def _popularity_ranking(self, season):
+        # Top-N recipe theo rating trung bình của mùa; dựng lại khi self.data được thay thế
+        if self._popularity_source is not self.data:
+            rankings = {None: self._rank_by_rating(self.data)}
+            for season_name, season_data in self.data.groupby('season', sort=False, observed=True):
+                rankings[season_name] = self._rank_by_rating(season_data)
+            self._popularity_rankings = rankings
+            self._popularity_source = self.data
+        return self._popularity_rankings.get(season or None, np.array([], dtype=np.int64))
+
+    def _rank_by_rating(self, data):
+        mean_ratings = data.groupby('recipe_id')['rating'].mean().sort_values(ascending=False, kind='mergesort')
+        return mean_ratings.index[:self.popularity_top_n].to_numpy()
+
+    def _take_ranked(self, ranking, n_recs, exclude=None):
+        # Lấy n_recs phần tử đầu của bảng xếp hạng, bỏ qua các món đã chọn
+        if not exclude:
+            return ranking[:n_recs].tolist()
+        exclude = set(exclude)
+        picked = []
+        for recipe_id in ranking.tolist():
+            if recipe_id not in exclude:
+                picked.append(recipe_id)
+                if len(picked) >= n_recs:
+                    break
+        return picked
+
+    def _recommend_by_season(self, user_id, season, n_recs, exclude=None):
+        return self._take_ranked(self._popularity_ranking(season), n_recs, exclude)
+
+    def _recommend_popular_items(self, season, n_recs, exclude=None):
+        return self._take_ranked(self._popularity_ranking(season), n_recs, exclude)
+
+    def save_model(self, bundle_dir=None):
+        # Lưu profile, index tương tác theo user, cụm, adjacency luật và xếp hạng phổ biến thành một bundle
+        bundle_dir = bundle_dir or MODEL_BUNDLE_DIR
+        self._user_data(None)
+        arrays = {
+            'users.ids': self._user_ids.astype(np.int64),
+            'users.offsets': self._user_offsets.astype(np.int64),
+            'users.recipe_id': self.data['recipe_id'].to_numpy()[self._user_rows].astype(np.int32),
+            'users.rating': self.data['rating'].to_numpy()[self._user_rows].astype(np.float32),
+            'profiles.user_ids': self.user_profiles.user_ids,
+            'profiles.stats': self.user_profiles.stats,
+            'profiles.seasonal': self.user_profiles.seasonal,
+            'profiles.has_seasonal': self.user_profiles.has_seasonal
+        }
+        interaction_seasons = []
+        if 'season' in self.data.columns:
+            seasons = self.data['season'].astype('category')
+            interaction_seasons = seasons.cat.categories.tolist()
+            arrays['users.season'] = seasons.cat.codes.to_numpy()[self._user_rows].astype(np.int8)
+        # Tổng cộng dồn của profile, để model tải từ bundle vẫn cập nhật tăng dần được
+        seasonal_totals_seasons = []
+        if self._profile_totals is not None:
+            arrays['totals.user_ids'] = self._profile_totals.index.to_numpy(dtype=np.int64)
+            arrays['totals.values'] = self._profile_totals.to_numpy(dtype=np.float64)
+            season_index = self._seasonal_totals.index
+            season_codes, seasonal_totals_seasons = pd.factorize(season_index.get_level_values('season'), sort=True)
+            seasonal_totals_seasons = seasonal_totals_seasons.tolist()
+            arrays['seasonal_totals.user_ids'] = season_index.get_level_values('user_id').to_numpy(dtype=np.int64)
+            arrays['seasonal_totals.season'] = season_codes.astype(np.int8)
+            arrays['seasonal_totals.values'] = self._seasonal_totals[['sum', 'count']].to_numpy(dtype=np.float64)
+        adjacency = self.rule_adjacency()
+        for name in ['antecedent_ids', 'offsets', 'consequents', 'confidence', 'lift']:
+            arrays[f'rules.{name}'] = getattr(adjacency, name)
+        if self.clusters is not None:
+            arrays['clusters.recipe_id'] = self._cluster_recipe_ids.astype(np.int32)
+            for col in list(CLUSTER_FEATURES) + ['cluster']:
+                arrays[f'clusters.{col}'] = self.clusters[col].to_numpy()
+        # Xếp hạng phổ biến của mọi mùa nối liền, mùa thứ k nằm ở [offsets[k], offsets[k + 1])
+        self._popularity_ranking(None)
+        ranking_seasons = list(self._popularity_rankings)
+        rankings = [self._popularity_rankings[season] for season in ranking_seasons]
+        arrays['popularity.recipe_id'] = np.concatenate(rankings).astype(np.int32)
+        arrays['popularity.offsets'] = np.concatenate([[0], np.cumsum([len(r) for r in rankings])]).astype(np.int64)
+        meta = {
+            'components': sorted({name.split('.')[0] for name in arrays}),
+            'model_version': self.model_version,
+            'n_interactions': int(len(self.data)),
+            'data_stamp': self.data_stamp,
+            'seasons': self.user_profiles.seasons,
+            'interaction_seasons': interaction_seasons,
+            'profile_totals_columns': None if self._profile_totals is None else list(self._profile_totals.columns),
+            'seasonal_totals_seasons': seasonal_totals_seasons,
+            'interactions_since_clustering': self._interactions_since_clustering,
+            'interactions_since_rules': self._interactions_since_rules,
+            'popularity_seasons': ranking_seasons,
+            'cluster_model': self._cluster_model.to_dict() if self._cluster_model is not None else None,
+            'config': {
+                'n_clusters': self._n_clusters,
+                'clustering_options': self._clustering_options,
+                'rules_top_k': self.rules_top_k,
+                'rules_min_lift': self.rules_min_lift,
+                'popularity_top_n': self.popularity_top_n,
+                'max_users': self.max_users,
+                'max_recipes': self.max_recipes
+            }
+        }
+        save_bundle(bundle_dir, arrays, meta)
+        logger.info(f"Đã lưu bundle model vào {bundle_dir}")
+        return bundle_dir
+
+    @classmethod
+    def load_model(cls, bundle_dir=None, mmap=True):
+        # Tải bundle đã lưu (memory-map) để gợi ý ngay, không cần dữ liệu thô hay huấn luyện lại
+        bundle_dir = bundle_dir or MODEL_BUNDLE_DIR
+        loaded = load_bundle(bundle_dir, mmap=mmap)
+        if loaded is None:
+            return None
+        arrays, meta = loaded
+        config = meta['config']
+        recommender = cls(max_users=config['max_users'], max_recipes=config['max_recipes'],
+                          popularity_top_n=config['popularity_top_n'], rules_top_k=config['rules_top_k'],
+                          rules_min_lift=config['rules_min_lift'])
+        recommender._n_clusters = config['n_clusters']
+        recommender._clustering_options = config['clustering_options']
+        recommender._interactions_since_clustering = meta['interactions_since_clustering']
+        recommender._interactions_since_rules = meta['interactions_since_rules']
+        recommender.model_version = meta['model_version']
+        recommender.data_stamp = meta.get('data_stamp')
+        recommender._user_ids = arrays['users.ids']
+        recommender._user_offsets = arrays['users.offsets']
+        recommender._user_columns = {'recipe_id': arrays['users.recipe_id'], 'rating': arrays['users.rating']}
+        if 'users.season' in arrays:
+            recommender._user_columns['season'] = pd.Categorical.from_codes(
+                np.asarray(arrays['users.season']), categories=meta['interaction_seasons']
+            )
+        if 'totals.user_ids' in arrays:
+            recommender._profile_totals = pd.DataFrame(
+                np.array(arrays['totals.values']), columns=meta['profile_totals_columns'],
+                index=pd.Index(np.array(arrays['totals.user_ids']), name='user_id')
+            )
+            season_index = pd.MultiIndex.from_arrays([
+                np.array(arrays['seasonal_totals.user_ids']),
+                pd.Index(meta['seasonal_totals_seasons'], dtype=object)[arrays['seasonal_totals.season']]
+            ], names=['user_id', 'season'])
+            recommender._seasonal_totals = pd.DataFrame(
+                np.array(arrays['seasonal_totals.values']), columns=['sum', 'count'], index=season_index
+            )
+        recommender.user_profiles = UserProfileStore(
+            arrays['profiles.user_ids'], arrays['profiles.stats'], meta['seasons'],
+            arrays['profiles.seasonal'], arrays['profiles.has_seasonal']
+        )
+        recommender._rule_adjacency = RuleAdjacency(
+            arrays['rules.antecedent_ids'], arrays['rules.offsets'], arrays['rules.consequents'],
+            arrays['rules.confidence'], arrays['rules.lift']
+        )
+        if meta.get('cluster_model') is not None:
+            recommender._cluster_model = ClusterModel.from_dict(meta['cluster_model'])
+        if 'clusters.recipe_id' in arrays:
+            clusters = pd.DataFrame(
+                {col: arrays[f'clusters.{col}'] for col in list(CLUSTER_FEATURES) + ['cluster']},
+                index=pd.Index(arrays['clusters.recipe_id'], name='recipe_id')
+            )
+            if recommender._cluster_model is not None:
+                clusters['cluster_name'] = clusters['cluster'].map(recommender._cluster_model.name_map())
+            recommender.clusters = clusters
+            recommender._cluster_recipe_ids = arrays['clusters.recipe_id']
+            recommender._recipe_clusters = arrays['clusters.cluster'].astype(np.int8)
+        offsets = arrays['popularity.offsets']
+        recommender._popularity_rankings = {
+            season: arrays['popularity.recipe_id'][offsets[k]:offsets[k + 1]]
+            for k, season in enumerate(meta['popularity_seasons'])
+        }
+        logger.info(f"Đã tải bundle model từ {bundle_dir}: {len(recommender.user_profiles)} người dùng, "
+                    f"{len(recommender._rule_adjacency)} cạnh luật")
+        return recommender
 
     def create_menu_file(self):
         # Tạo file menu.csv phục vụ cho frontend
         try:
-            menu_df = self.data.groupby(['recipe_id', 'name']).agg({
+            menu_df = self.data.groupby(['recipe_id', 'name'], observed=True).agg({
                 'rating': 'mean',
                 'minutes': 'first',
                 'calories': 'first',
@@ -256,7 +763,7 @@ class RestaurantRecommender:
                 'id', 'name', 'minutes', 'nutrition',
                 'ingredients_list', 'season', 'category', 'price'
             ]]
-            menu_df.to_csv('../data/menu.csv', index=False)
+            write_artifact(menu_df, '../data/menu.csv', export_csv=self.export_csv)
             logger.info(f"Đã tạo menu với {len(menu_df)} món ăn")
             return menu_df
         except Exception as e:
@@ -265,10 +772,48 @@ class RestaurantRecommender:
 
 
 if __name__ == "__main__":
-    recommender = RestaurantRecommender(max_users=10000, max_recipes=50000)
-    if recommender.load_data('../data/cleaned_data.csv'):
-        recommender.build_user_profiles()
-        recommender.perform_clustering()
-        recommender.find_association_rules()
-        recommender.analyze_seasonal_trends()
-        recommender.create_menu_file()
+    parser = argparse.ArgumentParser(description='Huấn luyện recommender và (tùy chọn) gợi ý hàng loạt cho mọi người dùng')
+    parser.add_argument('--data', default='../data/cleaned_data.csv', help='file dữ liệu đã làm sạch')
+    parser.add_argument('--batch-output', help='file parquet lưu gợi ý cho mọi người dùng')
+    parser.add_argument('--season', default='Hè', help='mùa dùng khi gợi ý hàng loạt')
+    parser.add_argument('--n', type=int, default=5, help='số món gợi ý cho mỗi người dùng')
+    parser.add_argument('--n-jobs', type=int, default=1, help='số process (-1: tất cả CPU)')
+    parser.add_argument('--max-len', type=int, default=None, help='số món tối đa trong một tập phổ biến')
+    parser.add_argument('--cluster-engine', choices=sorted(CLUSTER_ENGINE_N_INIT), default='kmeans',
+                        help='engine phân cụm món ăn')
+    parser.add_argument('--n-init', type=int, default=None, help='số lần khởi tạo khi phân cụm')
+    parser.add_argument('--rules-top-k', type=int, default=20, help='số luật tốt nhất giữ lại cho mỗi tiền đề')
+    parser.add_argument('--rules-min-lift', type=float, default=1.0, help='lift tối thiểu của luật được giữ lại')
+    parser.add_argument('--bundle', default=MODEL_BUNDLE_DIR, help='thư mục lưu bundle model cho app')
+    parser.add_argument('--export-csv', action='store_true', help='ghi thêm bản CSV của các artifact')
+    parser.add_argument('--incremental', action='store_true',
+                        help='cập nhật bundle đã có bằng các phần mới ghi nối vào --data thay vì huấn luyện lại')
+    args = parser.parse_args()
+
+    recommender = RestaurantRecommender.load_model(args.bundle) if args.incremental else None
+    summary = None
+    if recommender is not None:
+        recommender.export_csv = args.export_csv
+        summary = recommender.update_from_artifact(args.data)
+    if summary is not None:
+        recommender.save_model(args.bundle)
+    else:
+        if args.incremental:
+            logger.warning("Không cập nhật tăng dần được (chưa có bundle hoặc dữ liệu đã được xử lý lại), "
+                           "huấn luyện lại toàn bộ")
+        recommender = RestaurantRecommender(max_users=10000, max_recipes=50000, export_csv=args.export_csv,
+                                            rules_top_k=args.rules_top_k, rules_min_lift=args.rules_min_lift)
+        if recommender.load_data(args.data):
+            recommender.build_user_profiles()
+            recommender.load_cluster_model()
+            recommender.perform_clustering(engine=args.cluster_engine, n_init=args.n_init)
+            recommender.find_association_rules(max_len=args.max_len, n_jobs=args.n_jobs)
+            recommender.analyze_seasonal_trends()
+            recommender.create_menu_file()
+            recommender.save_model(args.bundle)
+        else:
+            recommender = None
+    if recommender is not None and args.batch_output:
+        batch = recommender.recommend_batch(season=args.season, n_recommendations=args.n, n_jobs=args.n_jobs)
+        batch.to_parquet(args.batch_output, index=False)
+        logger.info(f"Đã lưu {len(batch)} gợi ý cho {batch['user_id'].nunique()} người dùng vào {args.batch_output}")
@@ -0,0 +1,180 @@
+import ast
+import heapq
+import json
+import logging
+import os
+from typing import Iterable, List, Optional
+
+import numpy as np
+import pandas as pd
+
+from artifact_io import load_array, save_array
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi bố cục file của adjacency thay đổi
+RULE_STORE_VERSION = 1
+
+# Các mảng của adjacency: (tên file, kiểu lưu trên đĩa)
+_ARRAY_DTYPES = {
+    'antecedent_ids': np.int32,
+    'offsets': np.int64,
+    'consequents': np.int32,
+    'confidence': np.float32,
+    'lift': np.float32
+}
+
+
+def _rule_items(value) -> List[int]:
+    """Chuyển antecedents/consequents (frozenset, list, '12' hoặc "['1', '2']") thành list id món"""
+    if isinstance(value, (frozenset, set, list, tuple)):
+        items = list(value)
+    elif isinstance(value, str):
+        text = value.strip()
+        if text.startswith('frozenset(') and text.endswith(')'):
+            text = text[len('frozenset('):-1]
+        items = list(ast.literal_eval(text)) if text.startswith(('[', '(', '{')) else [text]
+    else:
+        items = [value]
+    return [int(item) for item in items]
+
+
+class RuleAdjacency:
+    """Luật kết hợp dạng CSR: id món tiền đề -> các món hệ quả xếp theo confidence, lift giảm dần"""
+
+    def __init__(self, antecedent_ids: np.ndarray, offsets: np.ndarray, consequents: np.ndarray,
+                 confidence: np.ndarray, lift: np.ndarray):
+        # antecedent_ids đã sắp tăng dần nên tra cứu bằng searchsorted, không cần dict (giữ được memmap)
+        self.antecedent_ids = antecedent_ids
+        self.offsets = offsets
+        self.consequents = consequents
+        self.confidence = confidence
+        self.lift = lift
+
+    def __len__(self) -> int:
+        return len(self.consequents)
+
+    @classmethod
+    def from_rules(cls, rules_df: pd.DataFrame, top_k: Optional[int] = None,
+                   min_lift: Optional[float] = None) -> 'RuleAdjacency':
+        """Dựng adjacency từ bảng luật; chỉ giữ luật có tiền đề một món (luật nhiều món được tách hệ quả)
+
+        top_k giới hạn số hệ quả tốt nhất của mỗi tiền đề, min_lift bỏ các cạnh có lift thấp hơn.
+        """
+        antecedents, consequents, confidence, lift = [], [], [], []
+        if rules_df is not None and len(rules_df) > 0:
+            lifts = rules_df['lift'] if 'lift' in rules_df.columns else pd.Series(1.0, index=rules_df.index)
+            for ante, cons, conf, lft in zip(rules_df['antecedents'], rules_df['consequents'],
+                                             rules_df['confidence'], lifts):
+                try:
+                    ante_items = _rule_items(ante)
+                    cons_items = _rule_items(cons)
+                except (ValueError, SyntaxError):
+                    continue
+                if len(ante_items) != 1:
+                    continue
+                for item in cons_items:
+                    antecedents.append(ante_items[0])
+                    consequents.append(item)
+                    confidence.append(conf)
+                    lift.append(lft)
+
+        antecedents = np.asarray(antecedents, dtype=np.int32)
+        consequents = np.asarray(consequents, dtype=np.int32)
+        confidence = np.asarray(confidence, dtype=np.float32)
+        lift = np.asarray(lift, dtype=np.float32)
+        if min_lift is not None:
+            keep = lift >= min_lift
+            antecedents, consequents, confidence, lift = (
+                antecedents[keep], consequents[keep], confidence[keep], lift[keep]
+            )
+
+        # Sắp theo tiền đề, trong mỗi tiền đề theo confidence rồi lift giảm dần
+        order = np.lexsort((-lift, -confidence, antecedents))
+        antecedents, consequents = antecedents[order], consequents[order]
+        confidence, lift = confidence[order], lift[order]
+        antecedent_ids, starts, counts = np.unique(antecedents, return_index=True, return_counts=True)
+        if top_k is not None:
+            # Thứ hạng trong nhóm tiền đề = vị trí - vị trí đầu nhóm
+            rank = np.arange(len(antecedents)) - np.repeat(starts, counts)
+            keep = rank < top_k
+            antecedents, consequents = antecedents[keep], consequents[keep]
+            confidence, lift = confidence[keep], lift[keep]
+            counts = np.minimum(counts, top_k)
+        offsets = np.concatenate([[0], np.cumsum(counts)]).astype(np.int64)
+        logger.info(f"Đã dựng adjacency cho {len(antecedent_ids)} món tiền đề, {len(consequents)} cạnh")
+        return cls(antecedent_ids, offsets, consequents, confidence, lift)
+
+    def save(self, store_dir: str) -> None:
+        """Lưu adjacency thành các mảng .npy (id int32, metric float32) để có thể memory-map khi tải"""
+        os.makedirs(store_dir, exist_ok=True)
+        # Xóa meta trước và ghi lại sau cùng để store dở dang không bao giờ được coi là hợp lệ
+        meta_path = os.path.join(store_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        for name, dtype in _ARRAY_DTYPES.items():
+            save_array(os.path.join(store_dir, f'{name}.npy'), np.asarray(getattr(self, name), dtype=dtype))
+        meta = {
+            'format_version': RULE_STORE_VERSION,
+            'n_antecedents': int(len(self.antecedent_ids)),
+            'n_edges': int(len(self.consequents))
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f)
+
+    @classmethod
+    def load(cls, store_dir: str, mmap: bool = True) -> Optional['RuleAdjacency']:
+        """Tải adjacency đã lưu (mặc định memory-map, không đọc cả file); None nếu không có hoặc lỗi thời"""
+        meta_path = os.path.join(store_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('format_version') != RULE_STORE_VERSION:
+                return None
+            arrays = {name: load_array(os.path.join(store_dir, f'{name}.npy'), mmap) for name in _ARRAY_DTYPES}
+            logger.info(f"Đã tải adjacency luật kết hợp từ {store_dir}: {meta.get('n_edges')} cạnh")
+            return cls(**arrays)
+        except Exception as e:
+            logger.warning(f"Không thể tải adjacency luật kết hợp từ {store_dir}: {e}")
+            return None
+
+    def _find(self, recipe_id) -> Optional[int]:
+        # Vị trí của món trong antecedent_ids (None nếu món không là tiền đề của luật nào)
+        k = int(np.searchsorted(self.antecedent_ids, recipe_id))
+        if k < len(self.antecedent_ids) and self.antecedent_ids[k] == recipe_id:
+            return k
+        return None
+
+    def neighbors(self, recipe_id: int, limit: Optional[int] = None) -> np.ndarray:
+        """Các món hệ quả của một món, tốt nhất trước"""
+        k = self._find(recipe_id)
+        if k is None:
+            return self.consequents[:0]
+        start, end = self.offsets[k], self.offsets[k + 1]
+        if limit is not None:
+            end = min(end, start + limit)
+        return self.consequents[start:end]
+
+    def recommend(self, liked: Iterable[int], n_recs: int) -> List[int]:
+        """Trộn các danh sách hệ quả của những món đã thích theo confidence, bỏ trùng"""
+        streams = []
+        for recipe_id in dict.fromkeys(liked):
+            k = self._find(recipe_id)
+            if k is None:
+                continue
+            start = self.offsets[k]
+            end = min(self.offsets[k + 1], start + n_recs)
+            streams.append(zip((-self.confidence[start:end]).tolist(), (-self.lift[start:end]).tolist(),
+                               self.consequents[start:end].tolist()))
+        recommendations = []
+        seen = set()
+        for _, _, consequent in heapq.merge(*streams):
+            if consequent in seen:
+                continue
+            seen.add(consequent)
+            recommendations.append(consequent)
+            if len(recommendations) >= n_recs:
+                break
+        return recommendations
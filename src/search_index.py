@@ -0,0 +1,349 @@
+import hashlib
+import json
+import logging
+import os
+import heapq
+import re
+from typing import Callable, Dict, Iterable, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+from scipy import sparse
+from sklearn.feature_extraction.text import TfidfVectorizer
+from fuzzywuzzy import fuzz, utils as fuzz_utils
+
+from artifact_io import load_array, save_array
+
+logger = logging.getLogger(__name__)
+
+# Tăng khi thay đổi cách dựng index để các index cũ trên đĩa bị bỏ qua
+INDEX_FORMAT_VERSION = 2
+
+TEXT_COLUMNS = ['name', 'ingredients', 'tags', 'description']
+
+TOKEN_PATTERN = r'[a-zA-ZàáạảãâầấậẩẫăằắặẳẵèéẹẻẽêềếệểễìíịỉĩòóọỏõôồốộổỗơờớợởỡùúụủũưừứựửữỳýỵỷỹđĐ]+'
+
+ENGLISH_STOPWORDS = ['the', 'and', 'or', 'but', 'in', 'on', 'at', 'to', 'for', 'of', 'with', 'by']
+
+
+def fingerprint_file(path: str, chunk_size: int = 1 << 20) -> str:
+    """Tính dấu vân tay nội dung của file dữ liệu nguồn"""
+    digest = hashlib.sha1()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def fingerprint_frame(recipe_df: pd.DataFrame) -> str:
+    """Tính dấu vân tay của các cột văn bản trong DataFrame công thức"""
+    digest = hashlib.sha1()
+    digest.update(str(len(recipe_df)).encode())
+    for col in TEXT_COLUMNS:
+        if col in recipe_df.columns:
+            digest.update(col.encode())
+            hashed = pd.util.hash_pandas_object(recipe_df[col].astype(str), index=False)
+            digest.update(hashed.to_numpy().tobytes())
+    return digest.hexdigest()
+
+
+def build_recipe_texts(recipe_df: pd.DataFrame, normalize: Callable[[str], str]) -> List[str]:
+    """Ghép văn bản gốc và văn bản chuẩn hóa của từng công thức theo cột"""
+    combined = pd.Series('', index=recipe_df.index, dtype=object)
+    for col in TEXT_COLUMNS:
+        if col not in recipe_df.columns:
+            continue
+        values = recipe_df[col]
+        present = values.notna()
+        original = values[present].astype(str)
+        part = original + ' ' + original.map(normalize)
+        combined[present] = combined[present] + ' ' + part
+    return combined.tolist()
+
+
+def keyword_table_signature(keyword_table: Dict[str, List[str]]) -> str:
+    """Dấu vân tay của bảng từ khóa, dùng để biết ma trận đặc trưng đã lưu còn hợp lệ không"""
+    return hashlib.sha1(json.dumps(keyword_table, ensure_ascii=False).encode('utf-8')).hexdigest()
+
+
+def _keyword_pattern(label: str, keywords: List[str]) -> str:
+    return '|'.join(re.escape(kw) for kw in [label] + list(keywords))
+
+
+def _lower_text(recipe_df: pd.DataFrame, col: str) -> pd.Series:
+    # Giống str(recipe.get(col, '')).lower(): thiếu cột thì rỗng, NaN thành 'nan'
+    if col not in recipe_df.columns:
+        return pd.Series('', index=recipe_df.index, dtype=object)
+    return recipe_df[col].astype(str).str.lower()
+
+
+class KeywordHits:
+    """Ma trận boolean (công thức x nhãn): văn bản công thức có chứa nhãn hoặc từ khóa của nhãn"""
+
+    def __init__(self, labels: List[str], hits: np.ndarray, signature: Optional[str] = None):
+        self.labels = list(labels)
+        self.hits = hits
+        self.signature = signature
+        self._column = {label: i for i, label in enumerate(self.labels)}
+
+    @classmethod
+    def build(cls, texts: pd.Series, keyword_table: Dict[str, List[str]]) -> 'KeywordHits':
+        hits = np.zeros((len(texts), len(keyword_table)), dtype=bool)
+        for j, (label, keywords) in enumerate(keyword_table.items()):
+            hits[:, j] = texts.str.contains(_keyword_pattern(label, keywords), regex=True).to_numpy(dtype=bool)
+        return cls(list(keyword_table), hits, keyword_table_signature(keyword_table))
+
+    def columns(self, labels: Iterable[str]) -> List[int]:
+        return [self._column[label] for label in labels if label in self._column]
+
+    def any_hit(self, labels: Iterable[str]) -> np.ndarray:
+        """Công thức khớp ít nhất một nhãn"""
+        cols = self.columns(labels)
+        if not cols:
+            return np.zeros(self.hits.shape[0], dtype=bool)
+        return self.hits[:, cols].any(axis=1)
+
+    def count_hits(self, labels: Iterable[str]) -> np.ndarray:
+        """Số nhãn mà mỗi công thức khớp"""
+        cols = self.columns(labels)
+        if not cols:
+            return np.zeros(self.hits.shape[0], dtype=np.int32)
+        return self.hits[:, cols].sum(axis=1, dtype=np.int32)
+
+
+def build_keyword_features(recipe_df: pd.DataFrame, cuisine_keywords: Dict[str, List[str]],
+                           ingredient_keywords: Dict[str, List[str]]) -> Dict[str, KeywordHits]:
+    """Tính trước các ma trận khớp từ khóa dùng cho điểm thưởng của semantic search"""
+    # Văn bản cho thưởng ẩm thực: name + tags + ingredients; cho thưởng nguyên liệu: ingredients
+    cuisine_text = (_lower_text(recipe_df, 'name') + ' ' + _lower_text(recipe_df, 'tags')
+                    + ' ' + _lower_text(recipe_df, 'ingredients'))
+    return {
+        'cuisine': KeywordHits.build(cuisine_text, cuisine_keywords),
+        'ingredients': KeywordHits.build(_lower_text(recipe_df, 'ingredients'), ingredient_keywords)
+    }
+
+
+def top_k_indices(scores: np.ndarray, top_k: int) -> np.ndarray:
+    """Chỉ số của top_k điểm cao nhất (giảm dần) mà không cần sắp xếp toàn bộ mảng"""
+    if top_k <= 0 or len(scores) == 0:
+        return np.array([], dtype=np.int64)
+    if top_k < len(scores):
+        candidates = np.argpartition(-scores, top_k - 1)[:top_k]
+    else:
+        candidates = np.arange(len(scores))
+    return candidates[np.argsort(-scores[candidates], kind='stable')]
+
+
+class RecipeSearchIndex:
+    """TF-IDF index của corpus công thức, fit một lần cho mỗi phiên bản dữ liệu"""
+
+    def __init__(self, vectorizer: TfidfVectorizer, matrix: sparse.csr_matrix, fingerprint: Optional[str] = None,
+                 features: Optional[Dict[str, KeywordHits]] = None):
+        self.vectorizer = vectorizer
+        self.matrix = matrix
+        self.fingerprint = fingerprint
+        self.features = features or {}
+        self.names_lower = None
+
+    def attach(self, recipe_df: pd.DataFrame, cuisine_keywords: Dict[str, List[str]],
+               ingredient_keywords: Dict[str, List[str]]) -> bool:
+        """Gắn các đặc trưng phụ thuộc corpus; trả về True nếu phải tính lại ma trận từ khóa"""
+        self.names_lower = _lower_text(recipe_df, 'name')
+        expected = {
+            'cuisine': keyword_table_signature(cuisine_keywords),
+            'ingredients': keyword_table_signature(ingredient_keywords)
+        }
+        if all(group in self.features and self.features[group].signature == signature
+               for group, signature in expected.items()):
+            return False
+        self.features = build_keyword_features(recipe_df, cuisine_keywords, ingredient_keywords)
+        return True
+
+    def name_hits(self, words: List[str]) -> np.ndarray:
+        """Tên công thức có chứa một trong các từ của truy vấn"""
+        if not words or self.names_lower is None:
+            return np.zeros(self.matrix.shape[0], dtype=bool)
+        pattern = '|'.join(re.escape(word) for word in words)
+        return self.names_lower.str.contains(pattern, regex=True).to_numpy(dtype=bool)
+
+    @classmethod
+    def build(cls, recipe_df: pd.DataFrame, normalize: Callable[[str], str],
+              stopwords: Iterable[str], fingerprint: Optional[str] = None) -> 'RecipeSearchIndex':
+        """Fit vectorizer trên toàn bộ corpus công thức"""
+        vectorizer = TfidfVectorizer(
+            max_features=8000,
+            stop_words=sorted(set(stopwords)),
+            ngram_range=(1, 3),
+            lowercase=True,
+            min_df=1,
+            max_df=0.8,
+            token_pattern=TOKEN_PATTERN
+        )
+        matrix = vectorizer.fit_transform(build_recipe_texts(recipe_df, normalize)).tocsr()
+        logger.info(f"Đã dựng TF-IDF index cho {matrix.shape[0]} công thức, {matrix.shape[1]} đặc trưng")
+        return cls(vectorizer, matrix, fingerprint)
+
+    def similarities(self, query_text: str) -> np.ndarray:
+        """Cosine similarity giữa câu truy vấn và mọi công thức"""
+        # Các vector TF-IDF đã được chuẩn hóa L2 nên tích vô hướng chính là cosine
+        query_vector = self.vectorizer.transform([query_text])
+        return np.asarray((self.matrix @ query_vector.T).todense()).ravel()
+
+    def save(self, index_dir: str) -> None:
+        """Lưu ma trận thưa, từ vựng, idf và các ma trận từ khóa xuống thư mục index"""
+        os.makedirs(index_dir, exist_ok=True)
+        # Xóa meta trước và ghi lại sau cùng để index dở dang không bao giờ được coi là hợp lệ
+        meta_path = os.path.join(index_dir, 'meta.json')
+        if os.path.exists(meta_path):
+            os.remove(meta_path)
+        # Ma trận CSR lưu thành ba mảng phẳng để có thể memory-map khi tải
+        for part in ['data', 'indices', 'indptr']:
+            save_array(os.path.join(index_dir, f'tfidf_{part}.npy'), getattr(self.matrix, part))
+        save_array(os.path.join(index_dir, 'idf.npy'), self.vectorizer.idf_)
+        vocabulary = {term: int(col) for term, col in self.vectorizer.vocabulary_.items()}
+        with open(os.path.join(index_dir, 'vocabulary.json'), 'w', encoding='utf-8') as f:
+            json.dump(vocabulary, f, ensure_ascii=False)
+        for group, hits in self.features.items():
+            save_array(os.path.join(index_dir, f'features_{group}.npy'), hits.hits)
+        meta = {
+            'format_version': INDEX_FORMAT_VERSION,
+            'fingerprint': self.fingerprint,
+            'n_documents': int(self.matrix.shape[0]),
+            'tfidf_shape': list(self.matrix.shape),
+            'stop_words': list(self.vectorizer.stop_words),
+            'ngram_range': list(self.vectorizer.ngram_range),
+            'token_pattern': self.vectorizer.token_pattern,
+            'features': {
+                group: {'labels': hits.labels, 'signature': hits.signature}
+                for group, hits in self.features.items()
+            }
+        }
+        with open(meta_path, 'w', encoding='utf-8') as f:
+            json.dump(meta, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, index_dir: str, fingerprint: Optional[str] = None, mmap: bool = True) -> Optional['RecipeSearchIndex']:
+        """Tải index đã lưu (mặc định memory-map, dùng chung giữa các worker); None nếu không có hoặc đã lỗi thời"""
+        meta_path = os.path.join(index_dir, 'meta.json')
+        if not os.path.exists(meta_path):
+            return None
+        try:
+            with open(meta_path, encoding='utf-8') as f:
+                meta = json.load(f)
+            if meta.get('format_version') != INDEX_FORMAT_VERSION:
+                return None
+            if fingerprint is not None and meta.get('fingerprint') != fingerprint:
+                return None
+            with open(os.path.join(index_dir, 'vocabulary.json'), encoding='utf-8') as f:
+                vocabulary = json.load(f)
+            vectorizer = TfidfVectorizer(
+                stop_words=meta['stop_words'],
+                ngram_range=tuple(meta['ngram_range']),
+                lowercase=True,
+                token_pattern=meta['token_pattern'],
+                vocabulary=vocabulary
+            )
+            vectorizer.idf_ = load_array(os.path.join(index_dir, 'idf.npy'), mmap)
+            data, indices, indptr = (load_array(os.path.join(index_dir, f'tfidf_{part}.npy'), mmap)
+                                     for part in ['data', 'indices', 'indptr'])
+            # copy=False để ma trận trỏ thẳng vào vùng memory-map
+            matrix = sparse.csr_matrix((data, indices, indptr), shape=tuple(meta['tfidf_shape']), copy=False)
+            features = {}
+            for group, info in meta.get('features', {}).items():
+                hits = load_array(os.path.join(index_dir, f'features_{group}.npy'), mmap)
+                features[group] = KeywordHits(info['labels'], hits, info['signature'])
+            logger.info(f"Đã tải TF-IDF index từ {index_dir}")
+            return cls(vectorizer, matrix, meta.get('fingerprint'), features)
+        except Exception as e:
+            logger.warning(f"Không thể tải TF-IDF index từ {index_dir}: {e}")
+            return None
+
+
+def _token_trigrams(text: str) -> set:
+    """Trigram ký tự theo từng token (có đệm), không phụ thuộc thứ tự token như token_sort_ratio"""
+    grams = set()
+    for token in text.split():
+        padded = f' {token} '
+        grams.update(padded[i:i + 3] for i in range(len(padded) - 2))
+    return grams
+
+
+def _sorted_token_key(processed: str) -> str:
+    return ' '.join(sorted(processed.split()))
+
+
+class DishNameIndex:
+    """Index tên món: chuẩn hóa một lần, index trigram ngược để lọc vài trăm ứng viên mỗi truy vấn"""
+
+    def __init__(self, dish_names: Iterable[str], normalize: Callable[[str], str], shortlist_size: int = 300):
+        self.shortlist_size = shortlist_size
+        
+        # Biến thể tên (chữ thường và bỏ dấu) -> tên gốc, giống cách so khớp cũ
+        dish_variants = {}
+        for dish in dish_names:
+            original_dish = dish.lower()
+            normalized_dish = normalize(dish)
+            dish_variants[original_dish] = dish
+            if normalized_dish != original_dish:
+                dish_variants[normalized_dish] = dish
+        self.variants = list(dish_variants)
+        self.owners = list(dish_variants.values())
+        
+        # Khóa so khớp của token_sort_ratio được tính sẵn cho mọi biến thể
+        self._keys = [_sorted_token_key(fuzz_utils.full_process(v, force_ascii=True)) for v in self.variants]
+        self._key_lengths = np.fromiter((len(k) for k in self._keys), dtype=np.int32, count=len(self._keys))
+        
+        postings: Dict[str, List[int]] = {}
+        for i, variant in enumerate(self.variants):
+            for gram in _token_trigrams(variant):
+                postings.setdefault(gram, []).append(i)
+        self._postings = {gram: np.asarray(ids, dtype=np.int32) for gram, ids in postings.items()}
+
+    def __len__(self) -> int:
+        return len(self.variants)
+
+    def _shortlist(self, queries: List[str]) -> np.ndarray:
+        """Các biến thể chia sẻ nhiều trigram nhất với truy vấn, theo thứ tự gốc"""
+        if len(self.variants) <= self.shortlist_size:
+            return np.arange(len(self.variants))
+        grams = set()
+        for query in queries:
+            grams |= _token_trigrams(query)
+        lists = [self._postings[g] for g in grams if g in self._postings]
+        if not lists:
+            return np.array([], dtype=np.int64)
+        counts = np.bincount(np.concatenate(lists), minlength=len(self.variants))
+        candidates = np.flatnonzero(counts)
+        if len(candidates) > self.shortlist_size:
+            top = np.argpartition(-counts[candidates], self.shortlist_size - 1)[:self.shortlist_size]
+            candidates = np.sort(candidates[top])
+        return candidates
+
+    def _score(self, query: str, candidates: np.ndarray, threshold: int, limit: int) -> List[Tuple[int, int]]:
+        """token_sort_ratio trên danh sách ứng viên, ngưỡng được áp dụng trước khi gọi scorer"""
+        # Xử lý truy vấn giống fuzzywuzzy.process.extract với scorer token_sort_ratio
+        query_key = _sorted_token_key(
+            fuzz_utils.full_process(fuzz_utils.full_process(query), force_ascii=True)
+        )
+        # ratio <= 2*min(len)/(tổng len): loại trước các ứng viên chắc chắn dưới ngưỡng
+        if len(candidates) and query_key:
+            lengths = self._key_lengths[candidates]
+            upper = 200.0 * np.minimum(lengths, len(query_key)) / np.maximum(lengths + len(query_key), 1)
+            candidates = candidates[upper >= threshold - 0.5]
+        scored = []
+        for i in candidates:
+            score = fuzz.ratio(query_key, self._keys[i])
+            if score >= threshold:
+                scored.append((int(i), score))
+        return heapq.nlargest(limit, scored, key=lambda item: item[1])
+
+    def match(self, queries: List[str], threshold: int = 60, limit: int = 15) -> List[Tuple[str, int]]:
+        """Tên món khớp với bất kỳ biến thể truy vấn nào, điểm cao nhất trước"""
+        candidates = self._shortlist(queries)
+        all_matches = {}
+        for query in queries:
+            for i, score in self._score(query, candidates, threshold, limit):
+                dish = self.owners[i]
+                if dish not in all_matches or all_matches[dish] < score:
+                    all_matches[dish] = score
+        return sorted(all_matches.items(), key=lambda x: x[1], reverse=True)
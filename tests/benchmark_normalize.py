@@ -0,0 +1,91 @@
+# tests/benchmark_normalize.py
+"""Micro-benchmark cho NLPProcessor.normalize_vietnamese_text trên corpus tên món ăn
+
+Chạy: cd tests && python benchmark_normalize.py [--limit 230000]
+"""
+import argparse
+import os
+import sys
+import time
+
+import pandas as pd
+from unidecode import unidecode
+
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+import nlp_processor
+from nlp_processor import NLPProcessor, VIETNAMESE_CHARS
+
+RECIPES_PATH = os.path.join(os.path.dirname(__file__), '..', 'data', 'RAW_recipes.csv')
+
+SAMPLE_DISHES = [
+    "Phở Bò Tái", "Bánh Mì Thịt Nướng", "Cơm Tấm Sườn", "Bún Bò Huế",
+    "Bánh Xèo Miền Tây", "Gỏi Cuốn Tôm Thịt", "Chả Cá Lã Vọng",
+    "Bún Chả Hà Nội", "Cao Lầu Hội An", "Mì Quảng Đà Nẵng",
+    "arriba baked winter squash mexican style", "chicken parmesan",
+    "a bit different breakfast pizza", "all in the kitchen chili"
+]
+
+
+def legacy_normalize(text):
+    """Cài đặt cũ: unidecode (bỏ kết quả) rồi một lần str.replace cho mỗi ký tự"""
+    if not isinstance(text, str):
+        text = str(text)
+    normalized = unidecode(text.lower())
+    vietnamese_chars = dict(VIETNAMESE_CHARS)
+    result = text.lower()
+    for vn_char, replacement in vietnamese_chars.items():
+        result = result.replace(vn_char, replacement)
+    return result
+
+
+def load_recipe_names(limit):
+    """Tên món từ RAW_recipes.csv; nếu chưa có dữ liệu thật thì nhân bản danh sách mẫu"""
+    try:
+        names = pd.read_csv(RECIPES_PATH, usecols=['name'], nrows=limit)['name'].dropna().astype(str).tolist()
+        if names:
+            return names, 'RAW_recipes.csv'
+    except Exception:
+        pass
+    names = [f"{SAMPLE_DISHES[i % len(SAMPLE_DISHES)]} {i // len(SAMPLE_DISHES)}" for i in range(limit)]
+    return names, 'synthetic'
+
+
+def time_pass(func, names):
+    start = time.perf_counter()
+    for name in names:
+        func(name)
+    return time.perf_counter() - start
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument('--limit', type=int, default=230000, help='số tên món dùng để đo')
+    args = parser.parse_args()
+
+    names, source = load_recipe_names(args.limit)
+    nlp = NLPProcessor()
+
+    mismatches = sum(legacy_normalize(name) != nlp.normalize_vietnamese_text(name) for name in names[:5000])
+    assert mismatches == 0, f"{mismatches} kết quả khác cài đặt cũ"
+
+    legacy = time_pass(legacy_normalize, names)
+    nlp_processor._normalize_cached.cache_clear()
+    cold = time_pass(nlp.normalize_vietnamese_text, names)
+
+    # Tập tên lặp lại vừa trong cache (trường hợp fuzzy match/từ khóa ở mỗi lượt chat)
+    working_set = names[:nlp_processor.NORMALIZE_CACHE_SIZE]
+    legacy_repeat = time_pass(legacy_normalize, working_set)
+    time_pass(nlp.normalize_vietnamese_text, working_set)
+    warm = time_pass(nlp.normalize_vietnamese_text, working_set)
+
+    print(f"Corpus: {len(names):,} tên món ({source})")
+    print(f"  Cài đặt cũ:             {legacy:.3f}s")
+    print(f"  maketrans (cache lạnh): {cold:.3f}s  (nhanh hơn {legacy / cold:.1f}x)")
+    print(f"Lặp lại {len(working_set):,} tên đã có trong cache:")
+    print(f"  Cài đặt cũ:             {legacy_repeat:.3f}s")
+    print(f"  maketrans (cache nóng): {warm:.3f}s  (nhanh hơn {legacy_repeat / warm:.1f}x)")
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,63 @@
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Thêm src vào path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from analytics import build_analytics, histogram_bins, stratified_sample
+
+
+class TestAnalytics:
+
+    def setup_method(self):
+        """Dữ liệu ngẫu nhiên với một cụm nhỏ và vài giá trị thiếu"""
+        rng = np.random.default_rng(0)
+        n = 2000
+        self.cleaned = pd.DataFrame({
+            'user_id': rng.integers(0, 50, n),
+            'recipe_id': rng.integers(0, 300, n),
+            'name': [f'Món {i}' for i in rng.integers(0, 300, n)],
+            'minutes': rng.integers(5, 180, n).astype(float),
+            'rating': rng.integers(1, 6, n).astype(float),
+            'season': rng.choice(['Hè', 'Thu', 'Xuân', 'Đông'], n)
+        })
+        self.cleaned.loc[::97, 'minutes'] = np.nan
+        self.clustered = pd.DataFrame({
+            'name': [f'Món {i}' for i in range(n)],
+            'minutes': rng.integers(5, 180, n).astype(float),
+            'ingredient_count': rng.integers(2, 20, n),
+            'cluster': np.where(np.arange(n) < 10, 4, rng.integers(0, 4, n))
+        })
+
+    def test_histogram_bins(self):
+        """Test histogram đếm đủ mọi giá trị không thiếu và khớp np.histogram"""
+        bins = histogram_bins(self.cleaned['minutes'], 30)
+        assert len(bins) == 30
+        assert bins['count'].sum() == self.cleaned['minutes'].notna().sum()
+        expected, _ = np.histogram(self.cleaned['minutes'].dropna(), bins=30)
+        assert bins['count'].tolist() == expected.tolist()
+        assert len(histogram_bins(pd.Series([np.nan]), 10)) == 0
+
+    def test_stratified_sample(self):
+        """Test mẫu giữ mọi cụm (kể cả cụm nhỏ) và không vượt quá số điểm mỗi cụm"""
+        sample = stratified_sample(self.clustered, 'cluster', 100)
+        sizes = sample['cluster'].value_counts()
+        assert set(sizes.index) == set(self.clustered['cluster'].unique())
+        assert sizes.max() <= 100
+        assert sizes[4] == 10
+        assert not sample.index.duplicated().any()
+
+    def test_build_analytics(self):
+        """Test số liệu tính sẵn khớp với tính trực tiếp trên dữ liệu"""
+        analytics = build_analytics(self.cleaned, self.clustered)
+        assert analytics['metrics']['n_recipes'] == self.cleaned['recipe_id'].nunique()
+        assert analytics['user_ids'] == sorted(self.cleaned['user_id'].unique().tolist())
+        assert sorted(analytics['seasons']) == sorted(['Hè', 'Thu', 'Xuân', 'Đông'])
+        expected_corr = self.cleaned.select_dtypes(include=[np.number]).corr()
+        pd.testing.assert_frame_equal(analytics['correlation'], expected_corr)
+        assert analytics['top_recipes'].equals(self.cleaned['name'].value_counts().head(10))
+        assert analytics['n_clustered'] == len(self.clustered)
+        assert list(analytics['cluster_stats'].index) == [0, 1, 2, 3, 4]
+        assert build_analytics() == {}
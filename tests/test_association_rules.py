@@ -0,0 +1,90 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Thêm src vào path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from association_rules import association_rules, _rules_by_combinations
+from itemset_mining import mine_frequent_itemsets
+
+
+def _canonical(rules):
+    """Sắp xếp luật theo (tiền đề, hệ quả) để so sánh không phụ thuộc thứ tự"""
+    rules = rules.copy()
+    rules['antecedents'] = rules['antecedents'].map(lambda items: tuple(sorted(items)))
+    rules['consequents'] = rules['consequents'].map(lambda items: tuple(sorted(items)))
+    return rules.sort_values(['antecedents', 'consequents']).reset_index(drop=True)
+
+
+class TestAssociationRules:
+
+    def setup_method(self):
+        """Tập phổ biến (tối đa 3 món) từ ma trận ngẫu nhiên"""
+        from scipy.sparse import random as sparse_random
+
+        matrix = sparse_random(400, 50, density=0.15, random_state=1, format='csr') > 0
+        self.itemsets = mine_frequent_itemsets(matrix, min_support=0.02, max_len=3,
+                                               item_ids=np.arange(1000, 1050))
+
+    @pytest.mark.parametrize('metric, min_threshold, support_only', [
+        ('confidence', 0.1, False),
+        ('lift', 1.2, False),
+        ('leverage', 0.0, False),
+        ('conviction', 1.0, False),
+        ('zhangs_metric', 0.0, False),
+        ('support', 0.03, True),
+    ])
+    def test_vectorized_matches_combinations(self, metric, min_threshold, support_only):
+        """Test bản vector hóa cho cùng luật và metric với bản duyệt combinations"""
+        fast = association_rules(self.itemsets, metric=metric, min_threshold=min_threshold,
+                                 support_only=support_only)
+        slow = _rules_by_combinations(self.itemsets, metric, min_threshold, support_only)
+        assert len(fast) > 0
+        assert list(fast.columns) == list(slow.columns)
+        pd.testing.assert_frame_equal(_canonical(fast), _canonical(slow))
+
+    def test_string_items_and_duplicates(self):
+        """Test món dạng chuỗi và tập lặp lại (giá trị sau cùng được dùng)"""
+        itemsets = self.itemsets.copy()
+        itemsets['itemsets'] = itemsets['itemsets'].map(lambda items: frozenset(str(item) for item in items))
+        itemsets = pd.concat([itemsets, itemsets.tail(5).assign(support=0.5)], ignore_index=True)
+        fast = association_rules(itemsets, metric='confidence', min_threshold=0.1)
+        slow = _rules_by_combinations(itemsets, 'confidence', 0.1, False)
+        pd.testing.assert_frame_equal(_canonical(fast), _canonical(slow))
+
+    def test_missing_support(self):
+        """Test thiếu support của tiền đề thì báo KeyError như trước"""
+        pairs_only = self.itemsets[self.itemsets['itemsets'].map(len) > 1]
+        with pytest.raises(KeyError):
+            association_rules(pairs_only, metric='confidence', min_threshold=0.1)
+        rules = association_rules(pairs_only, support_only=True, min_threshold=0.0)
+        assert rules['confidence'].isna().all()
+
+    def test_longer_itemsets_fallback(self):
+        """Test tập dài hơn 3 món dùng bản duyệt combinations"""
+        itemsets = pd.DataFrame({
+            'support': [0.5, 0.5, 0.5, 0.5, 0.4, 0.4, 0.4, 0.4, 0.4, 0.4, 0.3, 0.3, 0.3, 0.3, 0.2],
+            'itemsets': [frozenset(items) for items in [
+                [1], [2], [3], [4], [1, 2], [1, 3], [1, 4], [2, 3], [2, 4], [3, 4],
+                [1, 2, 3], [1, 2, 4], [1, 3, 4], [2, 3, 4], [1, 2, 3, 4]
+            ]]
+        })
+        rules = association_rules(itemsets, metric='confidence', min_threshold=0.0)
+        assert len(rules) == 50  # 2*6 + 6*4 + 14
+
+    def test_prune_during_generation(self):
+        """Test lọc lift và top-k theo tiền đề khi sinh luật khớp với lọc trên bảng đầy đủ, ở cả hai bản"""
+        full = association_rules(self.itemsets, metric='confidence', min_threshold=0.1)
+        full = full[full['lift'] >= 1.1].sort_values(['confidence', 'lift'], ascending=False, kind='mergesort')
+        wanted = full.groupby(full['antecedents'].map(lambda items: tuple(sorted(items))), sort=False).head(2)
+
+        fast = association_rules(self.itemsets, metric='confidence', min_threshold=0.1, min_lift=1.1, top_k=2)
+        slow = _rules_by_combinations(self.itemsets, 'confidence', 0.1, False, min_lift=1.1, top_k=2)
+        assert 0 < len(fast) < len(full)
+        pd.testing.assert_frame_equal(_canonical(fast), _canonical(wanted))
+        pd.testing.assert_frame_equal(_canonical(slow), _canonical(wanted))
+        with pytest.raises(ValueError):
+            association_rules(self.itemsets, support_only=True, top_k=2)
@@ -2,13 +2,17 @@
 import unittest
 import sys
 import os
+import tempfile
+import numpy as np
 import pandas as pd
 
 # Thêm thư mục src vào path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from nlp_processor import NLPProcessor
-from chatbot import FoodChatbot
+from chatbot import FoodChatbot, recipe_table
+from search_index import DishNameIndex
+from fuzzywuzzy import fuzz, process
 
 class TestNLPProcessor(unittest.TestCase):
     """Test class NLPProcessor"""
@@ -81,6 +85,67 @@ class TestNLPProcessor(unittest.TestCase):
                 
                 print(f"✅ Dietary test '{text}': {intent}")
     
+    def test_normalize_vietnamese_text(self):
+        """Test chuẩn hóa bỏ dấu tiếng Việt"""
+        test_cases = [
+            ("Phở Bò Tái", "pho bo tai"),
+            ("ĐẬU HŨ Chiên", "dau hu chien"),
+            ("Bánh Xèo Miền Tây", "banh xeo mien tay"),
+            ("Chicken Parmesan", "chicken parmesan"),
+            (123, "123"),
+        ]
+
+        for text, expected in test_cases:
+            with self.subTest(text=text):
+                self.assertEqual(self.nlp.normalize_vietnamese_text(text), expected)
+
+        # Chuỗi dài không đi qua cache nhưng cho cùng kết quả
+        long_text = "Bún Chả Hà Nội " * 50
+        self.assertEqual(self.nlp.normalize_vietnamese_text(long_text), "bun cha ha noi " * 50)
+
+    def test_intent_matcher_parity(self):
+        """Test automaton từ khóa cho kết quả giống hệt cách duyệt từng từ khóa"""
+        categories = [
+            ('cuisine', self.nlp.cuisine_keywords),
+            ('dietary', self.nlp.dietary_keywords),
+            ('ingredients', self.nlp.ingredient_keywords),
+            ('meal_time', self.nlp.meal_time_keywords),
+            ('taste', self.nlp.taste_keywords),
+            ('cooking_method', self.nlp.cooking_method_keywords),
+            ('restaurant_type', self.nlp.restaurant_type_keywords)
+        ]
+
+        def legacy_keywords_found(text):
+            original = text.lower().strip()
+            normalized = self.nlp.normalize_vietnamese_text(original)
+            found = []
+            for category_name, category_dict in categories:
+                for item, keywords in category_dict.items():
+                    for keyword in keywords:
+                        if (keyword in original or
+                                self.nlp.normalize_vietnamese_text(keyword) in normalized or
+                                keyword in normalized):
+                            found.append(f"{category_name}:{item}:{keyword}")
+                            break
+            return found
+
+        sentences = [
+            "Tôi muốn ăn phở bò không cay cho bữa sáng",
+            "Tìm món ăn chay Ý với mì pasta",
+            "Lẩu Thái chua cay nhiều rau",
+            "Cơm tấm sườn nướng miền Nam",
+            "Món Nhật thanh đạm cho người ăn kiêng",
+            "Đồ ăn nhanh ít calo cho người tập gym",
+            "Gạo ST25 nấu cơm dẻo, trứng ốp la và bánh mì",
+            "Korean BBQ with kimchi and spicy tteokbokki",
+            "hello",
+            "",
+        ]
+        for text in sentences:
+            with self.subTest(text=text):
+                intent = self.nlp.extract_intent(text)
+                self.assertEqual(intent['keywords_found'], legacy_keywords_found(text))
+
     def test_fuzzy_matching(self):
         """Test tìm kiếm mờ tên món ăn"""
         dish_names = [
@@ -108,6 +173,48 @@ class TestNLPProcessor(unittest.TestCase):
                 
                 print(f"✅ Fuzzy match '{query}' -> '{best_match}' (score: {matches[0][1]})")
     
+    def test_fuzzy_matching_parity(self):
+        """Test index tên món cho kết quả giống process.extract trên toàn bộ danh sách"""
+        dish_names = [
+            "Phở Bò Tái", "Bánh Mì Thịt Nướng", "Cơm Tấm Sườn", "Bún Bò Huế",
+            "Bánh Xèo Miền Tây", "Gỏi Cuốn Tôm Thịt", "Chả Cá Lã Vọng",
+            "Bún Chả Hà Nội", "Chicken Parmesan", "Beef Stroganoff", "Chocolate Cake"
+        ]
+
+        def legacy_fuzzy_match(query, threshold):
+            dish_variants = {}
+            for dish in dish_names:
+                dish_variants[dish.lower()] = dish
+                normalized = self.nlp.normalize_vietnamese_text(dish)
+                if normalized != dish.lower():
+                    dish_variants[normalized] = dish
+            all_matches = {}
+            for q in [query.lower(), self.nlp.normalize_vietnamese_text(query)]:
+                for match, score in process.extract(q, list(dish_variants), limit=15, scorer=fuzz.token_sort_ratio):
+                    dish = dish_variants[match]
+                    if dish not in all_matches or all_matches[dish] < score:
+                        all_matches[dish] = score
+            ranked = sorted(all_matches.items(), key=lambda x: x[1], reverse=True)
+            return [(dish, score) for dish, score in ranked if score >= threshold]
+
+        for query in ["pho bo", "bánh mì", "com tam", "bun bo hue", "chicken parm", "cake"]:
+            for threshold in [0, 50, 60]:
+                with self.subTest(query=query, threshold=threshold):
+                    matches = self.nlp.fuzzy_match_dishes(query, dish_names, threshold=threshold)
+                    # Thứ tự giữa các món cùng điểm có thể khác, nên so sánh theo (điểm, tên)
+                    by_score = lambda items: sorted(items, key=lambda x: (-x[1], x[0]))
+                    self.assertEqual(by_score(matches), by_score(legacy_fuzzy_match(query, threshold)))
+                    self.assertEqual([score for _, score in matches], sorted([score for _, score in matches], reverse=True))
+
+    def test_fuzzy_matching_large_catalogue(self):
+        """Test index trigram chỉ chấm điểm danh sách ứng viên rút gọn trên catalogue lớn"""
+        dish_names = [f"Generic Dish Number {i}" for i in range(5000)] + ["Chicken Parmesan", "Bún Bò Huế"]
+        dish_index = DishNameIndex(dish_names, self.nlp.normalize_vietnamese_text)
+
+        self.assertLessEqual(len(dish_index._shortlist(["chicken parm"])), dish_index.shortlist_size)
+        self.assertEqual(self.nlp.fuzzy_match_dishes("chicken parm", dish_index)[0][0], "Chicken Parmesan")
+        self.assertEqual(self.nlp.fuzzy_match_dishes("bun bo hue", dish_index)[0][0], "Bún Bò Huế")
+
     def test_semantic_search(self):
         """Test tìm kiếm ngữ nghĩa (cần có dữ liệu)"""
         # Tạo dữ liệu giả để test
@@ -158,6 +265,61 @@ class TestNLPProcessor(unittest.TestCase):
                 for r in results[:2]:
                     print(f"   - {r['name']} (score: {r['score']:.3f})")
 
+    def test_semantic_search_bonus(self):
+        """Test điểm thưởng tên/ẩm thực/nguyên liệu được cộng đúng"""
+        test_data = pd.DataFrame({
+            'id': [1, 2, 3],
+            'name': ['Chicken Curry', 'Pasta Primavera', 'Fruit Salad'],
+            'ingredients': ['chicken, rice, curry paste', 'pasta, tomato, basil', 'apple, banana'],
+            'tags': ['indian, spicy', 'italian, vegetarian', 'dessert, fresh']
+        })
+
+        results = self.nlp.semantic_search("Món Ý có gà chicken", test_data, top_k=3)
+        bonuses = {r['name']: round(r['score'] - r['base_score'], 6) for r in results}
+
+        # Chicken Curry: tên chứa 'chicken' (+0.3), nguyên liệu gà (+0.15)
+        self.assertAlmostEqual(bonuses['Chicken Curry'], 0.45)
+        # Pasta Primavera: chỉ khớp ẩm thực Ý (+0.2)
+        self.assertAlmostEqual(bonuses['Pasta Primavera'], 0.2)
+        self.assertEqual(results[0]['name'], 'Chicken Curry')
+
+    def test_search_index_persistence(self):
+        """Test TF-IDF index được lưu, tải lại và chỉ fit lại khi dữ liệu đổi"""
+        test_data = pd.DataFrame({
+            'id': [1, 2, 3],
+            'name': ['Phở Bò', 'Chicken Salad', 'Chocolate Cake'],
+            'ingredients': ['bánh phở, thịt bò', 'chicken, lettuce', 'chocolate, sugar'],
+            'tags': ['vietnamese, soup', 'healthy, salad', 'dessert, sweet']
+        })
+
+        with tempfile.TemporaryDirectory() as index_dir:
+            nlp = NLPProcessor(index_dir=index_dir)
+            first = nlp.get_search_index(test_data)
+            self.assertTrue(os.path.exists(os.path.join(index_dir, 'meta.json')))
+
+            # Cùng corpus: tái sử dụng index trong bộ nhớ
+            self.assertIs(nlp.get_search_index(test_data), first)
+
+            # Processor mới tải lại index từ đĩa thay vì fit lại
+            reloaded = NLPProcessor(index_dir=index_dir).get_search_index(test_data.copy())
+            self.assertEqual(reloaded.fingerprint, first.fingerprint)
+            np.testing.assert_allclose(
+                reloaded.similarities('pho bo'), first.similarities('pho bo')
+            )
+            # Ma trận TF-IDF tải lại được memory-map (chỉ đọc) thay vì đọc vào bộ nhớ
+            self.assertFalse(reloaded.matrix.data.flags.writeable)
+
+            # Corpus thay đổi: fingerprint khác nên phải dựng lại
+            changed = test_data.copy()
+            changed.loc[2, 'name'] = 'Bánh Mì'
+            rebuilt = nlp.get_search_index(changed)
+            self.assertNotEqual(rebuilt.fingerprint, first.fingerprint)
+
+            # Ghi đè index trên đĩa không làm hỏng index đang memory-map ở process khác
+            np.testing.assert_allclose(
+                reloaded.similarities('pho bo'), first.similarities('pho bo')
+            )
+
 
 class TestFoodChatbot(unittest.TestCase):
     """Test class FoodChatbot"""
@@ -168,6 +330,57 @@ class TestFoodChatbot(unittest.TestCase):
         # Mock recommender system (không cần thật)
         self.chatbot = FoodChatbot(None, self.nlp)
     
+    def test_recipes_reloaded_when_artifact_changes(self):
+        """Test bảng công thức đọc từ artifact được cache và đọc lại khi file bị ghi đè"""
+        recipes = pd.DataFrame({
+            'recipe_id': [1, 2],
+            'name': ['Phở Bò', 'Chicken Salad'],
+            'ingredients': ['bánh phở, thịt bò', 'chicken, lettuce'],
+            'tags': ['vietnamese, soup', 'healthy, salad']
+        })
+        cwd = os.getcwd()
+        with tempfile.TemporaryDirectory() as root:
+            os.makedirs(os.path.join(root, 'data'))
+            os.makedirs(os.path.join(root, 'work'))
+            data_path = os.path.join(root, 'data', 'cleaned_data.csv')
+            recipes.to_csv(data_path, index=False)
+            os.chdir(os.path.join(root, 'work'))
+            try:
+                chatbot = FoodChatbot(None, NLPProcessor(index_dir=os.path.join(root, 'index')))
+                intent = self.nlp.extract_intent('phở bò')
+                chatbot.find_matching_dishes(intent, 'phở bò')
+                first = chatbot._recipes_df
+                chatbot.find_matching_dishes(intent, 'phở bò')
+                self.assertIs(chatbot._recipes_df, first)
+
+                recipes.loc[1, 'name'] = 'Bánh Mì'
+                recipes.to_csv(data_path, index=False)
+                mtime = os.path.getmtime(data_path) + 10
+                os.utime(data_path, (mtime, mtime))
+                chatbot.find_matching_dishes(intent, 'bánh mì')
+                self.assertIn('Bánh Mì', chatbot._recipes_df['name'].tolist())
+            finally:
+                os.chdir(cwd)
+
+    def test_recipe_table_shared(self):
+        """Test bảng theo món bỏ dòng trùng và cột theo lượt đánh giá, bảng truyền vào được dùng thay vì đọc file"""
+        interactions = pd.DataFrame({
+            'user_id': [1, 2, 3],
+            'recipe_id': [1, 1, 2],
+            'rating': [5, 4, 3],
+            'name': ['Phở Bò', 'Phở Bò', 'Chicken Salad'],
+            'minutes': [30, 30, 15]
+        })
+        recipes = recipe_table(interactions)
+        self.assertEqual(recipes['recipe_id'].tolist(), [1, 2])
+        self.assertNotIn('user_id', recipes.columns)
+        self.assertNotIn('rating', recipes.columns)
+
+        chatbot = FoodChatbot(None, self.nlp, recipes_df=recipes)
+        self.assertIs(chatbot._recipes(), recipes)
+        results = chatbot.find_matching_dishes(self.nlp.extract_intent('phở bò'), 'phở bò')
+        self.assertEqual([r['name'] for r in results].count('Phở Bò'), 1)
+
     def test_intent_detection(self):
         """Test phát hiện loại ý định"""
         test_cases = [
@@ -3,11 +3,14 @@ import pandas as pd
 import numpy as np
 import sys
 import os
+import tempfile
+import ast
 
 # Thêm src vào path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from data_processing import DataProcessor
+from artifact_io import ArtifactWriter, apply_dtypes, artifact_parts, read_artifact, resolve_artifact, write_artifact
 
 class TestDataProcessor:
     
@@ -79,6 +82,65 @@ class TestDataProcessor:
         assert processor._get_season(7) == 'Hè'
         assert processor._get_season(10) == 'Thu'
     
+    def test_bulk_parsers_match_literal_eval(self):
+        """Test parser vector hóa cho cùng kết quả với ast.literal_eval"""
+        nutrition = pd.Series([
+            "[200, 10, 5, 20, 15, 30, 8]", "[51.5, 0.0, 13.0, 0.0, 2.0, 0.0, 4.0]",
+            "[]", "invalid_nutrition", None
+        ])
+        fields, malformed = self.processor._parse_nutrition_bulk(nutrition)
+        assert fields['calories'].tolist() == [self.processor._extract_calories(x) for x in nutrition]
+        assert fields.loc[1, 'carbohydrates'] == 4.0
+        assert fields.loc[0].tolist() == [200, 10, 5, 20, 15, 30, 8]
+        assert malformed.tolist() == [False, False, False, True, True]
+
+        ingredients = pd.Series([
+            "['salt', 'pepper']", """['a, b', "o'brien's", 'x\\'y']""", "[]", "invalid_json"
+        ])
+        counts, malformed, lists = self.processor._parse_ingredients_bulk(ingredients, return_lists=True)
+        assert counts.tolist() == [self.processor._count_ingredients(x) for x in ingredients]
+        assert lists.tolist()[:3] == [ast.literal_eval(x) for x in ingredients[:3]]
+        assert malformed.tolist() == [False, False, False, True]
+
+    def test_clean_recipes_parse_report(self):
+        """Test đếm số dòng sai định dạng khi làm sạch"""
+        self.processor.recipes_df = self.test_recipes.copy()
+        self.processor.recipes_df.loc[0, 'nutrition'] = 'broken'
+
+        cleaned = self.processor.clean_recipes_data()
+
+        # Dòng 4 (invalid) đã bị loại do minutes = 999
+        assert self.processor.parse_report == {'nutrition_malformed': 1, 'ingredients_malformed': 0}
+        assert cleaned.loc[0, 'calories'] == 0
+        assert cleaned.loc[1, 'protein'] == 20
+
+    def test_season_tables(self):
+        """Test tra mùa vector hóa khớp với _get_season và bảng mùa miền Nam"""
+        dates = pd.Series(pd.date_range('2023-01-01', periods=12, freq='MS'))
+        seasons = self.processor._season_from_dates(dates)
+        assert isinstance(seasons, pd.Categorical)
+        assert list(seasons) == [self.processor._get_season(m) for m in range(1, 13)]
+
+        south = DataProcessor(season_table='south_vietnam')
+        assert set(south._season_from_dates(dates)) == {'Mùa khô', 'Mùa mưa'}
+        assert south._get_season(1) == 'Mùa khô'
+        assert south._get_season(7) == 'Mùa mưa'
+
+        with pytest.raises(ValueError):
+            DataProcessor(season_table='unknown')
+
+    def test_clean_interactions_invalid_dates(self):
+        """Test bỏ và đếm các dòng có ngày sai định dạng"""
+        interactions = self.test_interactions.copy()
+        interactions.loc[0, 'date'] = 'not a date'
+        self.processor.interactions_df = interactions
+
+        cleaned = self.processor.clean_interactions_data()
+
+        assert self.processor.parse_report['invalid_dates'] == 1
+        assert len(cleaned) == 3  # bỏ 1 dòng rating 6 và 1 dòng ngày lỗi
+        assert not cleaned['season'].isna().any()
+
     def test_clean_recipes_data(self):
         """Test làm sạch dữ liệu recipes"""
         self.processor.recipes_df = self.test_recipes.copy()
@@ -131,5 +193,124 @@ class TestDataProcessor:
         assert pd.api.types.is_numeric_dtype(recipes_cleaned['minutes'])
         assert pd.api.types.is_numeric_dtype(interactions_cleaned['rating'])
 
+    def test_merge_and_save_columnar(self):
+        """Test lưu cleaned_data dạng cột với kiểu tường minh và tùy chọn xuất CSV"""
+        self.processor.recipes_df = self.test_recipes.copy()
+        self.processor.interactions_df = self.test_interactions.copy()
+        self.processor.clean_recipes_data()
+        self.processor.clean_interactions_data()
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'cleaned_data.csv')
+            cleaned = self.processor.merge_and_save(output_path, export_csv=True)
+            assert resolve_artifact(output_path).endswith('.parquet')
+            assert os.path.exists(output_path)
+
+            loaded = read_artifact(output_path)
+            assert len(loaded) == len(cleaned)
+            assert loaded['user_id'].dtype == np.int32
+            assert loaded['calories'].dtype == np.float32
+            assert isinstance(loaded['season'].dtype, pd.CategoricalDtype)
+            assert loaded['cooking_time_category'].cat.ordered
+            assert pd.api.types.is_datetime64_any_dtype(loaded['date'])
+
+            # Bản CSV đọc lại cho cùng kết quả
+            os.remove(output_path.replace('.csv', '.parquet'))
+            from_csv = read_artifact(output_path)
+            pd.testing.assert_frame_equal(from_csv, loaded, check_categorical=False)
+
+    def test_process_streaming(self):
+        """Test xử lý theo khối cho cùng kết quả với xử lý toàn bộ trong bộ nhớ"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            recipes_path = os.path.join(tmp_dir, 'RAW_recipes.csv')
+            interactions_path = os.path.join(tmp_dir, 'RAW_interactions.csv')
+            self.test_recipes.to_csv(recipes_path, index=False)
+            self.test_interactions.to_csv(interactions_path, index=False)
+
+            in_memory = DataProcessor()
+            in_memory.load_raw_data(recipes_path, interactions_path)
+            in_memory.clean_recipes_data()
+            in_memory.clean_interactions_data()
+            expected = in_memory.merge_and_save(os.path.join(tmp_dir, 'full.csv'))
+
+            for fmt_csv in [False, True]:
+                output_path = os.path.join(tmp_dir, f'streamed_{fmt_csv}.csv')
+                n_rows = self.processor.process_streaming(recipes_path, interactions_path, output_path,
+                                                          chunk_size=2, export_csv=fmt_csv)
+                assert n_rows == len(expected)
+                assert os.path.exists(output_path) == fmt_csv
+                # Thứ tự dòng của merge phụ thuộc cách chia khối nên so sánh sau khi sắp xếp
+                sort_keys = ['user_id', 'recipe_id', 'date']
+                streamed = read_artifact(output_path).sort_values(sort_keys).reset_index(drop=True)
+                full = read_artifact(os.path.join(tmp_dir, 'full.csv')).sort_values(sort_keys).reset_index(drop=True)
+                pd.testing.assert_frame_equal(streamed, full)
+
+    @pytest.mark.parametrize('fmt', ['parquet', 'feather'])
+    def test_artifact_writer_schema_across_chunks(self, fmt):
+        """Test các chunk có category khác nhau và cột nguyên thiếu giá trị vẫn ghi cùng một schema"""
+        chunks = [
+            pd.DataFrame({'user_id': [1, 2], 'minutes': [10, 20], 'season': ['Hè', 'Thu'], 'name': [None, None]}),
+            pd.DataFrame({'user_id': [3, 4], 'minutes': [30, None], 'season': ['Đông', None], 'name': ['a', 'b']}),
+            pd.DataFrame({'user_id': [5], 'minutes': [40], 'season': ['Xuân'], 'name': ['c']})
+        ]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            output_path = os.path.join(tmp_dir, 'chunks.csv')
+            with ArtifactWriter(output_path, fmt=fmt) as writer:
+                for chunk in chunks:
+                    writer.append(chunk)
+            assert writer.rows == 5
+            loaded = read_artifact(output_path)
+            expected = apply_dtypes(pd.concat(chunks, ignore_index=True))
+            pd.testing.assert_frame_equal(loaded, expected)
+
+    def test_process_incremental(self):
+        """Test chế độ tăng dần chỉ làm sạch các dòng mới và ghi nối chúng thành một phần mới"""
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            recipes_path = os.path.join(tmp_dir, 'RAW_recipes.csv')
+            interactions_path = os.path.join(tmp_dir, 'RAW_interactions.csv')
+            output_path = os.path.join(tmp_dir, 'cleaned_data.csv')
+            self.test_recipes.to_csv(recipes_path, index=False)
+            self.test_interactions.iloc[:3].to_csv(interactions_path, index=False)
+
+            # Lần đầu chưa có store: xử lý toàn bộ và ghi watermark
+            first = self.processor.process_incremental(recipes_path, interactions_path, output_path)
+            assert len(first) == 3
+            assert self.processor.read_watermark(output_path) == pd.Timestamp('2023-09-10')
+            base_path = resolve_artifact(output_path)
+            base_mtime = os.path.getmtime(base_path)
+
+            # Thêm tương tác mới (một dòng cùng ngày watermark) và chạy lại
+            new_rows = pd.DataFrame({
+                'user_id': [3, 1],
+                'recipe_id': [2, 3],
+                'rating': [4, 5],
+                'date': ['2023-09-10', '2023-10-01']
+            })
+            pd.concat([self.test_interactions.iloc[:3], new_rows]).to_csv(interactions_path, index=False)
+            delta = self.processor.process_incremental(recipes_path, interactions_path, output_path)
+            assert sorted(delta['user_id'].tolist()) == [1, 3]
+            assert len(read_artifact(output_path)) == 5
+            assert self.processor.read_watermark(output_path) == pd.Timestamp('2023-10-01')
+            # Bản chính giữ nguyên, tương tác mới nằm trong một phần ghi nối
+            assert os.path.getmtime(base_path) == base_mtime
+            assert len(artifact_parts(base_path)) == 1
+
+            # Không có gì mới thì store giữ nguyên
+            delta = self.processor.process_incremental(recipes_path, interactions_path, output_path)
+            assert len(delta) == 0
+            assert len(read_artifact(output_path)) == 5
+
+            # File thô bị thay (ngắn hơn vị trí đã đọc): đọc lại toàn bộ, chỉ thêm dòng chưa có
+            later = pd.DataFrame({'user_id': [2], 'recipe_id': [1], 'rating': [3], 'date': ['2023-11-05']})
+            pd.concat([new_rows, later]).to_csv(interactions_path, index=False)
+            delta = self.processor.process_incremental(recipes_path, interactions_path, output_path)
+            assert delta['user_id'].tolist() == [2]
+            assert len(read_artifact(output_path)) == 6
+
+            # Ghi lại toàn bộ store thì các phần ghi nối cũ bị xóa
+            write_artifact(read_artifact(output_path), output_path)
+            assert artifact_parts(base_path) == []
+            assert len(read_artifact(output_path)) == 6
+
 if __name__ == "__main__":
     pytest.main([__file__])
\ No newline at end of file
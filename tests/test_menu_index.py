@@ -0,0 +1,56 @@
+import pytest
+import pandas as pd
+import numpy as np
+import sys
+import os
+
+# Thêm src vào path
+sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
+
+from menu_index import MenuIndex
+
+
+class TestMenuIndex:
+
+    def setup_method(self):
+        """Menu ngẫu nhiên có giá trị trùng nhau để kiểm tra biên và thứ tự"""
+        rng = np.random.default_rng(0)
+        n = 500
+        self.menu = pd.DataFrame({
+            'id': np.arange(n),
+            'name': [f'Món {i}' for i in range(n)],
+            'minutes': rng.integers(0, 200, n),
+            'price': rng.integers(80, 160, n) * 1000.0,
+            'season': rng.choice(['Hè', 'Thu', 'Xuân', 'Đông'], n)
+        })
+        self.index = MenuIndex(self.menu)
+
+    def _expected(self, minutes, max_price, season):
+        df = self.menu
+        filtered = df[(df['minutes'] >= minutes[0]) & (df['minutes'] <= minutes[1]) & (df['price'] <= max_price)]
+        if season is not None:
+            filtered = filtered[filtered['season'] == season]
+        return filtered.sort_values('minutes', kind='mergesort')
+
+    @pytest.mark.parametrize('minutes, max_price, season', [
+        ((0, 120), 160000.0, None),
+        ((30, 40), 160000.0, 'Hè'),
+        ((0, 199), 90000.0, 'Đông'),
+        ((50, 50), 120000.0, None),
+        ((300, 400), 160000.0, None),
+        ((0, 120), 100000.0, 'Mùa mưa'),
+    ])
+    def test_query_matches_mask_filter(self, minutes, max_price, season):
+        """Test lọc qua index cho cùng kết quả và thứ tự với lọc bằng mask rồi sort_values"""
+        positions = self.index.query(minutes=minutes, price=(None, max_price), season=season)
+        expected = self._expected(minutes, max_price, season)
+        assert self.menu.iloc[positions]['id'].tolist() == expected['id'].tolist()
+
+    def test_page(self):
+        """Test trang chỉ lấy đúng các dòng của trang"""
+        positions = self.index.query(minutes=(0, 120), price=(None, 150000.0))
+        expected = self._expected((0, 120), 150000.0, None)
+        page = self.index.page(positions, page=2, per_page=20)
+        assert page['id'].tolist() == expected['id'].iloc[20:40].tolist()
+        assert len(self.index.page(positions, page=1000, per_page=20)) == 0
+        assert self.index.seasons == sorted(['Hè', 'Thu', 'Xuân', 'Đông'])
@@ -3,11 +3,14 @@ import pandas as pd
 import numpy as np
 import sys
 import os
+import json
 
 # Thêm src vào path
 sys.path.append(os.path.join(os.path.dirname(__file__), '..', 'src'))
 
 from recommender import RestaurantRecommender
+from itemset_mining import mine_frequent_itemsets
+from artifact_io import artifact_stamp, write_artifact
 
 class TestRestaurantRecommender:
     
@@ -30,6 +33,13 @@ class TestRestaurantRecommender:
         })
         
         self.recommender.data = self.test_data
+
+    @pytest.fixture(autouse=True)
+    def cluster_model_dir(self, tmp_path):
+        """Lưu model phân cụm và adjacency luật vào thư mục tạm thay vì ../data tính từ thư mục đang chạy"""
+        self.recommender.cluster_model_path = str(tmp_path / 'cluster_model.json')
+        self.recommender.rule_store_dir = str(tmp_path / 'rule_adjacency')
+        return tmp_path
     
     def test_build_user_profiles(self):
         """Test xây dựng user profiles"""
@@ -49,6 +59,21 @@ class TestRestaurantRecommender:
         assert 'total_ratings' in stats
         assert 'avg_cook_time' in stats
     
+    def test_user_profile_store(self):
+        """Test profile lưu dạng mảng cho cùng kết quả như tính trực tiếp"""
+        profiles = self.recommender.build_user_profiles()
+        assert list(profiles) == [1, 2, 3]
+        assert 1 in profiles and 999 not in profiles and 'x' not in profiles
+        with pytest.raises(KeyError):
+            profiles[999]
+
+        stats = profiles[3]['stats']
+        user_3 = self.test_data[self.test_data['user_id'] == 3]
+        assert stats['avg_rating'] == pytest.approx(round(user_3['rating'].mean(), 2))
+        assert stats['total_ratings'] == 3
+        assert stats['avg_calories'] == pytest.approx(round(user_3['calories'].mean(), 2))
+        assert profiles[3]['seasonal_prefs'] == pytest.approx({'Hè': 3.0, 'Thu': 3.0, 'Xuân': 0.0, 'Đông': 0.0})
+
     def test_clustering(self):
         """Test phân cụm"""
         clusters = self.recommender.perform_clustering(n_clusters=2)
@@ -64,6 +89,43 @@ class TestRestaurantRecommender:
         # Kiểm tra số clusters
         n_unique_clusters = clusters['cluster'].nunique()
         assert n_unique_clusters <= 2
+
+    def test_clustering_engines(self):
+        """Test engine minibatch, bảng recipe -> cluster và warm-start từ tâm cụm cũ"""
+        clusters = self.recommender.perform_clustering(n_clusters=2, engine='minibatch', n_init=2)
+        assert clusters is not None
+        # Cluster được tra theo recipe, không gộp vào từng dòng tương tác
+        assert 'cluster' not in self.recommender.data.columns
+        assert self.recommender.recipe_cluster([1, 4, 999]).tolist() == clusters['cluster'].loc[[1, 4]].tolist() + [-1]
+
+        warm = self.recommender.perform_clustering(n_clusters=2, engine='minibatch', warm_start=True)
+        assert warm['cluster'].tolist() == clusters['cluster'].tolist()
+        assert self.recommender.perform_clustering(n_clusters=2, engine='unknown') is None
+
+    def test_cluster_names_and_model(self, tmp_path):
+        """Test tên cụm suy ra từ tâm cụm, giữ ổn định khi huấn luyện lại và gán món mới không fit lại"""
+        from cluster_model import ClusterModel
+
+        clusters = self.recommender.perform_clustering(n_clusters=3)
+        assert clusters['cluster_name'].notna().all()
+        assert clusters.groupby('cluster')['cluster_name'].nunique().eq(1).all()
+
+        # Model phân cụm được lưu vào cluster_model_path sau khi huấn luyện
+        path = self.recommender.cluster_model_path
+        assert os.path.exists(path)
+        retrained = RestaurantRecommender(cluster_model_path=path)
+        retrained.data = self.test_data.sample(frac=1.0, random_state=3)
+        assert retrained.load_cluster_model()
+        again = retrained.perform_clustering(n_clusters=3)
+        pd.testing.assert_series_equal(again['cluster'], clusters['cluster'])
+        pd.testing.assert_series_equal(again['cluster_name'], clusters['cluster_name'])
+
+        # Món mới trùng đặc trưng món 1 được gán cùng cụm
+        new_rows = self.test_data.iloc[[0]].assign(recipe_id=99, user_id=3)
+        summary = self.recommender.update_incremental(new_rows, cluster_drift=10.0)
+        assert summary['assigned_recipes'] == 1
+        assert self.recommender.recipe_cluster([99]).tolist() == self.recommender.recipe_cluster([1]).tolist()
+        assert ClusterModel.load(str(tmp_path / 'missing.json')) is None
     
     def test_seasonal_trends(self):
         """Test phân tích xu hướng mùa"""
@@ -115,6 +177,215 @@ class TestRestaurantRecommender:
         assert isinstance(cluster_recs, list)
         assert len(cluster_recs) <= 2
     
+    def test_user_index_lookup(self):
+        """Test index theo user trả về đúng các dòng như khi lọc toàn bảng"""
+        for user_id in [1, 2, 3]:
+            expected = self.test_data[self.test_data['user_id'] == user_id]
+            pd.testing.assert_frame_equal(self.recommender._user_data(user_id), expected)
+        assert len(self.recommender._user_data(999)) == 0
+
+        # Gán dữ liệu mới thì index được dựng lại
+        self.recommender.data = self.test_data[self.test_data['user_id'] != 1].copy()
+        assert len(self.recommender._user_data(1)) == 0
+        assert self.recommender._user_data(3)['recipe_id'].tolist() == [2, 3, 4]
+
+    def test_mine_frequent_itemsets(self):
+        """Test khai phá trên ma trận thưa cho cùng kết quả với apriori của mlxtend"""
+        from mlxtend.frequent_patterns import apriori
+        from scipy.sparse import random as sparse_random
+
+        matrix = sparse_random(300, 40, density=0.15, random_state=0, format='csr') > 0
+        item_ids = np.arange(100, 140)
+        expected = apriori(pd.DataFrame(matrix.toarray(), columns=item_ids), min_support=0.02, use_colnames=True)
+        expected = dict(zip(expected['itemsets'], expected['support']))
+        for max_len, n_jobs in [(None, 1), (None, 2), (2, 1)]:
+            itemsets = mine_frequent_itemsets(matrix, min_support=0.02, max_len=max_len,
+                                              n_jobs=n_jobs, item_ids=item_ids)
+            found = dict(zip(itemsets['itemsets'], itemsets['support']))
+            wanted = {k: v for k, v in expected.items() if max_len is None or len(k) <= max_len}
+            assert found.keys() == wanted.keys()
+            assert all(found[k] == pytest.approx(v) for k, v in wanted.items())
+            assert all(isinstance(item, int) for itemset in found for item in itemset)
+
+    def test_recommend_by_rules(self):
+        """Test gợi ý theo luật kết hợp qua adjacency tiền đề -> hệ quả"""
+        self.recommender.association_rules_df = pd.DataFrame({
+            'antecedents': ['1', '1', '2', "['1', '2']", '4'],
+            'consequents': ['3', '4', "['3', '5']", '6', '1'],
+            'confidence': [0.5, 0.9, 0.7, 0.95, 0.8],
+            'lift': [1.2, 1.5, 1.1, 2.0, 1.3]
+        })
+        adjacency = self.recommender.rule_adjacency()
+        assert adjacency.neighbors(1).tolist() == [4, 3]
+        assert adjacency.neighbors(2).tolist() == [3, 5]
+        # Luật có tiền đề nhiều món bị bỏ qua
+        assert len(adjacency) == 5
+
+        # User 1 thích món 1 và 2: trộn theo confidence và bỏ trùng
+        assert self.recommender._recommend_by_rules(user_id=1, n_recs=3) == [4, 3, 5]
+        assert self.recommender._recommend_by_rules(user_id=1, n_recs=1) == [4]
+        assert self.recommender._recommend_by_rules(user_id=999, n_recs=3) == []
+
+    def test_rule_adjacency_pruning_and_store(self, tmp_path):
+        """Test top-k theo tiền đề, lọc lift và lưu/tải adjacency dạng memory-map"""
+        from rule_store import RuleAdjacency
+
+        rules = pd.DataFrame({
+            'antecedents': ['1', '1', '1', '2', '2'],
+            'consequents': ['3', '4', '5', '3', '6'],
+            'confidence': [0.5, 0.9, 0.7, 0.6, 0.8],
+            'lift': [1.2, 1.5, 0.9, 1.1, 1.3]
+        })
+        adjacency = RuleAdjacency.from_rules(rules, top_k=1, min_lift=1.0)
+        assert adjacency.neighbors(1).tolist() == [4]
+        assert adjacency.neighbors(2).tolist() == [6]
+        assert adjacency.neighbors(7).tolist() == []
+
+        adjacency.save(str(tmp_path / 'rules'))
+        loaded = RuleAdjacency.load(str(tmp_path / 'rules'))
+        assert isinstance(loaded.consequents, np.memmap)
+        assert loaded.consequents.dtype == np.int32 and loaded.confidence.dtype == np.float32
+        assert loaded.recommend([2, 1], n_recs=3) == [4, 6]
+        assert RuleAdjacency.load(str(tmp_path / 'missing')) is None
+
+        self.recommender.build_user_profiles()
+        assert self.recommender.load_rule_adjacency(str(tmp_path / 'rules'))
+        assert self.recommender._recommend_by_rules(user_id=1, n_recs=3) == [4, 6]
+
+    def test_recommend_batch(self):
+        """Test gợi ý hàng loạt khớp với gợi ý từng người và không phụ thuộc số process"""
+        self.recommender.build_user_profiles()
+        self.recommender.perform_clustering(n_clusters=2)
+        user_ids = [3, 1, 999, 2]
+
+        batch = self.recommender.recommend_batch(user_ids, season='Hè', n_recommendations=3)
+        assert list(batch.columns) == ['user_id', 'rank', 'recipe_id']
+        assert list(dict.fromkeys(batch['user_id'])) == user_ids
+        for user_id in user_ids:
+            expected = self.recommender.recommend_for_user(user_id, season='Hè', n_recommendations=3)
+            user_rows = batch[batch['user_id'] == user_id]
+            assert user_rows['recipe_id'].tolist() == expected
+            assert user_rows['rank'].tolist() == list(range(1, len(expected) + 1))
+
+        parallel = self.recommender.recommend_batch(user_ids, season='Hè', n_recommendations=3,
+                                                    n_jobs=2, chunk_size=1)
+        pd.testing.assert_frame_equal(parallel, batch)
+
+    def test_model_bundle(self, tmp_path):
+        """Test bundle đã lưu cho cùng gợi ý mà không cần dữ liệu hay huấn luyện lại"""
+        data_path = str(tmp_path / 'cleaned_data.csv')
+        write_artifact(self.test_data, data_path)
+        assert self.recommender.load_data(data_path)
+        self.recommender.build_user_profiles()
+        self.recommender.perform_clustering(n_clusters=2)
+        self.recommender.association_rules_df = pd.DataFrame({
+            'antecedents': ['1', '2'], 'consequents': ['4', '3'],
+            'confidence': [0.9, 0.7], 'lift': [1.5, 1.1]
+        })
+        bundle_dir = str(tmp_path / 'bundle')
+        self.recommender.save_model(bundle_dir)
+
+        loaded = RestaurantRecommender.load_model(bundle_dir)
+        assert loaded is not None and loaded.data is None
+        # Phiên bản model đi cùng bundle, lần huấn luyện khác cho phiên bản khác
+        assert loaded.model_version == self.recommender.model_version
+        retrained = RestaurantRecommender()
+        retrained.data = self.test_data
+        retrained.build_user_profiles()
+        assert retrained.model_version != self.recommender.model_version
+        assert isinstance(loaded.user_profiles.stats, np.memmap)
+        for user_id in [1, 2, 3, 999]:
+            for season in ['Hè', 'Đông', None]:
+                assert (loaded.recommend_for_user(user_id, season, n_recommendations=3)
+                        == self.recommender.recommend_for_user(user_id, season, n_recommendations=3))
+        assert loaded.user_profiles[1]['stats'] == self.recommender.user_profiles[1]['stats']
+        assert loaded.clusters['cluster_name'].tolist() == self.recommender.clusters['cluster_name'].tolist()
+        assert RestaurantRecommender.load_model(str(tmp_path / 'missing')) is None
+
+        # Bundle định dạng cũ bị bỏ qua (app huấn luyện lại) thay vì lỗi khi tải
+        manifest_path = os.path.join(bundle_dir, 'manifest.json')
+        with open(manifest_path, encoding='utf-8') as f:
+            manifest = json.load(f)
+        manifest['format_version'] = 1
+        del manifest['meta']['model_version']
+        with open(manifest_path, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        assert RestaurantRecommender.load_model(bundle_dir) is None
+
+        # Bundle ghi lại dấu nhận diện của cleaned_data để phát hiện khi dữ liệu được xử lý lại
+        assert loaded.data_stamp == artifact_stamp(data_path)
+        write_artifact(self.test_data.iloc[:5], data_path)
+        assert loaded.data_stamp != artifact_stamp(data_path)
+
+    def test_update_incremental(self):
+        """Test cập nhật tăng dần cho cùng profile với khi xây dựng lại toàn bộ"""
+        full = RestaurantRecommender()
+        full.data = self.test_data
+        expected = full.build_user_profiles()
+
+        self.recommender.data = self.test_data.iloc[:5].reset_index(drop=True)
+        self.recommender.build_user_profiles()
+        self.recommender.perform_clustering(n_clusters=2)
+        assert self.recommender.update_incremental(None)['new_interactions'] == 0
+        summary = self.recommender.update_incremental(self.test_data.iloc[5:], cluster_drift=10.0)
+
+        assert summary['new_interactions'] == 3
+        assert summary['updated_users'] == 1  # chỉ user 3 có tương tác mới
+        assert not summary['reclustered']
+        assert len(self.recommender.data) == len(self.test_data)
+        assert self.recommender.user_profiles.keys() == expected.keys()
+        for user_id, profile in expected.items():
+            assert self.recommender.user_profiles[user_id]['stats'] == pytest.approx(profile['stats'])
+            assert self.recommender.user_profiles[user_id]['seasonal_prefs'] == pytest.approx(profile['seasonal_prefs'])
+
+        # Vượt ngưỡng drift thì phân cụm lại
+        summary = self.recommender.update_incremental(self.test_data.iloc[:2], cluster_drift=0.1)
+        assert summary['reclustered']
+        assert 'cluster_x' not in self.recommender.data.columns
+
+    def test_update_incremental_from_bundle(self, tmp_path):
+        """Test model tải từ bundle cập nhật tăng dần không mất lịch sử, khớp với khi xây dựng lại toàn bộ"""
+        from artifact_io import append_artifact_part
+
+        data_path = str(tmp_path / 'cleaned_data.csv')
+        write_artifact(self.test_data.iloc[:5], data_path)
+        assert self.recommender.load_data(data_path)
+        self.recommender.build_user_profiles()
+        self.recommender.perform_clustering(n_clusters=2)
+        bundle_dir = str(tmp_path / 'bundle')
+        self.recommender.save_model(bundle_dir)
+
+        loaded = RestaurantRecommender.load_model(bundle_dir)
+        loaded.cluster_model_path = None
+        assert loaded.update_from_artifact(data_path)['new_interactions'] == 0
+        new_rows = self.test_data.iloc[5:].assign(user_id=[1, 4, 4])
+        append_artifact_part(new_rows, data_path)
+        summary = loaded.update_from_artifact(data_path, cluster_drift=10.0)
+        assert summary['new_interactions'] == 3 and summary['updated_users'] == 2
+        assert loaded.data_stamp == artifact_stamp(data_path)
+
+        # Lịch sử cũ của user 1 được giữ cùng tương tác mới
+        assert sorted(loaded._user_data(1)['recipe_id']) == [1, 2, 2, 3]
+        assert len(loaded.data) == len(self.test_data)
+        full = RestaurantRecommender()
+        full.data = pd.concat([self.test_data.iloc[:5], new_rows], ignore_index=True)
+        expected = full.build_user_profiles()
+        assert loaded.user_profiles.keys() == expected.keys()
+        for user_id, profile in expected.items():
+            assert loaded.user_profiles[user_id]['stats'] == pytest.approx(profile['stats'])
+            assert loaded.user_profiles[user_id]['seasonal_prefs'] == pytest.approx(profile['seasonal_prefs'])
+
+        # Bundle lưu lại sau khi cập nhật vẫn cập nhật tiếp được; bản chính bị ghi lại thì phải huấn luyện lại
+        loaded.save_model(bundle_dir)
+        reloaded = RestaurantRecommender.load_model(bundle_dir)
+        assert reloaded.user_profiles[4]['stats'] == loaded.user_profiles[4]['stats']
+        write_artifact(self.test_data, data_path)
+        assert reloaded.update_from_artifact(data_path) is None
+
+        fresh = RestaurantRecommender()
+        with pytest.raises(ValueError):
+            fresh.update_incremental(new_rows)
+
     def test_recommend_by_season(self):
         """Test gợi ý theo mùa"""
         seasonal_recs = self.recommender._recommend_by_season(user_id=1, season='Hè', n_recs=2)
@@ -122,6 +393,19 @@ class TestRestaurantRecommender:
         assert isinstance(seasonal_recs, list)
         assert len(seasonal_recs) <= 2
     
+    def test_popularity_rankings(self):
+        """Test bảng xếp hạng phổ biến tính sẵn khớp với groupby trực tiếp"""
+        for season in ['Đông', 'Xuân', 'Hè', 'Thu', None]:
+            data = self.test_data[self.test_data['season'] == season] if season else self.test_data
+            expected = data.groupby('recipe_id')['rating'].mean().sort_values(ascending=False, kind='mergesort')
+            assert self.recommender._recommend_popular_items(season, 10) == expected.index.tolist()
+
+        # Bỏ qua các món đã chọn mà vẫn trả đủ số lượng
+        top = self.recommender._recommend_popular_items(None, 2)
+        recs = self.recommender._recommend_popular_items(None, 2, exclude=top[:1])
+        assert top[0] not in recs
+        assert len(recs) == 2
+
     def test_popular_items_fallback(self):
         """Test fallback với popular items"""
         popular_recs = self.recommender._recommend_popular_items(season='Hè', n_recs=3)